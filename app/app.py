@@ -1,9 +1,8 @@
 import os
 import time
 import json
-import langchain
+import logging
 import streamlit as st
-import redis
 
 from collections import defaultdict
 from urllib.error import URLError
@@ -12,30 +11,58 @@ from dotenv import load_dotenv
 # ---- Load env & debug ----
 load_dotenv()
 if os.environ.get("QNA_DEBUG") == "true":
+    import langchain
+
     langchain.debug = True
 
 # ---- Local imports (project) ----
-from langchain.globals import set_llm_cache
-from qna.llm import make_qna_chain, get_llm
-from qna.db import get_talent_vectorstore, get_cache
-from qna.prompt import basic_prompt
-from qna.constants import REDIS_URL  # if you need it elsewhere
+# Only light modules here: langchain, the OpenAI clients and the engine are
+# imported by the background warm-up (qna.warmup), so the first page renders
+# while they load.
+from qna.constants import CONVERSATION, METRICS_PORT
+from qna.metrics import start_metrics_server
+from qna.stats import get_stats_recorder
+from qna.warmup import get_warmup
 
 # ---- Streamlit Page Config (optional) ----
 st.set_page_config(page_title="Chatbot HR Talent Sourcing Assistant", layout="wide")
 
-# =========================
-# Cache Activation (GLOBAL)
-# =========================
+
 @st.cache_resource
-def fetch_llm_cache():
-    """Return semantic cache (or None) from qna.db.get_cache."""
-    return get_cache()
+def start_metrics():
+    """Structured query logs to stdout, and /metrics and /ready when METRICS_PORT is set (once per process)."""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+
+
+@st.cache_resource
+def start_warmup():
+    """Connect Redis, load the index, engine, models and LLM cache in the background (once per process)."""
+    return get_warmup()
+
+
+@st.cache_resource
+def start_stats():
+    """History for the Stats page, recorded from process start (qna.stats)."""
+    return get_stats_recorder()
+
 
-# Activate semantic cache before creating any LLM or chain:
-_cache = fetch_llm_cache()
-if _cache:
-    set_llm_cache(_cache)
+start_metrics()
+warmup = start_warmup()
+start_stats()
+
+
+def startup_caption(report):
+    steps = " · ".join(
+        f"{step['name']} {step['seconds']:.1f}s" + ("" if step["status"] == "ok" else f" ({step['status']})")
+        for step in report["steps"]
+        if step["status"] != "pending"
+    )
+    if report["done"]:
+        state = "ready" if report["ready"] else "not ready"
+        return f"Startup: {state} in {report['elapsed_s']:.1f}s | {steps}"
+    return f"Warming up ({report['elapsed_s']:.0f}s): {steps}"
 
 # =========================
 # Sidebar: (clean) Controls only
@@ -43,6 +70,10 @@ if _cache:
 with st.sidebar:
     st.write("## LLM Settings")
     st.slider("Number of Tokens", 100, 8000, 400, key="max_tokens")
+    st.toggle("Use LLM", value=True, key="use_llm",
+              help="Off: answer with the scored shortlist / retrieved candidates only, no LLM call")
+    st.toggle("Follow-up mode", value=CONVERSATION, key="conversational",
+              help="Follow-ups that narrow the last answer (\"yang k8s saja?\") filter it instead of searching again")
 
     st.write("## Retrieval Settings")
     st.slider("Number of Context Documents", 2, 20, 5, key="num_context_docs")
@@ -52,13 +83,45 @@ with st.sidebar:
     st.button("New Conversation", key="reset", on_click=lambda: reset_app())
     st.button("Clear Cache", key="clear_cache", on_click=lambda: clear_cache())
 
+    st.caption(startup_caption(warmup.report()))
+    if warmup.ready:
+        from qna.embeddings import get_embeddings
+        from qna.engine import get_engine
+
+        embedding_stats = getattr(get_embeddings(), "stats", None)
+        if embedding_stats:
+            snapshot = embedding_stats.snapshot()
+            st.caption(
+                f"Embedding cache: {snapshot['hit_rate']:.0%} hit rate "
+                f"({snapshot['memory_hits']} memory, {snapshot['redis_hits']} redis, {snapshot['misses']} miss) "
+                f"| ~{snapshot['est_seconds_saved']:.1f}s saved"
+            )
+        limiter = get_engine().limiter.snapshot()
+        st.caption(
+            f"Query engine: {limiter['in_flight']}/{limiter['limit']} in flight | "
+            f"{limiter['waiting']} queued (peak {limiter['peak_waiting']}) | {limiter['avg_wait_ms']:.0f} ms avg wait"
+        )
+        if warmup.llm_cache and hasattr(warmup.llm_cache, "stats"):
+            for tier, tier_stats in warmup.llm_cache.stats().items():
+                st.caption(
+                    f"LLM cache [{tier}]: {tier_stats['hit_rate']:.0%} hit rate "
+                    f"({tier_stats['hits']} hit, {tier_stats['misses']} miss) | {tier_stats['avg_ms']:.1f} ms avg"
+                )
+
 def clear_cache():
+    from langchain.globals import get_llm_cache
+
+    from qna.engine import get_engine
+
     if not st.session_state.get("llm"):
         st.warning("Could not find llm to clear cache of")
         return
     llm = st.session_state["llm"]
     llm_string = llm._get_llm_string()
-    langchain.llm_cache.clear(llm_string=llm_string)
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        llm_cache.clear(llm_string=llm_string)
+    get_engine().clear_answers()
     st.success("✅ Cleared semantic cache for current LLM")
 
 def reset_app():
@@ -69,11 +132,9 @@ def reset_app():
 # =========================
 # Defaults / Session state
 # =========================
-prompt = basic_prompt()
 defaults = {
     "response": "",
     "context": [],
-    "chain": None,
     "llm": None,
     "messages": [],
 }
@@ -86,31 +147,21 @@ for key, value in defaults.items():
 # =========================
 st.title("Chatbot HR Talent Sourcing Assistant")
 
-# ---- Init LLM ----
-if st.session_state["llm"] is None:
-    tokens = st.session_state["max_tokens"]
-    st.session_state["llm"] = get_llm(max_tokens=tokens)
-
-# ---- Init Chain (VectorStore + RAG chain) ----
-if st.session_state["chain"] is None:
-    try:
-        with st.spinner("Connecting to Redis vectorstore..."):
-            vector_db = get_talent_vectorstore()
-            st.session_state["chain"] = make_qna_chain(
-                st.session_state["llm"],
-                vector_db,
-                prompt=prompt,
-                k=st.session_state['num_context_docs'],
-                search_type="similarity",
-            )
-        st.success("✅ Connected to Redis successfully!")
-    except Exception as e:
-        st.error(f"❌ Connection failed: {e}")
-        # (COMMENTED) verbose traceback UI
-        # st.info("💡 Check the debug info in sidebar")
-        # import traceback
-        # st.code(traceback.format_exc())
-        st.stop()
+# ---- Stop if the warm-up failed ----
+# Questions asked before it finishes wait for it below; a failed required step
+# (Redis, the index, the engine) stops here.
+if warmup.failed:
+    st.error("❌ Startup failed: " + "; ".join(f"{step.name}: {step.detail}" for step in warmup.failed))
+    st.stop()
+
+# ---- Per-session LLM view (used to clear this session's cache entries) ----
+# get_llm shares one OpenAI client per process, so this is a cheap copy.
+if warmup.ready and (
+    st.session_state["llm"] is None or st.session_state["llm"].max_tokens != st.session_state["max_tokens"]
+):
+    from qna.llm import get_llm
+
+    st.session_state["llm"] = get_llm(max_tokens=st.session_state["max_tokens"])
 
 # =========================
 # Chat History Rendering
@@ -128,49 +179,60 @@ if query := st.chat_input("Tanyakan sesuatu..."):
         st.markdown(query)
 
     with st.chat_message("assistant"):
-        chain = st.session_state['chain']
+        if not warmup.ready:
+            with st.spinner("Warming up..."):
+                warmup.wait()
+        if not warmup.ready:
+            # The question stays in the chat; ask it again once Redis and the index are back.
+            failed = "; ".join(f"{step.name}: {step.detail}" for step in warmup.failed) or "not ready"
+            st.error(f"❌ Startup failed, the question was not answered ({failed})")
+            st.stop()
+        from qna.conversation import NEW_SEARCH, REFINE, classify, history_summary
+        from qna.engine import get_engine
+        from qna.query import QueryError, QueryRequest
 
+        request = QueryRequest(
+            question=query,
+            k=st.session_state['num_context_docs'],
+            max_tokens=st.session_state['max_tokens'],
+            use_llm=st.session_state['use_llm'],
+        )
+
+        engine = get_engine()
         start_time = time.time()
+        previous = st.session_state['context']
+        mode = classify(query, bool(previous)) if st.session_state['conversational'] else NEW_SEARCH
         try:
-            parameter_attempts = [
-                {"query": query},
-                {"question": query},
-                {"input": query},
-            ]
-            result = None
-            for i, params in enumerate(parameter_attempts, start=1):
-                try:
-                    # (COMMENTED) Attempt logs in UI
-                    # st.info(f"Attempt {i}: Using parameters {list(params.keys())}")
-                    result = chain.invoke(params)
-                    break
-                except Exception as e:
-                    # st.warning(f"Attempt {i} failed: {e}")
-                    continue
-
-            if not result:
-                st.error("All parameter attempts failed!")
-                st.stop()
-
-            elapsed = time.time() - start_time
-            answer = result.get("result", "")
-            source_docs = result.get("source_documents", [])
-
-            st.markdown(answer if answer else "No answer generated")
-
-            # Heuristic "cache-like" indicator
-            cache_like = elapsed < 0.6  # adjust threshold based on your infra
-            info_line = f"⏱️ Response time: {elapsed:.2f} detik | 📄 {len(source_docs)} docs"
-            info_line += " (✅ cache-like)" if cache_like else " (⚡ fresh-like)"
-            st.caption(info_line)
+            if mode == REFINE:
+                # Narrow the last result locally; the current question is the last message.
+                history = history_summary(st.session_state.messages[:-1])
+                retrieval = engine.run(engine.refine(request, previous, history))
+            else:
+                retrieval = engine.run(engine.retrieve(request))
+            source_docs = retrieval.docs
 
-            # Persist to session
-            st.session_state['context'] = source_docs
-            st.session_state['response'] = answer
-            st.session_state.messages.append({"role": "assistant", "content": answer})
+            # Answer streams into this slot; sources render below it right away.
+            answer_slot = st.container()
+            caption_slot = st.empty()
 
             # ---- Render context documents (kept; not debug) ----
-            if source_docs:
+            if retrieval.profiles:
+                # One precomputed profile per candidate (qna.profiles), with
+                # the retrieved snippets of that candidate under it.
+                by_candidate = defaultdict(list)
+                for doc in source_docs:
+                    by_candidate[doc.metadata.get('candidate_id')].append(doc)
+                with st.expander("Candidates" if not source_docs else "Context Documents"):
+                    for i, profile in enumerate(retrieval.profiles, 1):
+                        link = f"[CV]({profile.file_url})" if profile.file_url else "CV link tidak tersedia"
+                        roles = f" — {', '.join(profile.roles)}" if profile.roles else ""
+                        years = f" — {profile.years_experience:g} tahun" if profile.years_experience is not None else ""
+                        st.write(f"{i}. **{profile.name or profile.filename}**{roles}{years} — {link}")
+                        if profile.skills:
+                            st.write(f" - **Skills**: {', '.join(profile.skills)}")
+                        for ctx_idx, doc in enumerate(by_candidate[profile.candidate_id], 1):
+                            st.write(f" - **Context {ctx_idx}**: {doc.page_content[:200]}...")
+            elif source_docs:
                 with st.expander("Context Documents"):
                     by_title = defaultdict(list)
                     for doc in source_docs:
@@ -184,8 +246,52 @@ if query := st.chat_input("Tanyakan sesuatu..."):
             # else:
             #     st.warning("No context documents to display")
 
-        except Exception as e:
-            st.error(f"❌ Chain execution failed: {e}")
+            timings = {}
+
+            def timed_tokens(tokens):
+                for token in tokens:
+                    timings.setdefault("first_token", time.time() - start_time)
+                    yield token
+
+            answer = answer_slot.write_stream(timed_tokens(engine.iterate(engine.stream(request, retrieval))))
+            if not answer:
+                answer_slot.markdown("No answer generated")
+            answer = answer or ""
+
+            elapsed = time.time() - start_time
+            first_token = timings.get("first_token", elapsed)
+
+            # The trace records which cache tier (if any) produced the answer.
+            trace = retrieval.trace
+            stages = trace.stages
+            info_line = (
+                f"⏱️ First token: {first_token:.2f} detik | Response time: {elapsed:.2f} detik"
+                f" | 📄 {len(source_docs)} docs"
+            )
+            if mode == REFINE:
+                info_line += f" | 🔁 follow-up on {len(previous)} previous docs"
+            if retrieval.shortlist is not None:
+                info_line += f" | 🏅 {len(retrieval.shortlist)} shortlisted"
+            if "scoring" in stages:
+                info_line += f" (scoring {1000 * stages['scoring']:.0f} ms)"
+            if "profile_lookup" in stages and retrieval.profiles and not source_docs:
+                info_line += f" | 👤 profile lookup {1000 * stages['profile_lookup']:.0f} ms"
+            if "search" in stages:
+                info_line += f" | 🔎 search {1000 * stages['search']:.0f} ms"
+            if "context_tokens" in trace.attributes:
+                info_line += f" | 🧾 {trace.attributes['context_tokens']} tokens"
+            info_line += f" (✅ cache hit: {trace.cache_hit})" if trace.cache_hit else " (⚡ fresh)"
+            caption_slot.caption(info_line)
+
+            # Persist to session
+            # A follow-up that matched nobody keeps the previous result to refine.
+            if source_docs or mode != REFINE:
+                st.session_state['context'] = source_docs
+            st.session_state['response'] = answer
+            st.session_state.messages.append({"role": "assistant", "content": answer})
+
+        except QueryError as e:
+            st.error(f"❌ Query {e}")
             # (COMMENTED) verbose traceback UI
             # import traceback
             # st.code(traceback.format_exc())
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval benchmark and load test.
+
+Builds a synthetic CV corpus in its own index (bench-talent-pool by default) on
+a local Redis Stack, with the deterministic fake embeddings and the fake chat
+model, so no OpenAI calls are made and runs are reproducible. It measures:
+
+    ingest       embed + pipelined write throughput (chunks/sec) and indexing time
+    knn, hybrid  search latency p50/p95/p99 over sampled questions
+    cache        LLM exact-cache and answer-cache hit latency
+    e2e          query engine QPS and latency at each --concurrency level
+
+and writes everything to a JSON file. Pass --baseline old.json to print the
+changes against an earlier run.
+
+Start Redis with `docker compose up redis`, then:
+    poetry run python benchmark.py --chunks 10000 --output bench.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_NAMES = [
+    "Andi", "Budi", "Citra", "Dewi", "Eko", "Fajar", "Gita", "Hadi", "Indah", "Joko", "Kartika", "Lestari",
+    "Made", "Nur", "Oki", "Putri", "Rizky", "Sari", "Taufik", "Wulan", "Yusuf", "Zahra", "Beni", "Rina",
+]
+LAST_NAMES = [
+    "Pratama", "Saputra", "Wijaya", "Santoso", "Hidayat", "Kusuma", "Nugroho", "Siregar", "Lubis",
+    "Halim", "Gunawan", "Setiawan", "Rahman", "Susanto", "Purnomo", "Saprulah",
+]
+ROLES = [
+    "Backend Engineer", "Frontend Developer", "Fullstack Developer", "Data Scientist", "Data Engineer",
+    "DevOps Engineer", "Mobile Developer", "QA Engineer", "UI/UX Designer", "Product Manager",
+    "HR Generalist", "Accountant", "Digital Marketing Specialist",
+]
+COMPANIES = ["Tokopedia", "Gojek", "Traveloka", "Bukalapak", "Telkom", "Bank Mandiri", "Astra", "Shopee", "Blibli"]
+CITIES = ["Jakarta", "Bandung", "Surabaya", "Yogyakarta", "Medan", "Semarang", "Denpasar", "Makassar"]
+SECTIONS = [
+    "Pengalaman kerja sebagai {role} di {company} selama {years} tahun. Mengerjakan {skills}.",
+    "Professional summary: {role} based in {city} with {years} years of experience in {skills}.",
+    "Proyek: membangun sistem internal di {company} menggunakan {skills}, meningkatkan performa {pct}%.",
+    "Skills: {skills}. Sertifikasi dan pelatihan terkait {role_lower}.",
+    "Pendidikan: S1 Teknik Informatika, {city}. Organisasi dan kegiatan di bidang {role_lower}.",
+    "Kontak: {email} | +62 812-{phone} | {city}",
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark and load test.")
+    parser.add_argument("--chunks", type=int, default=10_000, help="Synthetic corpus size in chunks")
+    parser.add_argument("--chunks-per-candidate", type=int, default=6)
+    parser.add_argument("--queries", type=int, default=500, help="Questions per latency measurement")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated e2e concurrency levels")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dims", type=int, default=384, help="Fake embedding width")
+    parser.add_argument("--llm-delay", type=float, default=0.001, help="Fake LLM delay per streamed chunk")
+    parser.add_argument("--redis-url", default="redis://localhost:6379")
+    parser.add_argument("--index", default="bench-talent-pool")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-ingest", action="store_true", help="Reuse the corpus from a previous run")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="Earlier benchmark JSON to compare against")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    # qna reads its configuration at import time, so this runs before any qna import.
+    os.environ.update(
+        {
+            "REDIS_URL": args.redis_url,
+            "REDIS_INDEX_NAME": args.index,
+            "REDIS_INDEX_PER_MODEL": "false",
+            "EMBEDDINGS_BACKEND": "fake",
+            "FAKE_EMBEDDINGS_DIMS": str(args.dims),
+            "LLM_BACKEND": "fake",
+            "FAKE_LLM_DELAY": str(args.llm_delay),
+        }
+    )
+    os.environ.pop("REDIS_KEY_PREFIX", None)
+    os.environ.pop("REDIS_MANIFEST_PREFIX", None)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples) * 1000
+    return {
+        "n": len(samples),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+def synthetic_candidates(n_chunks: int, chunks_per_candidate: int, seed: int):
+    """Yield (candidate_id, name, file_url, skills, [chunk texts]) until n_chunks are produced."""
+    from qna.skills import SKILL_ALIASES
+
+    rng = random.Random(seed)
+    skills_vocab = list(SKILL_ALIASES)
+    produced, number = 0, 0
+    while produced < n_chunks:
+        number += 1
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        role = rng.choice(ROLES)
+        skills = rng.sample(skills_vocab, rng.randint(3, 8))
+        fields = {
+            "role": role,
+            "role_lower": role.lower(),
+            "company": rng.choice(COMPANIES),
+            "city": rng.choice(CITIES),
+            "years": rng.randint(1, 15),
+            "pct": rng.randint(10, 80),
+            "email": f"{name.lower().replace(' ', '.')}{number}@mail.com",
+            "phone": f"{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+        }
+        count = min(chunks_per_candidate, n_chunks - produced)
+        texts = []
+        for i in range(count):
+            section_skills = ", ".join(rng.sample(skills, min(len(skills), 3)))
+            texts.append(f"{name}. " + SECTIONS[i % len(SECTIONS)].format(skills=section_skills, **fields))
+        candidate_id = hashlib.sha1(f"bench-{number}".encode()).hexdigest()[:16]
+        file_url = f"https://cv.example.com/bench/{candidate_id}.pdf"
+        yield candidate_id, name, file_url, skills, texts
+        produced += count
+
+
+def sample_questions(n: int, seed: int) -> List[str]:
+    from qna.skills import SKILL_ALIASES
+
+    rng = random.Random(seed + 1)
+    skills = list(SKILL_ALIASES)
+    templates = [
+        lambda: f"cari {rng.choice(ROLES).lower()} yang bisa {rng.choice(skills)}",
+        lambda: f"{rng.choice(ROLES).lower()} +{rng.choice(skills).replace(' ', '')} di {rng.choice(CITIES)}",
+        lambda: f"profil kandidat {rng.choice(FIRST_NAMES)}",
+        lambda: f"siapa yang punya pengalaman {rng.choice(skills)} dan {rng.choice(skills)}?",
+    ]
+    return [rng.choice(templates)() for _ in range(n)]
+
+
+def bench_ingest(args, client, embeddings) -> Dict[str, float]:
+    from langchain.schema import Document
+
+    from qna.data import content_hash
+    from qna.db import create_talent_index
+    from qna.ingest import HASH_LEN, CandidateUpdate, apply_updates
+    from qna.schema import drop_index, wait_for_indexing
+
+    drop_index(client, args.index, delete_documents=True)
+    create_talent_index(client, args.dims, index_name=args.index)
+
+    def updates():
+        batch = []
+        for candidate_id, name, file_url, skills, texts in synthetic_candidates(
+            args.chunks, args.chunks_per_candidate, args.seed
+        ):
+            chunks = []
+            for index, text in enumerate(texts):
+                metadata = {
+                    "candidate_id": candidate_id,
+                    "filename": f"{candidate_id}.pdf",
+                    "file_url": file_url,
+                    "name": name,
+                    "skills": ",".join(skills),
+                    "chunk_index": index,
+                    "content_hash": content_hash(text),
+                }
+                chunks.append(Document(page_content=text, metadata=metadata))
+            hashes = [chunk.metadata["content_hash"][:HASH_LEN] for chunk in chunks]
+            batch.append(CandidateUpdate(candidate_id, candidate_id, f"{candidate_id}.pdf", hashes, chunks, []))
+            if sum(len(update.new_chunks) for update in batch) >= 500:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    start = time.perf_counter()
+    written, in_flight = 0, set()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        # Bounded like qna.ingest, so a 1M-chunk corpus never sits in memory at once.
+        for batch in updates():
+            if len(in_flight) >= 8:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                written += sum(future.result()[0] for future in done)
+            in_flight.add(pool.submit(apply_updates, batch, embeddings, client, 500))
+        written += sum(future.result()[0] for future in in_flight)
+    write_seconds = time.perf_counter() - start
+
+    wait_for_indexing(client, args.index)
+    total_seconds = time.perf_counter() - start
+    return {
+        "chunks": written,
+        "write_seconds": round(write_seconds, 3),
+        "indexed_seconds": round(total_seconds, 3),
+        "chunks_per_sec": round(written / write_seconds, 1),
+    }
+
+
+def bench_search(args, questions, client, embeddings, hybrid: bool) -> Dict[str, float]:
+    from qna.retrieval import hybrid_search
+
+    samples = []
+    for question in questions:
+        start = time.perf_counter()
+        hybrid_search(question, args.k, client=client, embeddings=embeddings, index_name=args.index, hybrid=hybrid)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_cache(questions, client) -> Dict[str, Dict[str, float]]:
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration
+
+    from qna.cache import ExactLLMCache
+
+    llm_string = "benchmark"
+    value = [ChatGeneration(message=AIMessage(content="x" * 800))]
+    writer = ExactLLMCache(client=client, namespace="llmcache:bench")
+    writer.clear()
+    for question in questions:
+        writer.update(question, llm_string, value)
+
+    def lookups(cache):
+        samples = []
+        for question in questions:
+            start = time.perf_counter()
+            cache.lookup(question, llm_string)
+            samples.append(time.perf_counter() - start)
+        return percentiles(samples)
+
+    redis_tier = lookups(ExactLLMCache(client=client, namespace="llmcache:bench"))  # cold process, Redis hits
+    memory_tier = lookups(writer)
+    writer.clear()
+    return {"exact_redis_hit": redis_tier, "exact_memory_hit": memory_tier}
+
+
+def bench_e2e(args, questions, concurrency: int, answer_cache: bool) -> Dict[str, float]:
+    from qna.engine import QueryEngine
+    from qna.query import QueryRequest
+
+    engine = QueryEngine(concurrency=concurrency, answer_cache=answer_cache, index_name=args.index)
+    requests = [QueryRequest(question=q, k=args.k) for q in questions]
+    async def warm_up():
+        await asyncio.gather(*(engine.query(r) for r in requests))
+
+    if answer_cache:
+        engine.run(warm_up())
+
+    async def one(request, samples):
+        start = time.perf_counter()
+        await engine.query(request)
+        samples.append(time.perf_counter() - start)
+
+    async def run_all():
+        # Callers beyond the engine limit wait in its queue, as in production.
+        samples = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(request):
+            async with semaphore:
+                await one(request, samples)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(r) for r in requests))
+        return samples, time.perf_counter() - start
+
+    samples, elapsed = engine.run(run_all())
+    if answer_cache:
+        engine.clear_answers()
+    return {"concurrency": concurrency, "qps": round(len(samples) / elapsed, 2), **percentiles(samples)}
+
+
+def git_version() -> str:
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: Dict, baseline: Dict):
+    """Print latency and throughput changes against a baseline run."""
+    rows = []
+    for section in ("knn", "hybrid"):
+        if section in results and section in baseline:
+            rows.append((f"{section} p95_ms", baseline[section]["p95_ms"], results[section]["p95_ms"], False))
+    if "ingest" in results and "ingest" in baseline:
+        rows.append(("ingest chunks/sec", baseline["ingest"]["chunks_per_sec"], results["ingest"]["chunks_per_sec"], True))
+    old_e2e = {row["concurrency"]: row for row in baseline.get("e2e", [])}
+    for row in results.get("e2e", []):
+        if row["concurrency"] in old_e2e:
+            rows.append((f"e2e qps @{row['concurrency']}", old_e2e[row["concurrency"]]["qps"], row["qps"], True))
+    for label, old, new, higher_is_better in rows:
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change < -10 if higher_is_better else change > 10
+        print(f"{label:<22} {old:>10} -> {new:<10} {change:+6.1f}%{'  REGRESSION' if worse else ''}")
+
+
+def run(args) -> Dict:
+    from qna.clients import get_redis_client
+    from qna.embeddings import EMBEDDING_BACKENDS
+
+    client = get_redis_client()
+    # Ingest and search measurements use the raw fake backend so the embedding
+    # cache doesn't fill up with benchmark vectors; e2e goes through the normal path.
+    raw_embeddings = EMBEDDING_BACKENDS["fake"]()
+    questions = sample_questions(args.queries, args.seed)
+
+    results = {
+        "version": git_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+    }
+    if not args.skip_ingest:
+        print(f"Ingesting {args.chunks} synthetic chunks into {args.index}...")
+        results["ingest"] = bench_ingest(args, client, raw_embeddings)
+    print("Measuring search latency...")
+    results["knn"] = bench_search(args, questions, client, raw_embeddings, hybrid=False)
+    results["hybrid"] = bench_search(args, questions, client, raw_embeddings, hybrid=True)
+    print("Measuring cache hit latency...")
+    results["cache"] = bench_cache(questions, client)
+    e2e_questions = questions[: max(50, args.queries // 5)]
+    results["cache"]["answer_cache_hit_e2e"] = bench_e2e(args, e2e_questions, 8, answer_cache=True)
+    results["e2e"] = []
+    for level in [int(level) for level in args.concurrency.split(",") if level]:
+        print(f"Measuring end-to-end QPS at concurrency {level}...")
+        results["e2e"].append(bench_e2e(args, e2e_questions, level, answer_cache=False))
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+    results = run(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
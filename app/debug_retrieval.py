@@ -8,10 +8,12 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-import redis
 from dotenv import load_dotenv
 load_dotenv()
 
+from qna.clients import get_redis_client
+from qna.constants import REDIS_INDEX_NAME, REDIS_URL
+
 def test_text_search():
     """Test basic text search without vector"""
     print("=" * 50)
@@ -19,14 +21,14 @@ def test_text_search():
     print("=" * 50)
     
     try:
-        client = redis.Redis.from_url('redis://10.100.34.246:12345')
+        client = get_redis_client()
         
         # Try basic text searches
         search_terms = ["beni", "saprulah", "software", "engineer", "python", "html", "*"]
         
         for term in search_terms:
             try:
-                result = client.execute_command("FT.SEARCH", "talent-pool", term, "LIMIT", "0", "3")
+                result = client.execute_command("FT.SEARCH", REDIS_INDEX_NAME, term, "LIMIT", "0", "3")
                 doc_count = result[0]
                 print(f"Search '{term}': found {doc_count} docs")
                 
@@ -72,16 +74,16 @@ def test_langchain_text_only():
                 "name": "from_existing_index (default)",
                 "vectorstore": RedisVectorStore.from_existing_index(
                     embedding=embeddings,
-                    index_name="talent-pool",
-                    redis_url='redis://10.100.34.246:12345',
+                    index_name=REDIS_INDEX_NAME,
+                    redis_url=REDIS_URL,
                 )
             },
             {
                 "name": "direct with redis_client",
                 "vectorstore": RedisVectorStore(
                     embeddings,
-                    redis_client=redis.Redis.from_url('redis://10.100.34.246:12345'),
-                    index_name="talent-pool",
+                    redis_client=get_redis_client(),
+                    index_name=REDIS_INDEX_NAME,
                 )
             }
         ]
@@ -122,61 +124,34 @@ def test_langchain_text_only():
         return None
 
 def test_retriever_chain(vectorstore):
-    """Test the retriever and chain with working vectorstore"""
+    """Test retrieval + generation through the qna query API"""
     print("=" * 50)
-    print("RETRIEVER CHAIN TEST")
+    print("QUERY API TEST")
     print("=" * 50)
-    
-    try:
-        from qna.llm import get_llm, make_qna_chain
-        from qna.prompt import basic_prompt
-        
-        # Create components
-        llm = get_llm(max_tokens=200)
-        prompt = basic_prompt()
-        
-        # Create chain with working vectorstore
-        chain = make_qna_chain(llm, vectorstore, prompt, k=3)
-        print("Chain created successfully")
-        
-        # Test queries
-        test_queries = ["find beni", "software engineer", "who is beni saprulah"]
-        
-        for query in test_queries:
-            print(f"\nTesting query: '{query}'")
-            try:
-                # Try different parameter formats
-                param_formats = [{"query": query}, {"question": query}, {"input": query}]
-                
-                for params in param_formats:
-                    try:
-                        result = chain.invoke(params)
-                        answer = result.get("result", "")
-                        source_docs = result.get("source_documents", [])
-                        
-                        print(f"  SUCCESS with params {list(params.keys())}")
-                        print(f"  Answer length: {len(answer)} chars")
-                        print(f"  Source docs: {len(source_docs)}")
-                        
-                        if answer:
-                            print(f"  Answer preview: {answer[:100]}...")
-                        if source_docs:
-                            print(f"  Source preview: {source_docs[0].page_content[:50]}...")
-                            
-                        return True  # Success
-                        
-                    except Exception as e:
-                        print(f"  Params {list(params.keys())} failed: {e}")
-                        continue
-                        
-            except Exception as e:
-                print(f"Query '{query}' failed: {e}")
-        
-        return False
-        
-    except Exception as e:
-        print(f"Retriever chain test failed: {e}")
-        return False
+
+    from qna.query import QueryError, QueryRequest, run_query
+
+    # Test queries
+    test_queries = ["find beni", "software engineer", "who is beni saprulah"]
+
+    for query in test_queries:
+        print(f"\nTesting query: '{query}'")
+        try:
+            result = run_query(QueryRequest(question=query, k=3, max_tokens=200))
+        except QueryError as e:
+            print(f"Query '{query}' failed in {e.stage}: {e}")
+            continue
+
+        print(f"  Answer length: {len(result.answer)} chars")
+        print(f"  Source docs: {len(result.source_documents)}")
+        print(f"  Timings: {result.timings}")
+        if result.answer:
+            print(f"  Answer preview: {result.answer[:100]}...")
+        if result.source_documents:
+            print(f"  Source preview: {result.source_documents[0].page_content[:50]}...")
+        return True  # Success
+
+    return False
 
 def main():
     """Main test function"""
@@ -210,8 +185,8 @@ def main():
         print("SOLUTION: Use text-based similarity search instead of vector search")
         print("Your app should work now - the vectorstore connects but uses text matching")
     else:
-        print("PARTIAL SUCCESS: VectorStore works but chain has issues")
-        print("Check the chain parameter format (query vs question vs input)")
+        print("PARTIAL SUCCESS: VectorStore works but the query API failed")
+        print("Check the stage named in the errors above (retrieval or generation)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,134 +1,210 @@
-import streamlit as st
+import time
+from datetime import datetime
 
-from urllib.error import URLError
-from redisvl.redis.utils import make_dict
-from redisvl.index import SearchIndex
-from redisvl.schema import IndexSchema
-from redis.exceptions import ConnectionError, ResponseError
-from tabulate import tabulate
+import altair as alt
+import pandas as pd
+import streamlit as st
 from dotenv import load_dotenv
+
 load_dotenv()
 
-from qna.constants import REDIS_URL
-
-STATS_KEYS = [
-    "num_docs",
-    "num_records",
-    "number_of_uses",
-    "percent_indexed",
-    "total_indexing_time",
-    "bytes_per_record_avg",
-    "records_per_doc_avg",
-    "doc_table_size_mb",
-    "vector_index_sz_mb",
-]
-
-
-def display_stats(index_info, output_format="html"):
-    # Extracting the statistics
-    stats_data = [(key, str(index_info.get(key))) for key in STATS_KEYS]
-
-    # Display the statistics in tabular format
-    st.write("## Statistics:")
-    st.write(
-        tabulate(
-            stats_data,
-            headers=["Stat Key", "Value"],
-            tablefmt=output_format,
-            colalign=("left", "left"),
-        ), unsafe_allow_html=True
+from qna.constants import REDIS_INDEX_NAME, STATS_INDEX_INTERVAL, STATS_INTERVAL, USES_REDIS
+from qna.metrics import LATENCY_BUCKETS
+from qna.stats import get_stats_recorder, quantile
+
+st.set_page_config(page_title="Stats", layout="wide")
+
+
+@st.cache_resource
+def start_recorder():
+    """Sample metrics and FT.INFO in the background (once per process)."""
+    return get_stats_recorder()
+
+
+@st.cache_data(ttl=STATS_INDEX_INTERVAL)
+def index_definition():
+    from qna.clients import get_redis_client
+    from qna.schema import describe, index_info
+
+    info = index_info(get_redis_client(), REDIS_INDEX_NAME)
+    return describe(info) if info is not None else None
+
+
+def when(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts)
+
+
+def index_section(recorder):
+    samples = [s for s in list(recorder.index) if not s.error]
+    latest = recorder.index[-1] if recorder.index else None
+    st.write("## Index")
+    if not USES_REDIS:
+        st.info("The snapshot backend doesn't sample the Redis index.")
+        return
+    if latest is None:
+        st.info("No index sample yet.")
+        return
+    if latest.error:
+        st.error(f"FT.INFO failed: {latest.error}")
+    if not samples:
+        return
+    first, last = samples[0], samples[-1]
+    columns = st.columns(4)
+    for column, (label, name, fmt) in zip(
+        columns,
+        [
+            ("Chunks", "num_docs", "{:,.0f}"),
+            ("Vector index", "vector_index_sz_mb", "{:,.1f} MB"),
+            ("Indexed", "percent_indexed", "{:.0%}"),
+            ("Indexing failures", "hash_indexing_failures", "{:,.0f}"),
+        ],
+    ):
+        value = last.info.get(name, 0.0)
+        change = value - first.info.get(name, 0.0)
+        delta = fmt.format(change) if change and name != "percent_indexed" else None
+        column.metric(label, fmt.format(value), delta=delta)
+    st.caption(
+        f"FT.INFO every {STATS_INDEX_INTERVAL:g}s, last at {when(last.ts):%H:%M:%S}"
+        + (" | background indexing in progress" if last.indexing else "")
     )
-
-def display_index_stats(index_info, output_format="html"):
-    attributes = index_info.get("attributes", [])
-    definition = make_dict(index_info.get("index_definition"))
-    index_info = [
-        index_info.get("index_name"),
-        definition.get("key_type"),
-        definition.get("prefixes"),
-        index_info.get("index_options"),
-        index_info.get("indexing"),
+    if len(samples) > 1:
+        frame = pd.DataFrame([{"time": when(s.ts), **s.info} for s in samples]).set_index("time")
+        left, right = st.columns(2)
+        left.caption("Chunks")
+        left.line_chart(frame[["num_docs"]])
+        right.caption("Size (MB)")
+        right.line_chart(frame[["vector_index_sz_mb", "doc_table_size_mb", "inverted_sz_mb"]])
+
+
+def ingest_section(recorder):
+    latest = recorder.index[-1] if recorder.index else None
+    progress = latest.ingest if latest else None
+    if not progress:
+        return
+    st.write("## Ingestion")
+    processed = progress.get("docs", 0) + progress.get("unchanged", 0) + progress.get("failed", 0)
+    expected = progress.get("expected") or 0
+    summary = (
+        f"{progress.get('docs', 0)} parsed, {progress.get('unchanged', 0)} unchanged, "
+        f"{progress.get('failed', 0)} failed, {progress.get('removed', 0)} removed | "
+        f"{progress.get('chunks', 0)} chunks embedded at {progress.get('chunks_per_sec', 0):.1f}/s "
+        f"in {progress.get('elapsed_s', 0):.0f}s"
+    )
+    updated = when(progress.get("updated", 0))
+    if progress.get("state") == "running":
+        if expected:
+            st.progress(min(processed / expected, 1.0), text=f"{processed} of ~{expected} CVs")
+        st.caption(f"Running, last update {updated:%H:%M:%S}: {summary}")
+    else:
+        st.caption(f"Last ingest finished {updated:%Y-%m-%d %H:%M:%S}: {summary}")
+
+
+def cache_section(samples):
+    st.write("## Caches")
+    totals = {}
+    rows = []
+    for sample in samples:
+        row = {"time": when(sample.ts)}
+        for tier, (hits, misses) in sample.cache.items():
+            total_hits, total_misses = totals.get(tier, (0, 0))
+            totals[tier] = (total_hits + hits, total_misses + misses)
+            if hits + misses:
+                row[tier] = hits / (hits + misses)
+        rows.append(row)
+    if not totals:
+        st.info("No cache lookups yet.")
+        return
+    columns = st.columns(min(len(totals), 6))
+    for column, (tier, (hits, misses)) in zip(columns, sorted(totals.items())):
+        lookups = hits + misses
+        rate = f"{hits / lookups:.0%}" if lookups else "–"
+        column.metric(f"{tier} hit rate", rate, help=f"{hits} hits, {misses} misses")
+    st.caption("Hit rate per tier and interval")
+    st.line_chart(pd.DataFrame(rows).set_index("time"))
+
+
+def redis_section(samples):
+    st.write("## Redis latency")
+    if not samples:
+        st.info("No samples in this window yet.")
+        return
+    rows = []
+    for sample in samples:
+        row = {"time": when(sample.ts), "ping": sample.ping_ms}
+        for op, (count, seconds) in sample.redis.items():
+            if count:
+                row[op] = 1000 * seconds / count
+        rows.append(row)
+    frame = pd.DataFrame(rows).set_index("time")
+    latest = samples[-1].ping_ms
+    st.metric("PING", f"{latest:.1f} ms" if latest is not None else "unreachable")
+    st.caption("Average round trip per operation and interval (ms)")
+    st.line_chart(frame)
+
+
+def latency_section(recorder, samples, window: float):
+    st.write("## Query latency")
+    counts = recorder.latency_histogram(window)
+    total = sum(counts)
+    if not total:
+        st.info("No queries in this window yet.")
+        return
+    columns = st.columns(4)
+    columns[0].metric("Queries", f"{total:,}")
+    for column, q in zip(columns[1:], (0.5, 0.95, 0.99)):
+        column.metric(f"p{int(100 * q)}", f"{quantile(counts, q):.2f} s")
+
+    labels = [f"≤{bound:g}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]:g}s"]
+    histogram = pd.DataFrame({"bucket": labels, "queries": counts})
+    left, right = st.columns(2)
+    left.caption("End-to-end latency histogram")
+    # Altair directly, to keep the buckets in order rather than sorted as text.
+    left.altair_chart(
+        alt.Chart(histogram).mark_bar().encode(x=alt.X("bucket", sort=None, title=None), y="queries"),
+        use_container_width=True,
+    )
+    rows = [
+        {"time": when(s.ts), "p50": s.latency(0.5), "p95": s.latency(0.95)}
+        for s in samples
+        if s.queries
     ]
-
-    # Display the index information in tabular format
-    st.write("## Index Information:")
-    st.write(
-        tabulate(
-            [index_info],
-            headers=[
-                "Index Name",
-                "Storage Type",
-                "Prefixes",
-                "Index Options",
-                "Indexing",
-            ],
-            tablefmt=output_format,
-        ), unsafe_allow_html=True
+    right.caption("p50 / p95 per interval (s)")
+    if rows:
+        right.line_chart(pd.DataFrame(rows).set_index("time"))
+
+
+recorder = start_recorder()
+
+st.title("Stats")
+controls = st.columns([1, 1, 4])
+window_minutes = controls[0].selectbox("Window", [5, 15, 60, 360], index=1, format_func=lambda m: f"{m} min")
+if controls[1].button("Refresh index"):
+    recorder.refresh_index()
+
+
+@st.fragment(run_every=STATS_INTERVAL)
+def dashboard():
+    window = 60 * window_minutes
+    since = time.time() - window
+    samples = [s for s in list(recorder.metrics) if s.ts >= since]
+    index_section(recorder)
+    ingest_section(recorder)
+    latency_section(recorder, samples, window)
+    cache_section(samples)
+    if USES_REDIS:
+        redis_section(samples)
+    st.caption(
+        f"Query, cache and Redis metrics of this process, sampled every {STATS_INTERVAL:g}s; "
+        f"{len(recorder.metrics)} samples kept."
     )
 
-    attr_values = []
-    headers = [
-        "Name",
-        "Attribute",
-        "Type",
-    ]
 
-    for attrs in attributes:
-        attr = make_dict(attrs)
-
-        values = [attr.get("identifier"), attr.get("attribute"), attr.get("type")]
-        if len(attrs) > 5:
-            options = make_dict(attrs)
-            for k, v in options.items():
-                if k not in ["identifier", "attribute", "type"]:
-                    headers.append("Field Option")
-                    headers.append("Option Value")
-                    values.append(k)
-                    values.append(v)
-        attr_values.append(values)
-
-    # Display the attributes in tabular format
-    st.write("## Index Fields:")
-    st.write(
-        tabulate(
-            attr_values,
-            headers=headers,
-            tablefmt=output_format,
-        ), unsafe_allow_html=True
-    )
+dashboard()
 
-try:
-
-    try:
-        schema = IndexSchema.from_yaml("qna/arxiv.yaml")
-        index = SearchIndex.from_existing(name=schema.index.name, redis_url='redis://10.100.34.246:12345')
-        index_info = index.info()
-        display_index_stats(index_info)
-        display_stats(index_info)
-
-    except ConnectionError as e:
-        st.error(
-            """
-            **Could not connect to Redis**
-            Connection error: %s
-            """
-            % e
-        )
-    except ResponseError as e:
-        st.error(
-            """
-            **Could not connect to index for demo**
-            Response error: %s
-            """
-            % e
-        )
-
-
-except URLError as e:
-    st.error(
-        """
-        **This demo requires internet access.**
-        Connection error: %s
-        """
-        % e.reason
-    )
+if USES_REDIS:
+    with st.expander("Index definition"):
+        definition = index_definition()
+        if definition is None:
+            st.warning(f"Index {REDIS_INDEX_NAME} not found.")
+        else:
+            st.json(definition)
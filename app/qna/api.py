@@ -0,0 +1,234 @@
+"""
+Headless HTTP API over the query engine, for programmatic callers (the ATS).
+
+    POST /query           {"question": ..., "k": 5, "max_tokens": 400, "use_llm": true}
+                          -> answer, sources, shortlist, candidates, timings
+    POST /query/stream    same body, answered as server-sent events:
+                          "sources" (and "shortlist"), then one "token" per chunk, then "done" (or "error")
+    POST /query/batch     {"queries": [{...}, ...]} -> one result or error per query, in order
+    GET  /health          engine and cache stats
+    GET  /ready           startup report (qna.warmup): 200 once ready, 503 before
+    GET  /metrics         Prometheus metrics (qna.metrics)
+
+Runs in its own process next to Streamlit, sharing the Redis index, the LLM
+cache and the answer cache; queries run on qna.engine. Tornado is used because
+it already ships with Streamlit. The server listens right away and warms up
+in the background; query endpoints answer 503 until the warm-up is ready.
+
+Run from the app directory:
+    poetry run python -m qna.api --port 8000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from dataclasses import asdict
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import tornado.iostream
+import tornado.web
+from langchain.schema import Document
+
+from qna.constants import API_MAX_BATCH, API_PORT
+from qna.engine import QueryEngine, get_engine
+from qna.metrics import render
+from qna.query import QueryError, QueryRequest, QueryResult, QueryTimeout
+from qna.warmup import Warmup, get_warmup
+
+SOURCE_FIELDS = (
+    "candidate_id", "name", "filename", "file_url", "skills", "rrf_score", "vector_distance", "rerank_score"
+)
+
+
+def source_json(doc: Document) -> Dict[str, Any]:
+    source = {name: doc.metadata[name] for name in SOURCE_FIELDS if name in doc.metadata}
+    source["content"] = doc.page_content
+    return source
+
+
+def shortlist_json(shortlist) -> Any:
+    return None if shortlist is None else [candidate.to_dict() for candidate in shortlist]
+
+
+def result_json(result: QueryResult) -> Dict[str, Any]:
+    return {
+        "answer": result.answer,
+        "sources": [source_json(doc) for doc in result.source_documents],
+        "shortlist": shortlist_json(result.shortlist),
+        "candidates": [asdict(profile) for profile in result.profiles or []],
+        "timings": result.timings,
+        "cached": result.cached,
+    }
+
+
+def error_json(error: Exception) -> Dict[str, Any]:
+    if isinstance(error, QueryError):
+        return {"error": str(error), "stage": error.stage}
+    return {"error": str(error)}
+
+
+def parse_request(body: Any) -> QueryRequest:
+    if not isinstance(body, dict):
+        raise ValueError("expected a JSON object")
+    return QueryRequest(
+        question=str(body.get("question", "")),
+        k=int(body.get("k", 5)),
+        max_tokens=int(body.get("max_tokens", 400)),
+        use_llm=bool(body.get("use_llm", True)),
+    )
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, engine: Optional[QueryEngine] = None, warmup: Optional[Warmup] = None):
+        self._engine = engine
+        self.warmup = warmup
+
+    def prepare(self):
+        if self._engine is None and self.warmup is not None and not self.warmup.ready:
+            self.set_header("Retry-After", "5")
+            raise tornado.web.HTTPError(503, reason="warming up")
+
+    @property
+    def engine(self) -> QueryEngine:
+        return self._engine or get_engine()
+
+    def json_body(self) -> Any:
+        try:
+            return json.loads(self.request.body or b"null")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="invalid JSON body")
+
+    def query_request(self, body: Any) -> QueryRequest:
+        try:
+            return parse_request(body)
+        except (TypeError, ValueError) as e:
+            raise tornado.web.HTTPError(400, reason=str(e))
+
+    async def run_query(self, request: QueryRequest) -> QueryResult:
+        return await asyncio.wrap_future(self.engine.submit(self.engine.query(request)))
+
+    def write_error(self, status_code: int, **kwargs):
+        self.finish({"error": self._reason})
+
+
+class QueryHandler(BaseHandler):
+    async def post(self):
+        request = self.query_request(self.json_body())
+        try:
+            result = await self.run_query(request)
+        except QueryError as e:
+            self.set_status(504 if isinstance(e, QueryTimeout) else 502)
+            self.finish(error_json(e))
+            return
+        self.finish(result_json(result))
+
+
+class BatchHandler(BaseHandler):
+    async def post(self):
+        body = self.json_body()
+        queries = body.get("queries") if isinstance(body, dict) else None
+        if not isinstance(queries, list) or not queries:
+            raise tornado.web.HTTPError(400, reason="expected a non-empty 'queries' list")
+        if len(queries) > API_MAX_BATCH:
+            raise tornado.web.HTTPError(400, reason=f"at most {API_MAX_BATCH} queries per batch")
+        requests = [self.query_request(query) for query in queries]
+
+        # The engine's limiter bounds how many of these actually run at once.
+        results = await asyncio.gather(*(self.run_query(r) for r in requests), return_exceptions=True)
+        self.finish(
+            {
+                "results": [
+                    error_json(result) if isinstance(result, Exception) else result_json(result)
+                    for result in results
+                ]
+            }
+        )
+
+
+class StreamHandler(BaseHandler):
+    def send_event(self, event: str, data: Any):
+        self.write(f"event: {event}\ndata: {json.dumps(data)}\n\n")
+        return self.flush()
+
+    async def post(self):
+        request = self.query_request(self.json_body())
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+
+        engine = self.engine
+        try:
+            retrieval = await asyncio.wrap_future(engine.submit(engine.retrieve(request)))
+            await self.send_event("sources", [source_json(doc) for doc in retrieval.docs])
+            if retrieval.shortlist is not None:
+                await self.send_event("shortlist", shortlist_json(retrieval.shortlist))
+            async for token in engine.aiterate(engine.stream(request, retrieval)):
+                await self.send_event("token", {"text": token})
+        except QueryError as e:
+            await self.send_event("error", error_json(e))
+        except tornado.iostream.StreamClosedError:
+            return  # client went away; aiterate closes the engine stream
+        else:
+            trace = retrieval.trace
+            await self.send_event("done", {"timings": trace.stages, "cached": trace.cache_hit is not None})
+        self.finish()
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.finish({"status": "ok", "engine": self.engine.stats()})
+
+
+class ReadyHandler(tornado.web.RequestHandler):
+    def initialize(self, warmup: Warmup):
+        self.warmup = warmup
+
+    def get(self):
+        ready, report = self.warmup.readiness()
+        self.set_status(200 if ready else 503)
+        self.finish(report)
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.finish(render())
+
+
+def make_app(engine: Optional[QueryEngine] = None, warmup: Optional[Warmup] = None) -> tornado.web.Application:
+    """Routes over engine, or over get_engine() once warmup is ready."""
+    handler_args = {"engine": engine, "warmup": warmup}
+    return tornado.web.Application(
+        [
+            (r"/query", QueryHandler, handler_args),
+            (r"/query/stream", StreamHandler, handler_args),
+            (r"/query/batch", BatchHandler, handler_args),
+            (r"/health", HealthHandler, handler_args),
+            (r"/metrics", MetricsHandler),
+        ]
+        + ([(r"/ready", ReadyHandler, {"warmup": warmup})] if warmup is not None else [])
+    )
+
+
+async def serve(port: int):
+    # The warm-up installs the LLM cache and starts the engine.
+    make_app(warmup=get_warmup()).listen(port)
+    print(f"Query API listening on :{port}")
+    await asyncio.Event().wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP query API for the talent sourcing assistant.")
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args(argv)
+    # One JSON line per query from qna.metrics.
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(serve(args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Candidate attributes beyond skills: role, years of experience, location and
+contact details.
+
+Like qna.skills, this is shared by ingestion (fields stored on every chunk
+of a candidate) and retrieval (pre-filters parsed out of questions such as
+"minimal 3 tahun di Jakarta", and the role match in qna.scoring).
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE = re.compile(r"(?:\+62|\b0)8[\d\s-]{7,13}\d")
+
+ROLE_ALIASES: Dict[str, List[str]] = {
+    "backend": ["backend", "back-end", "back end", "server side"],
+    "frontend": ["frontend", "front-end", "front end"],
+    "fullstack": ["fullstack", "full-stack", "full stack"],
+    "mobile": ["mobile developer", "mobile engineer", "android developer", "ios developer", "flutter developer"],
+    "devops": ["devops", "site reliability", "sre", "platform engineer", "cloud engineer"],
+    "data scientist": ["data scientist"],
+    "data engineer": ["data engineer"],
+    "data analyst": ["data analyst", "business intelligence", "bi analyst"],
+    "machine learning engineer": ["machine learning engineer", "ml engineer", "ai engineer"],
+    "qa": ["qa", "quality assurance", "tester", "test engineer", "sdet"],
+    "ui/ux designer": ["ui/ux", "ux designer", "ui designer", "product designer"],
+    "product manager": ["product manager", "product owner"],
+    "project manager": ["project manager", "scrum master"],
+    "security": ["security engineer", "cyber security", "cybersecurity", "penetration tester"],
+    "system administrator": ["system administrator", "sysadmin", "network engineer"],
+}
+
+LOCATIONS = [
+    "jakarta", "bandung", "surabaya", "yogyakarta", "semarang", "medan", "makassar", "denpasar", "bali",
+    "malang", "solo", "bogor", "depok", "tangerang", "bekasi", "palembang", "batam", "pekanbaru",
+    "balikpapan", "manado", "padang", "pontianak", "banjarmasin", "lampung", "cirebon", "remote",
+]
+LOCATION_ALIASES = {"jogja": "yogyakarta", "jogjakarta": "yogyakarta", "surakarta": "solo", "jabodetabek": "jakarta"}
+
+# Only figures tied to experience count, so "umur 29 tahun" is not read as 29 years.
+_YEARS_IN_CV = re.compile(
+    r"(\d{1,2})\s*\+?\s*(?:tahun|thn|years?|yrs?)\s+(?:of\s+)?(?:pengalaman|berpengalaman|experience)"
+    r"|(?:pengalaman|berpengalaman|experience)\s+(?:kerja\s+|work\s+)?(?:selama\s+|of\s+|:\s*)?"
+    r"(\d{1,2})\s*\+?\s*(?:tahun|thn|years?|yrs?)",
+    re.IGNORECASE,
+)
+_MIN_YEARS_IN_QUERY = re.compile(
+    r"(?:minimal|minimum|min\.?|at least|lebih dari|>=?)\s*(\d{1,2})\s*\+?\s*(?:tahun|thn|years?|yrs?)"
+    r"|(\d{1,2})\s*\+\s*(?:tahun|thn|years?|yrs?)",
+    re.IGNORECASE,
+)
+_WORD = re.compile(r"[^\W\d_]+")
+_MAX_YEARS = 45
+
+
+@lru_cache(maxsize=None)
+def _role_patterns():
+    patterns = []
+    for role, aliases in ROLE_ALIASES.items():
+        alternatives = "|".join(re.escape(alias) for alias in sorted(aliases, key=len, reverse=True))
+        patterns.append((role, re.compile(rf"(?<![\w/])(?:{alternatives})(?![\w/])", re.IGNORECASE)))
+    return patterns
+
+
+def extract_roles(text: str) -> List[str]:
+    """Canonical roles mentioned anywhere in text, in vocabulary order."""
+    return [role for role, pattern in _role_patterns() if pattern.search(text)]
+
+
+def normalize_location(term: str) -> Optional[str]:
+    term = term.strip().lower()
+    term = LOCATION_ALIASES.get(term, term)
+    return term if term in LOCATIONS else None
+
+
+def extract_locations(text: str) -> List[str]:
+    """Known locations in text, in order of first mention."""
+    found = []
+    for word in _WORD.findall(text):
+        location = normalize_location(word)
+        if location and location not in found:
+            found.append(location)
+    return found
+
+
+def extract_years_experience(text: str) -> Optional[int]:
+    """Largest plausible "N tahun/years (pengalaman)" figure in a CV."""
+    years = [int(a or b) for a, b in _YEARS_IN_CV.findall(text)]
+    years = [y for y in years if 0 < y <= _MAX_YEARS]
+    return max(years) if years else None
+
+
+def parse_min_years(question: str) -> Optional[int]:
+    """Minimum years of experience asked for ("minimal 3 tahun", "5+ years")."""
+    match = _MIN_YEARS_IN_QUERY.search(question)
+    return int(match.group(1) or match.group(2)) if match else None
+
+
+def extract_email(text: str) -> Optional[str]:
+    match = EMAIL.search(text)
+    return match.group(0).strip(".") if match else None
+
+
+def extract_phone(text: str) -> Optional[str]:
+    match = PHONE.search(text)
+    return match.group(0).strip() if match else None
@@ -0,0 +1,297 @@
+"""
+Batch job-description matching: a file of JDs against the talent pool in one run.
+
+JDs are read from JSONL (one {"id", "title", "description"} object per line)
+or CSV (same columns), in groups. Each group is embedded with one
+embed_documents call, and its hybrid searches go to Redis as one pipeline.
+The LLM then ranks each JD's candidates on a bounded thread pool. Results
+stream to a JSONL file, one line per JD with its ranked shortlist, in the order
+the JDs finish. With --no-llm each JD is instead scored against the whole
+pool with qna.scoring, without embedding or searching.
+
+Run from the app directory:
+    poetry run python -m qna.batch open_roles.jsonl -o shortlists.jsonl --workers 8
+"""
+
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from qna.clients import get_redis_client
+from qna.constants import (
+    BATCH_EMBED_BATCH_SIZE,
+    BATCH_LLM_WORKERS,
+    BATCH_SHORTLIST_SIZE,
+    CONTEXT_CHUNKS_PER_CANDIDATE,
+    HYBRID_FETCH_K,
+    LLM_TIMEOUT,
+    REDIS_INDEX_NAME,
+)
+from qna.context import CandidateContext, group_candidates, pack_context, select_chunks
+from qna.embeddings import get_embeddings
+from qna.llm import get_llm
+from qna.prompt import ranking_prompt
+from qna.retrieval import ParsedQuery, build_filter, fuse_replies, hybrid_commands, index_fields, parse_query
+from qna.retry import retrying
+from qna.schema import vector_bytes
+from qna.scoring import CandidateMatrix, ScoringQuery, load_matrix
+from qna.skills import extract_skills
+
+_JSON_LIST = re.compile(r"\[.*\]", re.DOTALL)
+
+
+@dataclass
+class JobDescription:
+    id: str
+    title: str
+    description: str
+
+    @property
+    def text(self) -> str:
+        return f"{self.title}\n{self.description}".strip()
+
+
+def _job_description(row: Dict[str, Any], line: int) -> JobDescription:
+    description = row.get("description") or row.get("jd") or row.get("text") or ""
+    return JobDescription(
+        id=str(row.get("id") or line),
+        title=str(row.get("title") or ""),
+        description=str(description),
+    )
+
+
+def iter_job_descriptions(path) -> Iterator[JobDescription]:
+    """Stream JDs from a .jsonl or .csv file, skipping empty rows."""
+    path = Path(path)
+    with path.open(newline="", encoding="utf-8") as f:
+        rows = csv.DictReader(f) if path.suffix.lower() == ".csv" else (json.loads(line) for line in f if line.strip())
+        for line, row in enumerate(rows, 1):
+            jd = _job_description(row, line)
+            if jd.text:
+                yield jd
+
+
+def jd_query(jd: JobDescription) -> ParsedQuery:
+    # JDs are long prose, so only the skills they mention drive BM25, and only
+    # explicit +term / "quoted" MUST-HAVEs become filters. Names are never parsed.
+    return ParsedQuery(must_have=parse_query(jd.text).must_have, terms=extract_skills(jd.text))
+
+
+def search_candidates(
+    jds: List[JobDescription],
+    vectors: List[List[float]],
+    client: redis.Redis,
+    shortlist_size: int,
+    fetch_k: int = HYBRID_FETCH_K,
+    index_name: str = REDIS_INDEX_NAME,
+) -> List[List[CandidateContext]]:
+    """Hybrid search for a group of JDs in one pipelined round trip, grouped
+    into at most shortlist_size candidates per JD."""
+    fields = index_fields(client, index_name)
+    pipe = client.pipeline(transaction=False)
+    counts = []
+    for jd, vector in zip(jds, vectors):
+        parsed = jd_query(jd)
+        blob = vector_bytes(vector)
+        commands = hybrid_commands(parsed, build_filter(parsed, fields), blob, fetch_k, index_name)
+        for command in commands:
+            pipe.execute_command(*command)
+        counts.append(len(commands))
+    replies = pipe.execute()
+
+    results, offset = [], 0
+    for count in counts:
+        docs = fuse_replies(replies[offset : offset + count], fetch_k)
+        offset += count
+        results.append(group_candidates(docs, CONTEXT_CHUNKS_PER_CANDIDATE)[:shortlist_size])
+    return results
+
+
+def _shortlist_entry(rank: int, retrieval_rank: int, candidate: CandidateContext, score=None, reason="") -> Dict:
+    return {
+        "rank": rank,
+        "retrieval_rank": retrieval_rank,
+        "candidate": candidate.key,
+        "name": candidate.name,
+        "file_url": candidate.file_url,
+        "skills": candidate.skills.split(",") if candidate.skills else [],
+        "score": score,
+        "reason": reason,
+    }
+
+
+def parse_ranking(text: str, candidates: List[CandidateContext]) -> List[Dict]:
+    """Shortlist from the model's JSON ranking. Candidates the model left out
+    are dropped; unknown numbers are ignored."""
+    match = _JSON_LIST.search(text)
+    if not match:
+        raise ValueError("no JSON list in ranking")
+    shortlist, seen = [], set()
+    for item in json.loads(match.group(0)):
+        number = int(item.get("kandidat", 0))
+        if not 1 <= number <= len(candidates) or number in seen:
+            continue
+        seen.add(number)
+        shortlist.append(
+            _shortlist_entry(
+                len(shortlist) + 1, number, candidates[number - 1], item.get("skor"), item.get("alasan", "")
+            )
+        )
+    return shortlist
+
+
+def retrieval_shortlist(candidates: List[CandidateContext]) -> List[Dict]:
+    return [_shortlist_entry(i, i, candidate) for i, candidate in enumerate(candidates, 1)]
+
+
+def rank_candidates(jd: JobDescription, candidates: List[CandidateContext], llm=None) -> Dict[str, Any]:
+    """One output record for a JD. Without an llm (or if ranking fails) the
+    shortlist keeps retrieval order."""
+    record: Dict[str, Any] = {"id": jd.id, "title": jd.title}
+    start = time.perf_counter()
+    if llm is None or not candidates:
+        record["shortlist"] = retrieval_shortlist(candidates)
+        return record
+
+    # Rank only the candidates that fit the context budget; [Kandidat N] in
+    # the prompt is candidates[N - 1].
+    candidates = [candidate for candidate, _ in select_chunks(candidates)]
+    prompt = ranking_prompt().format(context=pack_context([], candidates=candidates), question=jd.text)
+    try:
+        for attempt in retrying(LLM_TIMEOUT):
+            with attempt:
+                text = llm.invoke(prompt).content
+        record["shortlist"] = parse_ranking(text, candidates)
+    except Exception as e:
+        record["shortlist"] = retrieval_shortlist(candidates)
+        record["ranking_error"] = str(e)
+    record["ranking_seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def scored_record(jd: JobDescription, matrix: CandidateMatrix, shortlist_size: int) -> Dict[str, Any]:
+    """Output record for a JD from the deterministic scoring matrix."""
+    start = time.perf_counter()
+    query = ScoringQuery.from_text(jd.text)
+    query.names = []  # JDs never name a candidate
+    shortlist = matrix.shortlist(query, limit=shortlist_size)
+    return {
+        "id": jd.id,
+        "title": jd.title,
+        "shortlist": [
+            {
+                "rank": rank,
+                "retrieval_rank": None,
+                "candidate": f"candidate_id:{candidate.candidate_id}",
+                "name": candidate.name,
+                "file_url": candidate.file_url,
+                "skills": candidate.matched_skills,
+                "score": candidate.score,
+                "reason": candidate.reason,
+            }
+            for rank, candidate in enumerate(shortlist, 1)
+        ],
+        "scoring_seconds": round(time.perf_counter() - start, 6),
+    }
+
+
+def _groups(items: Iterator[JobDescription], size: int) -> Iterator[List[JobDescription]]:
+    group = []
+    for item in items:
+        group.append(item)
+        if len(group) == size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def match_job_descriptions(
+    path,
+    out,
+    shortlist_size: int = BATCH_SHORTLIST_SIZE,
+    embed_batch_size: int = BATCH_EMBED_BATCH_SIZE,
+    workers: int = BATCH_LLM_WORKERS,
+    use_llm: bool = True,
+    embeddings=None,
+    client: Optional[redis.Redis] = None,
+) -> int:
+    """Match every JD in path and write one JSON line per JD to out. Returns
+    the number of JDs written.
+
+    Without the LLM, JDs are scored with qna.scoring when ingest has stored a
+    scoring matrix, and otherwise keep retrieval order."""
+    client = client or get_redis_client()
+    written = 0
+
+    def emit(record):
+        nonlocal written
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        written += 1
+
+    matrix = None if use_llm else load_matrix(client)
+    if matrix is not None:
+        for jd in iter_job_descriptions(path):
+            emit(scored_record(jd, matrix, shortlist_size))
+        return written
+
+    embeddings = embeddings or get_embeddings()
+    llm = get_llm(max_tokens=1000) if use_llm else None
+
+    with ThreadPoolExecutor(max_workers=workers) as rankers:
+        in_flight = set()
+        for jds in _groups(iter_job_descriptions(path), embed_batch_size):
+            vectors = embeddings.embed_documents([jd.text for jd in jds])
+            for jd, candidates in zip(jds, search_candidates(jds, vectors, client, shortlist_size)):
+                while len(in_flight) >= workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        emit(future.result())
+                in_flight.add(rankers.submit(rank_candidates, jd, candidates, llm))
+        for future in in_flight:
+            emit(future.result())
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Match a file of job descriptions against the talent pool.")
+    parser.add_argument("jds", help="JSONL or CSV with id, title, description")
+    parser.add_argument("-o", "--output", help="JSONL output path (default: stdout)")
+    parser.add_argument("--shortlist-size", type=int, default=BATCH_SHORTLIST_SIZE)
+    parser.add_argument("--embed-batch-size", type=int, default=BATCH_EMBED_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=BATCH_LLM_WORKERS, help="Concurrent LLM ranking calls")
+    parser.add_argument("--no-llm", action="store_true", help="Shortlist with deterministic scoring (qna.scoring) instead of the LLM")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        count = match_job_descriptions(
+            args.jds,
+            out,
+            shortlist_size=args.shortlist_size,
+            embed_batch_size=args.embed_batch_size,
+            workers=args.workers,
+            use_llm=not args.no_llm,
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Matched {count} JDs in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+"""
+LLM response caches.
+
+ExactLLMCache answers byte-identical prompts from an in-process LRU and then
+from Redis (with a TTL), without any embedding call. TieredLLMCache puts it
+in front of the RedisSemanticCache so only exact misses pay for an embedding
+plus a KNN lookup. Every tier keeps hit/miss/latency counters.
+
+Entries are bounded three ways: a TTL, a cap on entries (LRU for the exact
+tiers, oldest first for the semantic one, plus bytes for the in-process
+tier), and the index generation. Ingestion bumps the generation whenever the
+talent index changes, and VersionedLLMCache folds it into the cache key, so
+answers computed against an older index become misses. The bump also deletes
+the semantic entries, which are only reachable by similarity and so would
+otherwise linger until their TTL.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import redis
+import redis.asyncio
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from qna.constants import (
+    CACHE_MAX_ENTRIES,
+    CACHE_MAX_MEMORY_MB,
+    CACHE_REDIS_MAX_ENTRIES,
+    CACHE_TTL,
+    GENERATION_CHECK_INTERVAL,
+    REDIS_INDEX_NAME,
+    SEMANTIC_CACHE_NAME,
+)
+from qna.metrics import record_cache, timed_redis
+
+GENERATION_KEY = f"generation:{REDIS_INDEX_NAME}"
+
+
+@dataclass
+class TierStats:
+    """Counters for one cache tier; every lookup is also reported to
+    qna.metrics under the tier name."""
+
+    name: str = ""
+    hits: int = 0
+    misses: int = 0
+    seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, hit: bool, seconds: float):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.seconds += seconds
+        if self.name:
+            record_cache(self.name, hit, seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_ms": 1000 * self.seconds / lookups if lookups else 0.0,
+            }
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IndexGeneration:
+    """The talent index generation, re-read from Redis at most once per
+    check_interval seconds so cache lookups don't pay an extra round trip."""
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        key: str = GENERATION_KEY,
+        check_interval: float = GENERATION_CHECK_INTERVAL,
+    ):
+        self.client = client
+        self.key = key
+        self.check_interval = check_interval
+        self._value = 0
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        with self._lock:
+            if time.monotonic() - self._checked < self.check_interval:
+                return self._value
+        try:
+            value = int(self.client.get(self.key) or 0)
+        except redis.RedisError:
+            return self._value
+        with self._lock:
+            self._value, self._checked = value, time.monotonic()
+        return value
+
+    def bump(self) -> int:
+        value = int(self.client.incr(self.key))
+        with self._lock:
+            self._value, self._checked = value, time.monotonic()
+        return value
+
+
+def bump_index_generation(client: redis.Redis) -> int:
+    """Invalidate every cached answer computed against the current index."""
+    generation = IndexGeneration(client).bump()
+    purge_semantic_cache(client)
+    return generation
+
+
+def _semantic_keys(client: redis.Redis, name: str = SEMANTIC_CACHE_NAME):
+    # Semantic entries are <name>:<id>; "llmcache:exact:..." belongs to the exact tier.
+    for key in client.scan_iter(match=f"{name}:*", count=1000):
+        if b":" not in key[len(name) + 1:]:
+            yield key
+
+
+def purge_semantic_cache(client: redis.Redis, name: str = SEMANTIC_CACHE_NAME) -> int:
+    """Delete every semantic cache entry (the index over them stays). Best
+    effort: a Redis error leaves the rest to the TTL."""
+    deleted, batch = 0, []
+    try:
+        for key in _semantic_keys(client, name):
+            batch.append(key)
+            if len(batch) == 1000:
+                deleted += client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += client.unlink(*batch)
+    except redis.RedisError:
+        pass
+    return deleted
+
+
+class ExactCache:
+    """String cache keyed by hash, with an in-process LRU in front of Redis.
+
+    The in-process tier is capped by max_entries and max_bytes. The Redis tier
+    expires entries after ttl seconds and keeps a sorted set of last-access
+    times so it can evict least recently used keys past redis_max_entries.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        client: Optional[redis.Redis] = None,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_MEMORY_MB * 1024 * 1024,
+        ttl: Optional[int] = CACHE_TTL,
+        redis_max_entries: int = CACHE_REDIS_MAX_ENTRIES,
+        label: Optional[str] = None,
+    ):
+        self.namespace = namespace
+        self.client = client
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl or None
+        self.redis_max_entries = redis_max_entries
+        self.lru_key = f"{namespace}:lru"
+        label = label or namespace
+        self.stats = {"memory": TierStats(f"{label}_memory"), "redis": TierStats(f"{label}_redis")}
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def key(self, group: str, item: str) -> str:
+        # The group hash is its own key segment so a whole group can be cleared.
+        return f"{self.namespace}:{_digest(group)[:16]}:{_digest(item)}"
+
+    def _memory_lookup(self, key: str) -> Optional[str]:
+        start = time.perf_counter()
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+        self.stats["memory"].record(value is not None, time.perf_counter() - start)
+        return value
+
+    def _queue_get(self, pipe, key: str):
+        pipe.get(key)
+        pipe.zadd(self.lru_key, {key: time.time()}, xx=True)
+
+    def _queue_set(self, pipe, key: str, value: str):
+        now = time.time()
+        pipe.set(key, value, ex=self.ttl)
+        pipe.zadd(self.lru_key, {key: now})
+        if self.ttl:
+            pipe.zremrangebyscore(self.lru_key, "-inf", now - self.ttl)
+        pipe.zcard(self.lru_key)
+
+    def _remote_value(self, key: str, raw, seconds: float) -> Optional[str]:
+        self.stats["redis"].record(raw is not None, seconds)
+        if raw is None:
+            return None
+        value = raw.decode("utf-8")
+        self._remember(key, value)
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._memory_lookup(key)
+        if value is not None or self.client is None:
+            return value
+
+        start = time.perf_counter()
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            self._queue_get(pipe, key)
+            with timed_redis("cache_get"):
+                raw, _ = pipe.execute()
+        except redis.RedisError:
+            raw = None
+        return self._remote_value(key, raw, time.perf_counter() - start)
+
+    def set(self, key: str, value: str):
+        self._remember(key, value)
+        if self.client is None:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            self._queue_set(pipe, key, value)
+            size = pipe.execute()[-1]
+            if size > self.redis_max_entries:
+                self._evict(size - self.redis_max_entries)
+        except redis.RedisError:
+            pass  # the Redis tier is best effort
+
+    def _evict(self, count: int):
+        evicted = [member for member, _ in self.client.zpopmin(self.lru_key, count)]
+        if evicted:
+            self.client.delete(*evicted)
+
+    async def aget(self, key: str, client: "redis.asyncio.Redis") -> Optional[str]:
+        """get() over an async Redis client (which belongs to the caller's loop)."""
+        value = self._memory_lookup(key)
+        if value is not None:
+            return value
+
+        start = time.perf_counter()
+        try:
+            pipe = client.pipeline(transaction=False)
+            self._queue_get(pipe, key)
+            with timed_redis("cache_get"):
+                raw, _ = await pipe.execute()
+        except redis.RedisError:
+            raw = None
+        return self._remote_value(key, raw, time.perf_counter() - start)
+
+    async def aset(self, key: str, value: str, client: "redis.asyncio.Redis"):
+        self._remember(key, value)
+        try:
+            pipe = client.pipeline(transaction=False)
+            self._queue_set(pipe, key, value)
+            size = (await pipe.execute())[-1]
+            if size > self.redis_max_entries:
+                evicted = [member for member, _ in await client.zpopmin(self.lru_key, size - self.redis_max_entries)]
+                if evicted:
+                    await client.delete(*evicted)
+        except redis.RedisError:
+            pass
+
+    def _remember(self, key: str, value: str):
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = value
+            self._memory_bytes += len(value)
+            while self._memory and (
+                len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes
+            ):
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def clear(self, group: Optional[str] = None):
+        pattern = f"{self.namespace}:{_digest(group)[:16]}:" if group is not None else f"{self.namespace}:"
+        with self._lock:
+            for key in [key for key in self._memory if key.startswith(pattern)]:
+                self._memory_bytes -= len(self._memory.pop(key))
+        if self.client is None:
+            return
+        batch = []
+        for key in self.client.scan_iter(match=f"{pattern}*", count=1000):
+            if key.decode() == self.lru_key:
+                continue
+            batch.append(key)
+            if len(batch) == 1000:
+                self._delete(batch)
+                batch = []
+        if batch:
+            self._delete(batch)
+
+    def _delete(self, keys):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(*keys)
+        pipe.zrem(self.lru_key, *keys)
+        pipe.execute()
+
+
+class ExactLLMCache(BaseCache):
+    """LangChain LLM cache over ExactCache, keyed by (llm_string, prompt)."""
+
+    def __init__(self, client: Optional[redis.Redis] = None, namespace: str = "llmcache:exact", **kwargs: Any):
+        self.store = ExactCache(namespace, client=client, label="exact", **kwargs)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        value = self.store.get(self.store.key(llm_string, prompt))
+        return loads(value) if value is not None else None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.store.set(self.store.key(llm_string, prompt), dumps(list(return_val)))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear(kwargs.get("llm_string"))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {f"exact_{tier}": stats.snapshot() for tier, stats in self.store.stats.items()}
+
+
+class TieredLLMCache(BaseCache):
+    """Exact tier first, semantic tier second. Semantic hits are promoted into
+    the exact tier so the next identical prompt skips the embedding call.
+
+    With exact=None this is just the semantic cache plus its counters."""
+
+    def __init__(self, exact: Optional[ExactLLMCache], semantic: BaseCache):
+        self.exact = exact
+        self.semantic = semantic
+        self.semantic_stats = TierStats("semantic")
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if self.exact is not None:
+            cached = self.exact.lookup(prompt, llm_string)
+            if cached is not None:
+                return cached
+
+        start = time.perf_counter()
+        cached = self.semantic.lookup(prompt, llm_string)
+        self.semantic_stats.record(bool(cached), time.perf_counter() - start)
+        if cached and self.exact is not None:
+            self.exact.update(prompt, llm_string, cached)
+        return cached
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if self.exact is not None:
+            self.exact.update(prompt, llm_string, return_val)
+        self.semantic.update(prompt, llm_string, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        if self.exact is not None:
+            self.exact.clear(**kwargs)
+        self.semantic.clear(**kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        stats = self.exact.stats() if self.exact is not None else {}
+        return {**stats, "semantic": self.semantic_stats.snapshot()}
+
+
+class BoundedSemanticCache(BaseCache):
+    """Caps a RedisSemanticCache at max_entries. Every check_every updates it
+    reads the entry count from the cache's index and deletes the oldest
+    entries (by inserted_at) past the cap."""
+
+    def __init__(
+        self,
+        semantic: BaseCache,
+        client: redis.Redis,
+        name: str = SEMANTIC_CACHE_NAME,
+        max_entries: int = CACHE_REDIS_MAX_ENTRIES,
+        check_every: int = 100,
+    ):
+        self.semantic = semantic
+        self.client = client
+        self.name = name
+        self.max_entries = max_entries
+        self.check_every = check_every
+        self._updates = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.semantic.lookup(prompt, llm_string)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.semantic.update(prompt, llm_string, return_val)
+        with self._lock:
+            self._updates += 1
+            check = self._updates % self.check_every == 1 or self.check_every == 1
+        if check:
+            self.evict()
+
+    def evict(self) -> int:
+        """Delete the oldest entries past max_entries; best effort."""
+        try:
+            with timed_redis("cache_evict"):
+                info = self.client.ft(self.name).info()
+                excess = int(info.get("num_docs") or 0) - self.max_entries
+                if excess <= 0:
+                    return 0
+                reply = self.client.execute_command(
+                    "FT.SEARCH", self.name, "*", "NOCONTENT", "SORTBY", "inserted_at", "ASC", "LIMIT", 0, excess
+                )
+                keys = reply[1:]
+                return self.client.unlink(*keys) if keys else 0
+        except redis.RedisError:
+            return 0
+
+    def clear(self, **kwargs: Any) -> None:
+        self.semantic.clear(**kwargs)
+
+
+class VersionedLLMCache(BaseCache):
+    """Tags every llm_string with the current index generation before handing
+    it to the wrapped cache, so bumping the generation turns stale answers into
+    misses without scanning or deleting anything."""
+
+    def __init__(self, cache: BaseCache, generation: IndexGeneration):
+        self.cache = cache
+        self.generation = generation
+
+    def _tag(self, llm_string: str) -> str:
+        return f"{llm_string}#generation={self.generation.current()}"
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.cache.lookup(prompt, self._tag(llm_string))
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.cache.update(prompt, self._tag(llm_string), return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        if "llm_string" in kwargs:
+            kwargs["llm_string"] = self._tag(kwargs["llm_string"])
+        self.cache.clear(**kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return self.cache.stats() if hasattr(self.cache, "stats") else {}
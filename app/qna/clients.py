@@ -0,0 +1,84 @@
+"""
+Process-wide network clients.
+
+Everything that talks to Redis or OpenAI should go through these so a process
+(Streamlit server, ingest job, API worker) keeps one connection pool per
+backend instead of opening new connections per session or per call.
+"""
+
+from functools import lru_cache
+
+import httpx
+import redis
+import redis.asyncio
+
+from qna.constants import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_TIMEOUT,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_URL,
+)
+
+
+@lru_cache(maxsize=None)
+def get_redis_client() -> redis.Redis:
+    """Shared Redis client backed by a blocking pool built once from REDIS_URL.
+
+    The blocking pool makes callers wait for a free connection rather than
+    fail when all REDIS_MAX_CONNECTIONS are in use.
+    """
+    pool = redis.BlockingConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_SOCKET_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        health_check_interval=30,
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+def make_async_redis_client() -> redis.asyncio.Redis:
+    """Async Redis client with its own pool.
+
+    Not cached: asyncio connections belong to the event loop that opened them,
+    so each loop (see qna.engine) builds and keeps its own client.
+    """
+    pool = redis.asyncio.BlockingConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_SOCKET_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        health_check_interval=30,
+    )
+    return redis.asyncio.Redis(connection_pool=pool)
+
+
+@lru_cache(maxsize=None)
+def get_http_client() -> httpx.Client:
+    """Shared keep-alive HTTP client for the OpenAI chat and embedding clients."""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+        ),
+        timeout=HTTP_TIMEOUT,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_async_http_client() -> httpx.AsyncClient:
+    """Async counterpart of get_http_client for the OpenAI async calls.
+
+    Only the query engine's event loop awaits on it, which keeps its
+    connections on a single loop.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+        ),
+        timeout=HTTP_TIMEOUT,
+    )
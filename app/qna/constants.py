@@ -1,9 +1,179 @@
 import os
+import re
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """A boolean flag: 1, true or yes (any case) turn it on."""
+    value = os.getenv(name)
+    return default if value is None else value.strip().lower() in ("1", "true", "yes")
 
 # Env Vars and constants
+# LLM cache: "exact", "semantic" or "tiered" (exact first, then semantic)
 CACHE_TYPE = os.getenv("CACHE_TYPE", "semantic")
+CACHE_TTL = int(os.getenv("CACHE_TTL", str(24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+CACHE_MAX_MEMORY_MB = int(os.getenv("CACHE_MAX_MEMORY_MB", "64"))
+CACHE_REDIS_MAX_ENTRIES = int(os.getenv("CACHE_REDIS_MAX_ENTRIES", "50000"))
+GENERATION_CHECK_INTERVAL = float(os.getenv("GENERATION_CHECK_INTERVAL", "5"))
 OPENAI_COMPLETIONS_ENGINE = os.getenv("OPENAI_COMPLETIONS_ENGINE", "gpt-4o-mini")
 OPENAI_EMBEDDINGS_ENGINE = os.getenv("OPENAI_EMBEDDINGS_ENGINE", "text-embedding-3-small")
+# Chat model backend: "openai", or "fake" (canned answer streamed with FAKE_LLM_DELAY seconds per chunk)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+FAKE_LLM_DELAY = float(os.getenv("FAKE_LLM_DELAY", "0.001"))
+
+# Embedding backend: "openai", "huggingface" (local sentence-transformer on CPU)
+# or "fake" (deterministic random vectors, for benchmarks and offline runs)
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "openai")
+HF_EMBEDDINGS_MODEL = os.getenv("HF_EMBEDDINGS_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+EMBEDDINGS_BATCH_SIZE = int(os.getenv("EMBEDDINGS_BATCH_SIZE", "64"))
+EMBEDDINGS_NUM_THREADS = int(os.getenv("EMBEDDINGS_NUM_THREADS", "4"))
+FAKE_EMBEDDINGS_DIMS = int(os.getenv("FAKE_EMBEDDINGS_DIMS", "384"))
+EMBEDDINGS_BASE_MODEL = {
+    "openai": OPENAI_EMBEDDINGS_ENGINE,
+    "fake": f"fake-{FAKE_EMBEDDINGS_DIMS}",
+}.get(EMBEDDINGS_BACKEND, HF_EMBEDDINGS_MODEL)
 
+# Reduced-width vectors (qna.reduction). EMBEDDINGS_DIMENSIONS=0 keeps the model's width.
+# "native" asks the model for fewer dimensions (OpenAI text-embedding-3, fake); "pca"
+# projects full-width vectors with a PCA fitted on PCA_SAMPLE_SIZE chunks at the first ingest.
+EMBEDDINGS_DIMENSIONS = int(os.getenv("EMBEDDINGS_DIMENSIONS", "0"))
+EMBEDDINGS_REDUCTION = os.getenv("EMBEDDINGS_REDUCTION", "native" if EMBEDDINGS_BACKEND == "openai" else "pca")
+PCA_SAMPLE_SIZE = int(os.getenv("PCA_SAMPLE_SIZE", "5000"))
+EMBEDDINGS_MODEL = EMBEDDINGS_BASE_MODEL
+if EMBEDDINGS_DIMENSIONS and EMBEDDINGS_REDUCTION == "native":
+    # Natively shortened vectors differ from full-width ones, so they get their own cache keys.
+    EMBEDDINGS_MODEL = f"{EMBEDDINGS_BASE_MODEL}-{EMBEDDINGS_DIMENSIONS}d"
+EMBEDDINGS_MODEL_SLUG = re.sub(r"[^a-z0-9]+", "-", EMBEDDINGS_MODEL.lower().split("/")[-1]).strip("-")
+if EMBEDDINGS_DIMENSIONS and EMBEDDINGS_REDUCTION == "pca":
+    EMBEDDINGS_MODEL_SLUG = f"{EMBEDDINGS_MODEL_SLUG}-{EMBEDDINGS_DIMENSIONS}d-pca"
+
+# With REDIS_INDEX_PER_MODEL=true every embedding model gets its own index,
+# key prefix and semantic cache, e.g. talent-pool-paraphrase-multilingual-minilm-l12-v2.
+REDIS_INDEX_PER_MODEL = _env_bool("REDIS_INDEX_PER_MODEL", False)
 REDIS_INDEX_NAME = os.getenv("REDIS_INDEX_NAME", "talent-pool")
+if REDIS_INDEX_PER_MODEL:
+    REDIS_INDEX_NAME = f"{REDIS_INDEX_NAME}-{EMBEDDINGS_MODEL_SLUG}"
 REDIS_URL = os.getenv("REDIS_URL", "redis://10.100.34.246:12345")
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", f"doc:{REDIS_INDEX_NAME}:")
+REDIS_MANIFEST_PREFIX = os.getenv("REDIS_MANIFEST_PREFIX", f"manifest:{REDIS_INDEX_NAME}:")
+
+# Vector index schema (qna.schema): "HNSW" or "FLAT", and "FLOAT32", "FLOAT16" or "INT8"
+# (Redis 8+) vectors.
+# Changing these takes `python -m qna.schema migrate` (or `rebuild` for VECTOR_DTYPE).
+# Running processes re-read the index's field names every INDEX_FIELDS_TTL seconds.
+INDEX_FIELDS_TTL = float(os.getenv("INDEX_FIELDS_TTL", "60"))
+VECTOR_ALGORITHM = os.getenv("VECTOR_ALGORITHM", "HNSW").upper()
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "FLOAT32").upper()
+VECTOR_DISTANCE = os.getenv("VECTOR_DISTANCE", "COSINE").upper()
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_RUNTIME = int(os.getenv("HNSW_EF_RUNTIME", "10"))
+# With a quantized VECTOR_DTYPE (FLOAT16, INT8), re-score the top VECTOR_RERANK_K KNN hits
+# with full-precision vectors stored unindexed next to them (0 = off).
+VECTOR_RERANK_K = int(os.getenv("VECTOR_RERANK_K", "0"))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+SEMANTIC_CACHE_NAME = (
+    "llmcache" if EMBEDDINGS_BACKEND == "openai" and not EMBEDDINGS_DIMENSIONS else f"llmcache-{EMBEDDINGS_MODEL_SLUG}"
+)
+
+# Shared HTTP client for OpenAI
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+
+# Ingestion
+CV_BASE_URL = os.getenv("CV_BASE_URL", "")
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "1000"))
+INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "100"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 4)))
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "256"))
+INGEST_EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))
+INGEST_WRITE_BATCH_SIZE = int(os.getenv("INGEST_WRITE_BATCH_SIZE", "500"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+INGEST_RETRY_BUDGET = float(os.getenv("INGEST_RETRY_BUDGET", "300"))
+
+# Embedding cache
+EMBEDDINGS_CACHE = _env_bool("EMBEDDINGS_CACHE", True)
+EMBEDDINGS_CACHE_SIZE = int(os.getenv("EMBEDDINGS_CACHE_SIZE", "10000"))
+EMBEDDINGS_CACHE_TTL = int(os.getenv("EMBEDDINGS_CACHE_TTL", str(30 * 24 * 3600)))
+
+# Query path: per-stage time budgets (seconds) and retry attempts
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", "10"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+QUERY_MAX_ATTEMPTS = int(os.getenv("QUERY_MAX_ATTEMPTS", "3"))
+
+# Retrieval: "hybrid" (BM25 + KNN with name/skill pre-filters, fused with RRF) or "vector"
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "40"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Two-stage retrieval: over-fetch RERANK_FETCH_K chunks, re-score them with a local
+# cross-encoder on CPU and keep the best k (RERANK=false skips the second stage)
+RERANK = _env_bool("RERANK", False)
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "100"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "512"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "50000"))
+
+# Deterministic scoring of MODE JOBDESC questions (qna.scoring): candidates below
+# SCORING_MIN_SCORE are dropped before the LLM, which only sees the top SCORING_SHORTLIST_SIZE
+SCORING = _env_bool("SCORING", True)
+SCORING_MIN_SCORE = float(os.getenv("SCORING_MIN_SCORE", "70"))
+SCORING_SHORTLIST_SIZE = int(os.getenv("SCORING_SHORTLIST_SIZE", "10"))
+# The search ranks this many top-scored candidates; equal scores are then
+# ordered by retrieval relevance before the shortlist is cut.
+SCORING_POOL_SIZE = int(os.getenv("SCORING_POOL_SIZE", "50"))
+
+# Name-only questions ("cari Beni") are answered from the per-candidate profiles
+# (qna.profiles) without embedding, search or the LLM
+PROFILE_LOOKUP = _env_bool("PROFILE_LOOKUP", True)
+
+# Conversational follow-ups (qna.conversation): a follow-up that narrows the previous
+# result is answered from it, with the last CONVERSATION_HISTORY_TURNS turns as history
+CONVERSATION = _env_bool("CONVERSATION", True)
+CONVERSATION_HISTORY_TURNS = int(os.getenv("CONVERSATION_HISTORY_TURNS", "3"))
+
+# Retrieval backend: "redis" (RediSearch) or "snapshot", a memory-mapped export of the
+# index at SNAPSHOT_PATH searched in-process (qna.snapshot); SNAPSHOT_ANN_EF is the
+# hnswlib query-time candidate list when the snapshot has an ANN index
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "redis")
+# A replica on the snapshot makes no Redis round trips: the answer, LLM and Redis embedding
+# caches, name lookups, the question log and the Stats page's Redis samples are off.
+USES_REDIS = RETRIEVAL_BACKEND != "snapshot"
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", f"snapshots/{REDIS_INDEX_NAME}")
+SNAPSHOT_ANN_EF = int(os.getenv("SNAPSHOT_ANN_EF", "64"))
+
+# Startup warm-up (qna.warmup): connect Redis, load the index, engine and models in the
+# background, embed WARMUP_QUERY and load the answers to the WARMUP_QUESTIONS most asked
+# questions (of the WARMUP_QUESTION_LOG_SIZE kept) into the in-process answer cache
+WARMUP = _env_bool("WARMUP", True)
+WARMUP_QUERY = os.getenv("WARMUP_QUERY", "backend engineer golang")
+WARMUP_QUESTIONS = int(os.getenv("WARMUP_QUESTIONS", "20"))
+WARMUP_QUESTION_LOG_SIZE = int(os.getenv("WARMUP_QUESTION_LOG_SIZE", "1000"))
+
+# Context packing: chunks are grouped per candidate before they reach the prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+CONTEXT_CHUNKS_PER_CANDIDATE = int(os.getenv("CONTEXT_CHUNKS_PER_CANDIDATE", "2"))
+
+# Async query engine: concurrent queries per process and the question-level answer cache
+ENGINE_CONCURRENCY = int(os.getenv("ENGINE_CONCURRENCY", "16"))
+ANSWER_CACHE = _env_bool("ANSWER_CACHE", True)
+
+# HTTP query API (python -m qna.api)
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_MAX_BATCH = int(os.getenv("API_MAX_BATCH", "50"))
+
+# Batch JD matching (python -m qna.batch)
+BATCH_SHORTLIST_SIZE = int(os.getenv("BATCH_SHORTLIST_SIZE", "10"))
+BATCH_EMBED_BATCH_SIZE = int(os.getenv("BATCH_EMBED_BATCH_SIZE", "100"))
+BATCH_LLM_WORKERS = int(os.getenv("BATCH_LLM_WORKERS", "8"))
+
+# Prometheus /metrics for the Streamlit process (0 = off; qna.api serves its own)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Stats page (qna.stats): sample query/cache/Redis metrics every STATS_INTERVAL seconds and
+# FT.INFO every STATS_INDEX_INTERVAL seconds, keeping the last STATS_HISTORY samples
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", "10"))
+STATS_INDEX_INTERVAL = float(os.getenv("STATS_INDEX_INTERVAL", "60"))
+STATS_HISTORY = int(os.getenv("STATS_HISTORY", "360"))
@@ -0,0 +1,179 @@
+"""
+Post-retrieval context packing.
+
+Retrieved chunks are grouped per candidate (candidate_id, then email, then
+name), each candidate keeps its best-scoring chunks, and the result is
+rendered as one compact block per candidate with only the fields the prompt
+needs. Chunks are added round-robin across candidates until the token budget
+is spent, so every retrieved candidate gets its best chunk in before anyone
+gets a second one.
+"""
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from qna.attributes import EMAIL, PHONE
+from qna.constants import CONTEXT_CHUNKS_PER_CANDIDATE, CONTEXT_TOKEN_BUDGET, OPENAI_COMPLETIONS_ENGINE
+from qna.metrics import record_context
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=None)
+def _encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(OPENAI_COMPLETIONS_ENGINE)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@dataclass
+class CandidateContext:
+    key: str
+    name: str = ""
+    file_url: str = ""
+    skills: str = ""
+    email: str = ""
+    phone: str = ""
+    score: Optional[float] = None
+    chunks: List[str] = field(default_factory=list)
+
+    def header(self, number: int) -> str:
+        lines = [f"[Kandidat {number}]", f"Nama: {self.name or 'tidak diketahui'}"]
+        if self.score is not None:
+            lines.append(f"Skor: {self.score:g}")
+        lines.append(f"CV: {self.file_url}" if self.file_url else "CV: tidak tersedia")
+        if self.skills:
+            lines.append(f"Skills: {self.skills.replace(',', ', ')}")
+        if self.email:
+            lines.append(f"Email: {self.email}")
+        if self.phone:
+            lines.append(f"Telepon: {self.phone}")
+        lines.append("Cuplikan:")
+        return "\n".join(lines)
+
+
+def candidate_key(doc: Document) -> str:
+    metadata = doc.metadata
+    for name in ("candidate_id", "email", "name", "filename", "id"):
+        value = metadata.get(name)
+        if value:
+            return f"{name}:{str(value).strip().lower()}"
+    return f"content:{hash(doc.page_content)}"
+
+
+def _first_match(pattern, texts) -> str:
+    for text in texts:
+        match = pattern.search(text)
+        if match:
+            return match.group(0).strip()
+    return ""
+
+
+def group_candidates(docs: List[Document], max_chunks: int = CONTEXT_CHUNKS_PER_CANDIDATE) -> List[CandidateContext]:
+    """Group chunks per candidate, keeping retrieval order (best first) for
+    both the candidates and their chunks."""
+    candidates = {}
+    for doc in docs:
+        key = candidate_key(doc)
+        candidate = candidates.get(key)
+        if candidate is None:
+            metadata = doc.metadata
+            candidate = candidates[key] = CandidateContext(
+                key=key,
+                name=str(metadata.get("name") or metadata.get("full_name") or metadata.get("filename") or ""),
+                file_url=str(metadata.get("file_url") or ""),
+                skills=str(metadata.get("skills") or ""),
+                email=str(metadata.get("email") or ""),
+                phone=str(metadata.get("phone") or ""),
+            )
+        text = _WHITESPACE.sub(" ", doc.page_content).strip()
+        if text and text not in candidate.chunks and len(candidate.chunks) < max_chunks:
+            candidate.chunks.append(text)
+
+    for candidate in candidates.values():
+        candidate.email = candidate.email or _first_match(EMAIL, candidate.chunks)
+        candidate.phone = candidate.phone or _first_match(PHONE, candidate.chunks)
+    return list(candidates.values())
+
+
+def select_chunks(
+    candidates: List[CandidateContext],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    max_chunks: int = CONTEXT_CHUNKS_PER_CANDIDATE,
+) -> List[Tuple[CandidateContext, List[str]]]:
+    """Candidates that fit the token budget with the snippet lines they get,
+    in order. [Kandidat N] in pack_context is the Nth entry."""
+    headers = [candidate.header(number) for number, candidate in enumerate(candidates, 1)]
+    used = sum(count_tokens(header) for header in headers)
+    selected: List[List[str]] = [[] for _ in candidates]
+
+    for round_index in range(max_chunks):
+        for i, candidate in enumerate(candidates):
+            if round_index >= len(candidate.chunks):
+                continue
+            line = f"- {candidate.chunks[round_index]}"
+            cost = count_tokens(line)
+            if used + cost > token_budget:
+                continue
+            selected[i].append(line)
+            used += cost
+
+    # A candidate with no room left for a single snippet is dropped.
+    return [(candidate, lines) for candidate, lines in zip(candidates, selected) if lines]
+
+
+def rank_candidates(candidates: List[CandidateContext], scores: Dict[str, float]) -> List[CandidateContext]:
+    """Candidates that have a score (keyed by candidate_id, see qna.scoring),
+    highest first, with the score shown in their header."""
+    scores = {candidate_id.strip().lower(): score for candidate_id, score in scores.items()}
+    ranked = []
+    for candidate in candidates:
+        candidate_id = candidate.key.partition(":")[2] if candidate.key.startswith("candidate_id:") else None
+        if candidate_id in scores:
+            candidate.score = scores[candidate_id]
+            ranked.append(candidate)
+    return sorted(ranked, key=lambda candidate: -candidate.score)
+
+
+def pack_context(
+    docs: List[Document],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    max_chunks: int = CONTEXT_CHUNKS_PER_CANDIDATE,
+    candidates: Optional[List[CandidateContext]] = None,
+) -> str:
+    """Compact per-candidate context block for the prompt, within token_budget."""
+    candidates = candidates if candidates is not None else group_candidates(docs, max_chunks)
+    kept = select_chunks(candidates, token_budget, max_chunks)
+    blocks = ["\n".join([candidate.header(number), *lines]) for number, (candidate, lines) in enumerate(kept, 1)]
+    context = "\n\n".join(blocks) or "(tidak ada kandidat yang cocok)"
+    record_context(count_tokens(context), len(kept))
+    return context
+
+
+def format_candidates(candidates: List[CandidateContext]) -> str:
+    """Markdown list of candidates in retrieval order, for answers without the LLM."""
+    if not candidates:
+        return "Tidak ada kandidat yang cocok."
+    lines = []
+    for candidate in candidates:
+        link = f"[Lihat CV]({candidate.file_url})" if candidate.file_url else "CV link tidak tersedia"
+        lines.append(f"- **{candidate.name or 'tidak diketahui'}** — {link}")
+        if candidate.skills:
+            lines.append(f"  Skills: {candidate.skills.replace(',', ', ')}")
+    return "\n".join(lines)
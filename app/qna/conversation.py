@@ -0,0 +1,112 @@
+"""
+Conversational follow-ups over the previous result set.
+
+A follow-up such as "yang punya pengalaman k8s saja?" or "dari mereka siapa
+yang di Jakarta?" narrows the candidates already shown. classify() decides
+whether a question refines the previous result or starts a new search.
+refine() filters and re-ranks the previous retrieval locally with the
+qna.scoring rubric: skills, years and locations in the follow-up are hard
+requirements, and a mentioned role only ranks. The LLM then gets the
+surviving candidates and a short history summary instead of a fresh
+full-context retrieval.
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence
+
+from langchain.schema import Document
+
+from qna.constants import CONVERSATION_HISTORY_TURNS
+from qna.scoring import CandidateMatrix, ScoringQuery
+
+REFINE = "refine"
+NEW_SEARCH = "new"
+
+# Words that point back at the previous result.
+_REFERS_BACK = re.compile(
+    r"\b(?:dari mereka|di ?antara(?:nya| mereka)?|tersebut|tadi|sisanya|of them|among them|which of)\b",
+    re.IGNORECASE,
+)
+# Words that narrow, unless the question also names a role ("backend saja" is a new search).
+_NARROWS = re.compile(
+    r"\b(?:saja|aja|doang|paling|yang mana|mana yang|kalau yang|only|just|those|these|most|best)\b",
+    re.IGNORECASE,
+)
+# Words that ask for a different search.
+_NEW_SEARCH = re.compile(
+    r"\b(?:cari(?:kan)?|temukan|tampilkan semua|kandidat lain|yang lain|selain itu|find|search|new search|other candidates)\b",
+    re.IGNORECASE,
+)
+# Short follow-ups without either marker ("k8s?", "minimal 5 tahun") refine.
+_SHORT_FOLLOW_UP = 6
+
+
+def classify(question: str, has_previous: bool) -> str:
+    """REFINE when question narrows the previous result set, else NEW_SEARCH.
+
+    Names and "cari ..." always start a new search, and so does a role unless
+    the question points back ("dari mereka"). Narrowing words ("saja",
+    "paling") or a short question with only constraints refine."""
+    if not has_previous:
+        return NEW_SEARCH
+    query = ScoringQuery.from_text(question)
+    if query.names or _NEW_SEARCH.search(question):
+        return NEW_SEARCH
+    if _REFERS_BACK.search(question):
+        return REFINE
+    if query.roles:
+        return NEW_SEARCH
+    has_constraints = bool(query.must_have or query.nice_to_have or query.min_years or query.locations)
+    if _NARROWS.search(question) or (has_constraints and len(question.split()) <= _SHORT_FOLLOW_UP):
+        return REFINE
+    return NEW_SEARCH
+
+
+def _records(docs: Sequence[Document]) -> List[Dict]:
+    records: Dict[str, Dict] = {}
+    for doc in docs:
+        candidate_id = doc.metadata.get("candidate_id")
+        if candidate_id and candidate_id not in records:
+            records[candidate_id] = {**doc.metadata, "candidate_id": candidate_id}
+    return list(records.values())
+
+
+def refine(docs: Sequence[Document], question: str) -> List[Document]:
+    """The previous docs of the candidates that meet the follow-up, best
+    candidates first, keeping each candidate's chunk order. Docs without a
+    candidate_id can't be checked and are dropped."""
+    query = ScoringQuery.from_text(question)
+    # Everything a follow-up names is a requirement ("yang bisa docker saja").
+    query.must_have = list(dict.fromkeys(query.must_have + query.nice_to_have))
+    query.nice_to_have = []
+    matrix = CandidateMatrix.from_records(_records(docs))
+    kept = matrix.shortlist(query, limit=len(matrix), min_score=0)
+    if query.min_years:
+        # Years only rank in the scoring rubric; here they filter, as in retrieval.
+        kept = [c for c in kept if c.years_experience is not None and c.years_experience >= query.min_years]
+    rank = {candidate.candidate_id: i for i, candidate in enumerate(kept)}
+    refined = [doc for doc in docs if doc.metadata.get("candidate_id") in rank]
+    return sorted(refined, key=lambda doc: rank[doc.metadata["candidate_id"]])
+
+
+def history_summary(
+    messages: Sequence[Dict[str, str]], max_turns: int = CONVERSATION_HISTORY_TURNS, max_chars: int = 300
+) -> str:
+    """The last max_turns question/answer pairs of a chat ({"role", "content"}
+    messages, without the current question), answers cut to max_chars."""
+    lines = []
+    for message in list(messages)[-2 * max_turns:]:
+        content = " ".join(str(message.get("content", "")).split())
+        if message.get("role") == "user":
+            lines.append(f"Pengguna: {content}")
+        else:
+            lines.append(f"Asisten: {content[:max_chars]}{'…' if len(content) > max_chars else ''}")
+    return "\n".join(lines)
+
+
+def no_match_answer(question: str, previous_count: Optional[int] = None) -> str:
+    among = f" dari {previous_count} kandidat sebelumnya" if previous_count else " dari hasil sebelumnya"
+    return (
+        f"Tidak ada kandidat{among} yang memenuhi \"{question.strip()}\". "
+        "Coba ajukan sebagai pencarian baru (mis. awali dengan \"cari ...\")."
+    )
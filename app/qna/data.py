@@ -1,9 +1,25 @@
-from typing import List
+import hashlib
+import io
+import os
+import re
+import zipfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
 
 from langchain.schema import Document
 from langchain_community.document_loaders import ArxivLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from qna.constants import CV_BASE_URL, INGEST_CHUNK_OVERLAP, INGEST_CHUNK_SIZE
+from qna.attributes import extract_email, extract_locations, extract_phone, extract_roles, extract_years_experience
+from qna.skills import extract_skills
+
+CV_EXTENSIONS = (".pdf", ".docx")
+
+_DOCX_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_NAME_NOISE = re.compile(r"\b(cv|resume|curriculum|vitae|updated|final|new)\b|\d+", re.IGNORECASE)
+
 
 def get_arxiv_docs(paper_topic_query, num_docs=10) -> List[Document]:
     loader = ArxivLoader(
@@ -20,4 +36,108 @@ def get_arxiv_docs(paper_topic_query, num_docs=10) -> List[Document]:
         add_start_index = True,
     )
     documents = text_splitter.split_documents(raw_documents)
-    return documents
\ No newline at end of file
+    return documents
+
+
+def iter_cv_paths(root) -> Iterator[Path]:
+    """Yield every PDF/DOCX under root, lazily, in a stable order per directory."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(CV_EXTENSIONS) and not filename.startswith("~$"):
+                yield Path(dirpath) / filename
+
+
+def candidate_id_for(path, root) -> str:
+    """Stable id for a CV, derived from its path relative to the ingest root."""
+    relpath = Path(path).relative_to(root).as_posix()
+    return hashlib.sha1(relpath.encode("utf-8")).hexdigest()[:16]
+
+
+def name_from_filename(filename: str) -> str:
+    """Best-effort candidate name from a file name like 'CV_Beni_Saprulah_2024.pdf'."""
+    stem = Path(filename).stem
+    stem = _NAME_NOISE.sub(" ", re.sub(r"[_\-.]+", " ", stem))
+    return " ".join(part.capitalize() for part in stem.split())
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def read_pdf_text(data: bytes) -> str:
+    import pymupdf
+
+    with pymupdf.open(stream=data, filetype="pdf") as pdf:
+        return "\n".join(page.get_text() for page in pdf)
+
+
+def read_docx_text(data: bytes) -> str:
+    # A .docx is a zip of XML parts; the body text lives in word/document.xml.
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    paragraphs = []
+    for paragraph in root.iter(f"{_DOCX_NS}p"):
+        text = "".join(node.text or "" for node in paragraph.iter(f"{_DOCX_NS}t"))
+        if text.strip():
+            paragraphs.append(text)
+    return "\n".join(paragraphs)
+
+
+def load_cv(path, root, data: Optional[bytes] = None) -> Document:
+    path = Path(path)
+    data = path.read_bytes() if data is None else data
+    if path.suffix.lower() == ".pdf":
+        text = read_pdf_text(data)
+    else:
+        text = read_docx_text(data)
+
+    relpath = path.relative_to(root).as_posix()
+    file_url = f"{CV_BASE_URL.rstrip('/')}/{relpath}" if CV_BASE_URL else path.resolve().as_uri()
+    metadata = {
+        "candidate_id": candidate_id_for(path, root),
+        "filename": path.name,
+        "file_url": file_url,
+        "name": name_from_filename(path.name),
+    }
+    return Document(page_content=text, metadata=metadata)
+
+
+def get_cv_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=INGEST_CHUNK_SIZE,
+        chunk_overlap=INGEST_CHUNK_OVERLAP,
+        length_function=len,
+        add_start_index=True,
+    )
+
+
+def split_cv(path, root, known_file_hash: Optional[str] = None) -> Tuple[str, Optional[List[Document]]]:
+    """Load and chunk a single CV. Top-level so it can run in a process pool.
+
+    Returns the file's content hash and its chunks, or None for the chunks when
+    the hash matches known_file_hash and the file does not need re-parsing.
+    """
+    data = Path(path).read_bytes()
+    file_hash = hashlib.sha256(data).hexdigest()
+    if file_hash == known_file_hash:
+        return file_hash, None
+
+    document = load_cv(path, root, data=data)
+    if not document.page_content.strip():
+        return file_hash, []
+    # Skills, roles, locations and years of experience are tagged per candidate and
+    # copied onto every chunk so a filter matches a candidate even when the
+    # evidence is in another chunk. Contact details feed the profile store
+    # (qna.profiles).
+    document.metadata["skills"] = ",".join(extract_skills(document.page_content))
+    document.metadata["location"] = ",".join(extract_locations(document.page_content))
+    document.metadata["roles"] = ",".join(extract_roles(document.page_content))
+    document.metadata["years_experience"] = extract_years_experience(document.page_content)
+    document.metadata["email"] = extract_email(document.page_content)
+    document.metadata["phone"] = extract_phone(document.page_content)
+    chunks = get_cv_splitter().split_documents([document])
+    for index, chunk in enumerate(chunks):
+        chunk.metadata["chunk_index"] = index
+        chunk.metadata["content_hash"] = content_hash(chunk.page_content)
+    return file_hash, chunks
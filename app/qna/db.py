@@ -1,43 +1,88 @@
-from typing import List
+from functools import lru_cache
+from typing import TYPE_CHECKING, List
+
+import redis
 
 from langchain.schema import Document
-from langchain_redis import RedisVectorStore, RedisConfig
 
 # from qna.llm import get_embeddings   # HAPUS
 # from qna.llm import get_embeddings
+from qna.cache import BoundedSemanticCache, ExactLLMCache, IndexGeneration, TieredLLMCache, VersionedLLMCache
+from qna.clients import get_redis_client
 from qna.embeddings import get_embeddings
+from qna.schema import create_index
+
+from qna.constants import (
+    CACHE_TTL,
+    CACHE_TYPE,
+    REDIS_INDEX_NAME,
+    REDIS_KEY_PREFIX,
+    REDIS_URL,
+    SEMANTIC_CACHE_NAME,
+    USES_REDIS,
+)
 
-from qna.constants import CACHE_TYPE, REDIS_INDEX_NAME, REDIS_URL
+if TYPE_CHECKING:
+    # langchain_redis is imported where it's used, so startup doesn't pay for it.
+    from langchain_redis import RedisVectorStore
+
+
+def get_semantic_cache():
+    from langchain_redis import RedisSemanticCache
+    # Set EMBEDDINGS_BACKEND=huggingface to embed cache lookups locally.
+    semantic = RedisSemanticCache(
+        redis_url=REDIS_URL,
+        redis_client=get_redis_client(),
+        embeddings=get_embeddings(),
+        distance_threshold=0.01,
+        ttl=CACHE_TTL or None,
+        name=SEMANTIC_CACHE_NAME,
+        prefix=SEMANTIC_CACHE_NAME,
+    )
+    # Capped at CACHE_REDIS_MAX_ENTRIES like the exact tier; ingestion purges it.
+    return BoundedSemanticCache(semantic, get_redis_client())
 
 
 def get_cache():
-    # construct cache implementation based on env var
-    if CACHE_TYPE == "semantic":
-        from langchain_redis import RedisSemanticCache
+    # construct cache implementation based on env var:
+    # "exact" (hash-keyed LRU + Redis), "semantic", or "tiered" (exact, then semantic).
+    # All of them live in Redis, so there is none on the snapshot backend.
+    if not USES_REDIS:
+        return None
+    if CACHE_TYPE == "exact":
+        print("Using exact cache")
+        cache = ExactLLMCache(client=get_redis_client())
+    elif CACHE_TYPE == "semantic":
         print("Using semantic cache")
-        # TODO change to using huggingface embeddings
-        # so that caching is cheaper and faster.
-        return RedisSemanticCache(
-            redis_url='redis://10.100.34.246:12345',
-            embeddings=get_embeddings(),
-            distance_threshold=0.01
-        )
-    return None
+        cache = TieredLLMCache(None, get_semantic_cache())
+    elif CACHE_TYPE == "tiered":
+        print("Using tiered cache (exact, then semantic)")
+        cache = TieredLLMCache(ExactLLMCache(client=get_redis_client()), get_semantic_cache())
+    else:
+        return None
+    # Entries are tagged with the index generation so re-ingesting CVs invalidates them.
+    return VersionedLLMCache(cache, IndexGeneration(get_redis_client()))
+
 
+@lru_cache(maxsize=None)
+def get_talent_vectorstore() -> "RedisVectorStore":
+    """Process-wide vectorstore over the shared Redis pool; sessions build their
+    own cheap retriever views on top with as_retriever()."""
+    from langchain_redis import RedisVectorStore
 
-def get_talent_vectorstore() -> RedisVectorStore:
     embeddings = get_embeddings()
     # config = RedisConfig.from_yaml("qna/arxiv.yaml", redis_url=REDIS_URL)
 
 
     vectorstore = RedisVectorStore.from_existing_index(
         embedding=embeddings,
-        index_name="talent-pool",   # <--- ganti di sini
-        redis_url='redis://10.100.34.246:12345',
+        index_name=REDIS_INDEX_NAME,
+        redis_url=REDIS_URL,
+        redis_client=get_redis_client(),
         embedding_field="content_vector",
         content_field="content",
         metadata_field="metadata",
-        key_prefix="doc:talent-pool:",
+        key_prefix=REDIS_KEY_PREFIX,
     )
 
     return vectorstore
@@ -45,3 +90,12 @@ def get_talent_vectorstore() -> RedisVectorStore:
     return vectorstore
 
 
+def create_talent_index(
+    client: redis.Redis, dims: int, index_name: str = REDIS_INDEX_NAME, key_prefix: str = REDIS_KEY_PREFIX
+) -> bool:
+    """Create the talent index for an embedding model of the given width.
+
+    The field layout and vector settings live in qna.schema.
+    Returns False when the index already exists.
+    """
+    return create_index(client, dims, index_name=index_name, key_prefix=key_prefix)
@@ -1,6 +1,295 @@
-from langchain_openai import OpenAIEmbeddings
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import redis
+
 from langchain.embeddings.base import Embeddings
-from qna.constants import OPENAI_EMBEDDINGS_ENGINE
+from qna.constants import (
+    EMBEDDINGS_BACKEND,
+    EMBEDDINGS_BASE_MODEL,
+    EMBEDDINGS_BATCH_SIZE,
+    EMBEDDINGS_CACHE,
+    EMBEDDINGS_CACHE_SIZE,
+    EMBEDDINGS_CACHE_TTL,
+    EMBEDDINGS_DIMENSIONS,
+    EMBEDDINGS_MODEL,
+    EMBEDDINGS_NUM_THREADS,
+    EMBEDDINGS_REDUCTION,
+    FAKE_EMBEDDINGS_DIMS,
+    HF_EMBEDDINGS_MODEL,
+    OPENAI_EMBEDDINGS_ENGINE,
+    RETRIEVAL_TIMEOUT,
+    SNAPSHOT_PATH,
+    USES_REDIS,
+)
+from qna.clients import get_async_http_client, get_http_client, get_redis_client
+from qna.metrics import record_cache, timed_redis
+from qna.reduction import PROJECTION_FILE, ProjectedEmbeddings
+
+
+@dataclass
+class EmbeddingCacheStats:
+    memory_hits: int = 0
+    redis_hits: int = 0
+    misses: int = 0
+    miss_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, memory_hits=0, redis_hits=0, misses=0, miss_seconds=0.0):
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.redis_hits += redis_hits
+            self.misses += misses
+            self.miss_seconds += miss_seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            hits = self.memory_hits + self.redis_hits
+            total = hits + self.misses
+            per_miss = self.miss_seconds / self.misses if self.misses else 0.0
+            return {
+                "memory_hits": self.memory_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                # Upstream calls avoided, priced at the average observed miss latency.
+                "est_seconds_saved": hits * per_miss,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper with an in-process LRU tier and a persistent Redis tier.
+
+    Vectors are keyed by model name and the sha256 of the text, so the semantic
+    LLM cache and the retriever share one embedding per text. Without a client
+    only the in-process tier is used (see get_ingest_embeddings).
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        client: Optional[redis.Redis] = None,
+        max_entries: int = EMBEDDINGS_CACHE_SIZE,
+        ttl: Optional[int] = EMBEDDINGS_CACHE_TTL,
+        namespace: str = "embcache",
+    ):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.client = client
+        self.max_entries = max_entries
+        self.ttl = ttl or None
+        self.namespace = namespace
+        self.stats = EmbeddingCacheStats()
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{self.model_name}:{digest}"
+
+    def _memory_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            return vector
+
+    def _memory_put(self, key: str, vector: List[float]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        for key in keys:
+            vector = self._memory_get(key)
+            if vector is not None:
+                found[key] = vector
+        memory_hits = len(found)
+
+        remote = [key for key in keys if key not in found]
+        if remote and self.client is not None:
+            try:
+                with timed_redis("embedding_cache_get"):
+                    values = self.client.mget(remote)
+            except redis.RedisError:
+                values = [None] * len(remote)
+            for key, value in zip(remote, values):
+                if value is not None:
+                    vector = np.frombuffer(value, dtype=np.float32).tolist()
+                    found[key] = vector
+                    self._memory_put(key, vector)
+
+        self.stats.record(memory_hits=memory_hits, redis_hits=len(found) - memory_hits)
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]):
+        for key, vector in vectors.items():
+            self._memory_put(key, vector)
+        if self.client is None:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, vector in vectors.items():
+                pipe.set(key, np.asarray(vector, dtype=np.float32).tobytes(), ex=self.ttl)
+            pipe.execute()
+        except redis.RedisError:
+            pass  # the persistent tier is best effort
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        # Identical texts within one batch (CV boilerplate) are embedded once.
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            start = time.perf_counter()
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            self.stats.record(misses=len(missing), miss_seconds=time.perf_counter() - start)
+            computed = dict(zip(missing, vectors))
+            self._store(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        start = time.perf_counter()
+        found = self._lookup([key])
+        record_cache("embedding", key in found, time.perf_counter() - start, serves_answer=False)
+        if key in found:
+            return found[key]
+        start = time.perf_counter()
+        vector = self.underlying.embed_query(text)
+        self.stats.record(misses=1, miss_seconds=time.perf_counter() - start)
+        self._store({key: vector})
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # The cache tiers are cheap and stay synchronous (in a worker thread for
+        # the Redis round trip); only the model call goes through the async API.
+        key = self._key(text)
+        start = time.perf_counter()
+        vector = self._memory_get(key)
+        if vector is not None:
+            self.stats.record(memory_hits=1)
+            record_cache("embedding", True, time.perf_counter() - start, serves_answer=False)
+            return vector
+        found = await asyncio.to_thread(self._lookup, [key])
+        record_cache("embedding", key in found, time.perf_counter() - start, serves_answer=False)
+        if key in found:
+            return found[key]
+        start = time.perf_counter()
+        vector = await self.underlying.aembed_query(text)
+        self.stats.record(misses=1, miss_seconds=time.perf_counter() - start)
+        await asyncio.to_thread(self._store, {key: vector})
+        return vector
+
 
+def _openai_embeddings(dimensions: Optional[int] = None) -> Embeddings:
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(
+        model=OPENAI_EMBEDDINGS_ENGINE,
+        dimensions=dimensions,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+        timeout=RETRIEVAL_TIMEOUT,
+        max_retries=0,  # retries are handled by qna.retry
+    )
+
+
+def _huggingface_embeddings(dimensions: Optional[int] = None) -> Embeddings:
+    if dimensions:
+        raise ValueError("huggingface embeddings have no native dimensions, use EMBEDDINGS_REDUCTION=pca")
+    # Imported lazily: torch and sentence-transformers are heavy and only
+    # needed when the local backend is selected.
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    torch.set_num_threads(EMBEDDINGS_NUM_THREADS)
+    return HuggingFaceEmbeddings(
+        model_name=HF_EMBEDDINGS_MODEL,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"batch_size": EMBEDDINGS_BATCH_SIZE, "normalize_embeddings": True},
+    )
+
+
+def _fake_embeddings(dimensions: Optional[int] = None) -> Embeddings:
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    return DeterministicFakeEmbedding(size=dimensions or FAKE_EMBEDDINGS_DIMS)
+
+
+EMBEDDING_BACKENDS = {
+    "openai": _openai_embeddings,
+    "huggingface": _huggingface_embeddings,
+    "fake": _fake_embeddings,
+}
+
+
+def _backend(dimensions: Optional[int] = None) -> Embeddings:
+    if EMBEDDINGS_BACKEND not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown EMBEDDINGS_BACKEND {EMBEDDINGS_BACKEND!r}, expected one of {sorted(EMBEDDING_BACKENDS)}"
+        )
+    return EMBEDDING_BACKENDS[EMBEDDINGS_BACKEND](dimensions)
+
+
+def _cached(embeddings: Embeddings, model_name: str, persistent: bool = True) -> Embeddings:
+    if not EMBEDDINGS_CACHE:
+        return embeddings
+    client = get_redis_client() if persistent and USES_REDIS else None
+    return CachedEmbeddings(embeddings, model_name=model_name, client=client)
+
+
+@lru_cache(maxsize=None)
+def get_base_embeddings() -> Embeddings:
+    """Full-width vectors from EMBEDDINGS_BACKEND, before any reduction."""
+    return _cached(_backend(), EMBEDDINGS_BASE_MODEL)
+
+
+@lru_cache(maxsize=None)
 def get_embeddings() -> Embeddings:
-    return OpenAIEmbeddings(model=OPENAI_EMBEDDINGS_ENGINE)
+    """Process-wide embeddings for EMBEDDINGS_BACKEND, wrapped in the embedding
+    cache unless EMBEDDINGS_CACHE=false, and reduced to EMBEDDINGS_DIMENSIONS
+    when that is set (see qna.reduction)."""
+    if not EMBEDDINGS_DIMENSIONS:
+        return get_base_embeddings()
+    if EMBEDDINGS_REDUCTION == "native":
+        return _cached(_backend(EMBEDDINGS_DIMENSIONS), EMBEDDINGS_MODEL)
+    if EMBEDDINGS_REDUCTION == "pca":
+        return _projected(get_base_embeddings())
+    raise ValueError(f"Unknown EMBEDDINGS_REDUCTION {EMBEDDINGS_REDUCTION!r}, expected native or pca")
+
+
+def get_ingest_embeddings() -> Embeddings:
+    """get_embeddings() for qna.ingest: the same vectors, but the cache stays
+    in-process. The index hash already stores every chunk vector and the
+    manifests keep unchanged chunks from being re-embedded, so a Redis copy
+    under embcache:* would only double vector memory. The in-process tier
+    still embeds repeated boilerplate once per run."""
+    if not EMBEDDINGS_DIMENSIONS:
+        return _cached(_backend(), EMBEDDINGS_BASE_MODEL, persistent=False)
+    if EMBEDDINGS_REDUCTION == "native":
+        return _cached(_backend(EMBEDDINGS_DIMENSIONS), EMBEDDINGS_MODEL, persistent=False)
+    if EMBEDDINGS_REDUCTION == "pca":
+        return _projected(_cached(_backend(), EMBEDDINGS_BASE_MODEL, persistent=False))
+    raise ValueError(f"Unknown EMBEDDINGS_REDUCTION {EMBEDDINGS_REDUCTION!r}, expected native or pca")
+
+
+def _projected(base: Embeddings) -> ProjectedEmbeddings:
+    # Snapshot replicas read the projection exported with the snapshot.
+    if USES_REDIS:
+        return ProjectedEmbeddings(base, EMBEDDINGS_DIMENSIONS, client=get_redis_client())
+    return ProjectedEmbeddings(base, EMBEDDINGS_DIMENSIONS, path=Path(SNAPSHOT_PATH) / PROJECTION_FILE)
@@ -0,0 +1,542 @@
+"""
+Asyncio query engine.
+
+One engine per process serves every session. It runs its own event loop on a
+background thread and owns the async Redis client for that loop. Synchronous
+callers (Streamlit script threads) go through run() and iterate(), and other
+event loops go through submit() and aiterate().
+
+Follow-ups that narrow the previous result go through refine(), which
+filters that result locally instead of searching again.
+
+Name-only questions are answered from the candidate profiles (qna.profiles)
+in one Redis round trip. Job-description questions are first scored against the whole pool with
+qna.scoring. The LLM then only summarizes the shortlist, and with
+use_llm=False the shortlist (or, for other questions, the retrieved
+candidates) is the answer.
+
+For each question the engine looks up the question-level answer cache while the
+question is being embedded. On a hit, the embedding is cancelled and the cached
+answer and sources are returned. On a miss, the hybrid search runs on the async
+Redis client and the answer streams from the async OpenAI client. Each question is
+also counted in the most-asked log that qna.warmup primes the answer cache
+from at the next start.
+
+Both stages go through a QueryLimiter. It caps how many queries are in flight,
+and the number waiting for a slot is the queue-depth metric.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, AsyncIterator, Coroutine, Dict, Iterator, List, Optional
+
+from langchain.schema import Document
+
+from qna.cache import ExactCache, IndexGeneration
+from qna.clients import get_redis_client, make_async_redis_client
+from qna.constants import (
+    ANSWER_CACHE,
+    CONTEXT_CHUNKS_PER_CANDIDATE,
+    ENGINE_CONCURRENCY,
+    HYBRID_FETCH_K,
+    LLM_TIMEOUT,
+    PROFILE_LOOKUP,
+    RETRIEVAL_BACKEND,
+    REDIS_INDEX_NAME,
+    RERANK_FETCH_K,
+    RETRIEVAL_MODE,
+    RETRIEVAL_TIMEOUT,
+    SCORING,
+    SCORING_POOL_SIZE,
+    SCORING_SHORTLIST_SIZE,
+    USES_REDIS,
+)
+from qna.context import format_candidates, group_candidates, pack_context, rank_candidates
+from qna.conversation import no_match_answer, refine
+from qna.embeddings import get_embeddings
+from qna.llm import astream_answer, get_llm
+from qna.metrics import QueryTrace, observe_stage, timed, use_trace
+from qna.profiles import Profile, alookup_names, aread_profiles, format_profiles, is_name_lookup
+from qna.prompt import basic_prompt, followup_prompt, summary_prompt
+from qna.query import QueryError, QueryRequest, QueryResult, _stage_error
+from qna.rerank import get_reranker
+from qna.retrieval import ahybrid_search, parse_query
+from qna.retry import aretrying
+from qna.scoring import ScoredCandidate, ScoringQuery, format_shortlist, get_matrix_store, rank_by_relevance
+from qna.snapshot import SnapshotMatrixStore, get_snapshot_store
+from qna.warmup import arecord_question
+
+logger = logging.getLogger("qna.query")
+
+
+class QueryLimiter:
+    """Async semaphore that counts its queue: waiting is the current queue
+    depth and peak_waiting the deepest it has been."""
+
+    def __init__(self, limit: int = ENGINE_CONCURRENCY):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.wait_seconds = 0.0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self):
+        start = time.perf_counter()
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+        waited = time.perf_counter() - start
+        self.wait_seconds += waited
+        observe_stage("queue_wait", waited)
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "avg_wait_ms": 1000 * self.wait_seconds / self.admitted if self.admitted else 0.0,
+        }
+
+
+@dataclass
+class Retrieval:
+    """Outcome of the retrieval stage. answer is set when the whole answer came
+    from the answer cache or needs no LLM, in which case generation is skipped.
+    shortlist is set for job-description questions scored by qna.scoring, and
+    profiles holds the profile of every candidate in docs (or in a name lookup).
+    history is set for a refined follow-up (qna.conversation)."""
+
+    docs: List[Document]
+    answer: Optional[str] = None
+    cache_key: Optional[str] = None
+    trace: Optional[QueryTrace] = None
+    shortlist: Optional[List[ScoredCandidate]] = None
+    profiles: Optional[List[Profile]] = None
+    history: Optional[str] = None
+
+
+def _dump_answer(answer: str, docs: List[Document]) -> str:
+    return json.dumps(
+        {"answer": answer, "docs": [{"page_content": d.page_content, "metadata": d.metadata} for d in docs]}
+    )
+
+
+def _load_answer(value: str) -> Retrieval:
+    payload = json.loads(value)
+    return Retrieval(docs=[Document(**doc) for doc in payload["docs"]], answer=payload["answer"])
+
+
+def _tied_at_cut(pool: List[ScoredCandidate], limit: int = SCORING_SHORTLIST_SIZE) -> bool:
+    """Whether cutting the score-ordered pool to limit splits a tie."""
+    return len(pool) > limit and pool[limit - 1].score == pool[limit].score
+
+
+def _ranked(retrieval: Retrieval) -> Retrieval:
+    """Cut the scored pool to the shortlist, equal scores ordered by how early
+    retrieval found each candidate, and keep only the shortlist's chunks."""
+    if not retrieval.shortlist:
+        return retrieval
+    retrieval.shortlist = rank_by_relevance(
+        retrieval.shortlist, (doc.metadata.get("candidate_id") for doc in retrieval.docs)
+    )
+    kept = {candidate.candidate_id for candidate in retrieval.shortlist}
+    retrieval.docs = [doc for doc in retrieval.docs if doc.metadata.get("candidate_id") in kept]
+    return retrieval
+
+
+class QueryEngine:
+    def __init__(
+        self,
+        concurrency: int = ENGINE_CONCURRENCY,
+        embeddings=None,
+        index_name: str = REDIS_INDEX_NAME,
+        fetch_k: int = HYBRID_FETCH_K,
+        answer_cache: bool = ANSWER_CACHE and USES_REDIS,
+        profile_lookup: bool = PROFILE_LOOKUP and USES_REDIS,
+        scoring: bool = SCORING,
+    ):
+        self.embeddings = embeddings or get_embeddings()
+        self.index_name = index_name
+        self.fetch_k = fetch_k
+        self.generation = IndexGeneration(get_redis_client())
+        self.answers = ExactCache("answercache", client=get_redis_client(), label="answer") if answer_cache else None
+        self.reranker = get_reranker()
+        self.profile_lookup = profile_lookup
+        # With the snapshot backend, search and scoring read the local
+        # snapshot and make no Redis round trips.
+        self.snapshot = get_snapshot_store() if RETRIEVAL_BACKEND == "snapshot" else None
+        if not scoring:
+            self.scoring = None
+        elif self.snapshot is not None:
+            self.scoring = SnapshotMatrixStore(self.snapshot)
+        else:
+            self.scoring = get_matrix_store()
+        self._redis = None
+        self._background: set = set()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="query-engine", daemon=True)
+        self._thread.start()
+        # The limiter's semaphore must be created on the engine's loop.
+        self.limiter = self.run(self._make_limiter(concurrency))
+
+    @staticmethod
+    async def _make_limiter(concurrency: int) -> QueryLimiter:
+        return QueryLimiter(concurrency)
+
+    # ---- bridges for callers outside the engine loop ----
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule coro on the engine loop; await it from another loop with
+        asyncio.wrap_future(engine.submit(coro))."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run coro on the engine loop and block until it finishes."""
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, stream: AsyncIterator[str]) -> Iterator[str]:
+        """Drive an async generator on the engine loop from a sync thread."""
+        try:
+            while True:
+                try:
+                    yield self.run(stream.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(stream.aclose())
+
+    async def aiterate(self, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        """iterate() for callers on another event loop (e.g. qna.api)."""
+        try:
+            while True:
+                try:
+                    yield await asyncio.wrap_future(self.submit(stream.__anext__()))
+                except StopAsyncIteration:
+                    return
+        finally:
+            await asyncio.wrap_future(self.submit(stream.aclose()))
+
+    # ---- query stages (run on the engine loop) ----
+
+    def _client(self):
+        if self._redis is None:
+            self._redis = make_async_redis_client()
+        return self._redis
+
+    def _answer_key(self, request: QueryRequest) -> str:
+        llm_string = get_llm(max_tokens=request.max_tokens)._get_llm_string()
+        group = f"{llm_string}#generation={self.generation.current()}#k={request.k}"
+        if self.reranker is not None:
+            group += f"#rerank={self.reranker.model_name}"
+        if self.scoring is not None:
+            group += "#scoring"
+        return self.answers.key(group, " ".join(request.question.lower().split()))
+
+    async def _shortlist(self, request: QueryRequest) -> Optional[List[ScoredCandidate]]:
+        """The SCORING_POOL_SIZE best scored candidates for a job-description
+        question, else None. _ranked() cuts it to the shortlist."""
+        if self.scoring is None:
+            return None
+        query = ScoringQuery.from_text(request.question)
+        if not query.is_jobdesc:
+            return None
+        with timed("scoring"):
+            matrix = await asyncio.to_thread(self.scoring.current)
+            return matrix.shortlist(query, limit=SCORING_POOL_SIZE) if matrix is not None else None
+
+    async def _search(self, request: QueryRequest, shortlist: Optional[List[ScoredCandidate]] = None) -> List[Document]:
+        with timed("embedding"):
+            vector = await self.embeddings.aembed_query(request.question)
+        # Enough chunks for every candidate of the scored pool to be ranked
+        # and reach the context.
+        k = max(request.k, len(shortlist or []) * CONTEXT_CHUNKS_PER_CANDIDATE)
+        # With a reranker, over-fetch and let the cross-encoder (on a worker
+        # thread, it is CPU bound) pick the k chunks for the prompt.
+        fetch = max(k, RERANK_FETCH_K) if self.reranker else k
+        candidate_ids = [candidate.candidate_id for candidate in shortlist or []]
+        if self.snapshot is not None:
+            snapshot = await asyncio.to_thread(self.snapshot.current)
+            docs = await asyncio.to_thread(
+                snapshot.search_documents,
+                request.question,
+                vector,
+                fetch,
+                candidate_ids,
+                RETRIEVAL_MODE == "hybrid",
+            )
+        else:
+            docs = await ahybrid_search(
+                request.question,
+                vector,
+                fetch,
+                self._client(),
+                fetch_k=max(self.fetch_k, fetch),
+                index_name=self.index_name,
+                hybrid=RETRIEVAL_MODE == "hybrid",
+                candidate_ids=candidate_ids,
+            )
+        if self.reranker is None:
+            return docs
+        return await asyncio.to_thread(self.reranker.rerank, request.question, docs, k)
+
+    async def _retrieve(self, request: QueryRequest, shortlist: Optional[List[ScoredCandidate]] = None) -> List[Document]:
+        async for attempt in aretrying(RETRIEVAL_TIMEOUT):
+            with attempt:
+                return await self._search(request, shortlist)
+
+    async def _lookup(self, request: QueryRequest) -> Optional[Retrieval]:
+        """The answer to a name-only question, from the profiles. None when it
+        isn't one, or nobody matches (the search then gets a chance, e.g.
+        before profiles have been built)."""
+        if not self.profile_lookup:
+            return None
+        parsed = parse_query(request.question)
+        if not is_name_lookup(parsed):
+            return None
+        with timed("profile_lookup"):
+            profiles = await alookup_names(self._client(), parsed.names)
+        if not profiles:
+            return None
+        return Retrieval(docs=[], answer=format_profiles(profiles, parsed.names), profiles=profiles)
+
+    async def _with_profiles(self, retrieval: Retrieval) -> Retrieval:
+        if not self.profile_lookup:
+            return retrieval
+        if retrieval.profiles is None and (retrieval.docs or retrieval.shortlist):
+            candidate_ids = [doc.metadata.get("candidate_id") for doc in retrieval.docs]
+            candidate_ids += [candidate.candidate_id for candidate in retrieval.shortlist or []]
+            candidate_ids = list(dict.fromkeys(filter(None, candidate_ids)))
+            with timed("profiles"):
+                retrieval.profiles = list((await aread_profiles(self._client(), candidate_ids)).values())
+        return retrieval
+
+    async def _retrieve_or_cached(self, request: QueryRequest) -> Retrieval:
+        try:
+            lookup = await self._lookup(request)
+        except Exception as e:
+            raise _stage_error("profile_lookup", e) from e
+        if lookup is not None:
+            return lookup
+        try:
+            shortlist = await self._shortlist(request)
+        except Exception as e:
+            raise _stage_error("scoring", e) from e
+        if shortlist is not None and not shortlist:
+            return Retrieval(docs=[], answer=format_shortlist(shortlist), shortlist=shortlist)
+        if shortlist and not request.use_llm:
+            docs = []
+            if _tied_at_cut(shortlist):
+                try:
+                    docs = await self._retrieve(request, shortlist)
+                except Exception as e:
+                    raise _stage_error("retrieval", e) from e
+            retrieval = _ranked(Retrieval(docs=docs, shortlist=shortlist))
+            retrieval.docs, retrieval.answer = [], format_shortlist(retrieval.shortlist)
+            return retrieval
+        if not request.use_llm:
+            try:
+                docs = await self._retrieve(request)
+            except Exception as e:
+                raise _stage_error("retrieval", e) from e
+            return Retrieval(docs=docs, answer=format_candidates(group_candidates(docs)))
+
+        search = asyncio.ensure_future(self._retrieve(request, shortlist))
+        key = None
+        if self.answers is not None:
+            try:
+                key = await asyncio.to_thread(self._answer_key, request)
+                cached = await self.answers.aget(key, self._client())
+            except asyncio.CancelledError:
+                search.cancel()
+                raise
+            except Exception as e:
+                # A failed lookup is a miss; the search started above answers.
+                logger.warning("answer cache lookup failed: %s", e)
+                key, cached = None, None
+            if cached is not None:
+                search.cancel()
+                retrieval = _load_answer(cached)
+                retrieval.cache_key = key
+                retrieval.shortlist = shortlist
+                return _ranked(retrieval)
+        try:
+            docs = await search
+        except Exception as e:
+            raise _stage_error("retrieval", e) from e
+        return _ranked(Retrieval(docs=docs, cache_key=key, shortlist=shortlist))
+
+    def _record_question(self, request: QueryRequest):
+        """Count the question for the warm-up's answer cache priming, without
+        waiting for Redis; a failed write is only logged."""
+        if self.answers is None or not request.use_llm:
+            return
+        task = asyncio.ensure_future(arecord_question(self._client(), request.question))
+        self._background.add(task)
+        task.add_done_callback(self._question_recorded)
+
+    def _question_recorded(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("question log write failed: %s", task.exception())
+
+    async def retrieve(self, request: QueryRequest) -> Retrieval:
+        trace = QueryTrace(request.question)
+        self._record_question(request)
+        with use_trace(trace):
+            await self.limiter.acquire()
+            try:
+                with timed("retrieval"):
+                    retrieval = await self._retrieve_or_cached(request)
+                try:
+                    retrieval = await self._with_profiles(retrieval)
+                except Exception as e:
+                    raise _stage_error("profiles", e) from e
+            except QueryError as e:
+                trace.finish(e)
+                raise
+            finally:
+                self.limiter.release()
+        retrieval.trace = trace
+        return retrieval
+
+    async def refine(self, request: QueryRequest, previous: List[Document], history: str) -> Retrieval:
+        """Retrieval for a follow-up that narrows previous (the docs of the last
+        answer): filtered and re-ranked locally, without embedding or search.
+        Stream it as usual; the LLM gets the history summary and only the
+        remaining candidates."""
+        trace = QueryTrace(request.question)
+        trace.set(mode="refine", previous_docs=len(previous))
+        with use_trace(trace):
+            with timed("refine"):
+                docs = refine(previous, request.question)
+            retrieval = Retrieval(docs=docs, history=history, trace=trace)
+            if not docs:
+                previous_candidates = {doc.metadata.get("candidate_id") for doc in previous}
+                retrieval.answer = no_match_answer(request.question, len(previous_candidates - {None}))
+            elif not request.use_llm:
+                retrieval.answer = format_candidates(group_candidates(docs))
+            try:
+                return await self._with_profiles(retrieval)
+            except Exception as e:
+                error = _stage_error("profiles", e)
+                trace.finish(error)
+                raise error from e
+
+    async def stream(self, request: QueryRequest, retrieval: Retrieval) -> AsyncIterator[str]:
+        """Answer tokens for a Retrieval. As with qna.query.stream_query, retries
+        stop once the first token has arrived. The query's trace is finished
+        (logged) when the stream ends."""
+        trace = retrieval.trace or QueryTrace(request.question)
+        if retrieval.answer is not None:
+            yield retrieval.answer
+            trace.finish()
+            return
+
+        # The trace is only made current up to the first token: the cache
+        # lookups happen there, and a context var can't be held across yields.
+        with use_trace(trace):
+            await self.limiter.acquire()
+        try:
+            with use_trace(trace):
+                llm = get_llm(max_tokens=request.max_tokens)
+                prompt = basic_prompt()
+                with timed("prompt_assembly"):
+                    if retrieval.history is not None:
+                        context = pack_context(retrieval.docs)
+                        prompt = followup_prompt().partial(history=retrieval.history or "-")
+                    elif retrieval.shortlist:
+                        # Already filtered and ranked: the LLM only summarizes.
+                        scores = {candidate.candidate_id: candidate.score for candidate in retrieval.shortlist}
+                        candidates = rank_candidates(group_candidates(retrieval.docs), scores)
+                        context = pack_context(retrieval.docs, candidates=candidates)
+                        prompt = summary_prompt()
+                    else:
+                        context = pack_context(retrieval.docs)
+                start = time.perf_counter()
+                try:
+                    async for attempt in aretrying(LLM_TIMEOUT):
+                        with attempt:
+                            tokens = astream_answer(llm, prompt, context, request.question)
+                            first = await anext(tokens, None)
+                except Exception as e:
+                    error = _stage_error("generation", e)
+                    trace.finish(error)
+                    raise error from e
+                observe_stage("llm_first_token", time.perf_counter() - start)
+            if first is None:
+                trace.finish()
+                return
+
+            parts = [first]
+            yield first
+            try:
+                async for token in tokens:
+                    parts.append(token)
+                    yield token
+            except Exception as e:
+                error = _stage_error("generation", e)
+                trace.finish(error)
+                raise error from e
+            observe_stage("llm_total", time.perf_counter() - start, trace)
+        finally:
+            self.limiter.release()
+
+        if self.answers is not None and retrieval.cache_key:
+            await self.answers.aset(retrieval.cache_key, _dump_answer("".join(parts), retrieval.docs), self._client())
+        trace.finish()
+
+    async def query(self, request: QueryRequest) -> QueryResult:
+        """Blocking-style query: retrieval plus the full answer, with timings."""
+        retrieval = await self.retrieve(request)
+        answer = "".join([token async for token in self.stream(request, retrieval)])
+        trace = retrieval.trace
+        return QueryResult(
+            answer=answer,
+            source_documents=retrieval.docs,
+            timings={**trace.stages, "total": time.perf_counter() - trace.started},
+            cached=trace.cache_hit is not None,
+            shortlist=retrieval.shortlist,
+            profiles=retrieval.profiles,
+        )
+
+    def clear_answers(self):
+        if self.answers is not None:
+            self.answers.clear()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {"limiter": self.limiter.snapshot()}
+        if self.answers is not None:
+            stats.update({f"answer_{tier}": s.snapshot() for tier, s in self.answers.stats.items()})
+        return stats
+
+
+@lru_cache(maxsize=None)
+def get_engine() -> QueryEngine:
+    """Process-wide query engine."""
+    return QueryEngine()
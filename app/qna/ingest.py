@@ -0,0 +1,508 @@
+"""
+Bulk CV ingestion into the talent-pool index.
+
+CVs (PDF/DOCX) are streamed from a local directory through a process pool for
+parsing and chunking, embedded in batches, and written to Redis as hashes with
+pipelined HSETs under the index key prefix (``doc:talent-pool:`` by default),
+where the existing RediSearch index picks them up.
+
+Runs are incremental. Every candidate (one CV file) has a manifest hash under
+``manifest:talent-pool:<candidate_id>`` holding the file hash, the content
+hashes of its chunks and the candidate fields (name, skills, roles, ...), and
+chunk keys are derived from those content hashes. A compact profile per
+candidate and a name index are kept next to it for lookups (qna.profiles).
+A re-run skips files whose hash is unchanged, embeds only chunks whose content
+is new, deletes keys for chunks that disappeared, and prunes candidates whose
+CV is gone from the directory. Any run that changes the index bumps the index
+generation, which turns cached LLM answers from before the run into misses,
+after rebuilding the qna.scoring matrix from the manifests.
+
+Run from the app directory:
+    poetry run python -m qna.ingest /data/cvs --workers 8
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from langchain.schema import Document
+from langchain.embeddings.base import Embeddings
+
+from qna.constants import (
+    EMBEDDINGS_DIMENSIONS,
+    INGEST_EMBED_BATCH_SIZE,
+    INGEST_EMBED_CONCURRENCY,
+    INGEST_MAX_ATTEMPTS,
+    INGEST_RETRY_BUDGET,
+    INGEST_WORKERS,
+    INGEST_WRITE_BATCH_SIZE,
+    PCA_SAMPLE_SIZE,
+    REDIS_INDEX_NAME,
+    REDIS_KEY_PREFIX,
+    REDIS_MANIFEST_PREFIX,
+)
+from qna.cache import bump_index_generation
+from qna.clients import get_redis_client
+from qna.data import candidate_id_for, iter_cv_paths, split_cv
+from qna.db import create_talent_index
+from qna.embeddings import get_ingest_embeddings
+from qna.profiles import Profile, delete_profiles, read_profiles, write_profiles
+from qna.reduction import ProjectedEmbeddings
+from qna.retry import retrying
+from qna.schema import FULL_VECTOR_FIELD, stores_full_vectors, vector_bytes
+from qna.scoring import SCORING_KEY, CandidateMatrix, save_matrix
+from qna.stats import publish_ingest_progress
+
+logger = logging.getLogger("qna.ingest")
+
+# Chunk keys and manifests use a 64-bit prefix of the sha256 content hash.
+HASH_LEN = 16
+MANIFEST_SET = f"{REDIS_MANIFEST_PREFIX}candidates"
+
+
+@dataclass
+class IngestStats:
+    docs: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    removed: int = 0
+    chunks: int = 0
+    reused: int = 0
+    deleted: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def docs_per_sec(self) -> float:
+        return (self.docs + self.unchanged) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed else 0.0
+
+    def report(self) -> str:
+        return (
+            f"{self.docs} docs parsed, {self.unchanged} unchanged, {self.failed} failed, "
+            f"{self.removed} removed | {self.chunks} chunks embedded, {self.reused} reused, "
+            f"{self.deleted} deleted in {self.elapsed:.1f}s | "
+            f"{self.docs_per_sec:.1f} docs/sec, {self.chunks_per_sec:.1f} chunks/sec"
+        )
+
+    def to_dict(self) -> Dict[str, float]:
+        """Counts and rates, as published for the Stats page (qna.stats)."""
+        with self._lock:
+            counts = {
+                name: getattr(self, name)
+                for name in ("docs", "unchanged", "failed", "removed", "chunks", "reused", "deleted")
+            }
+        return {
+            **counts,
+            "elapsed_s": round(self.elapsed, 1),
+            "docs_per_sec": round(self.docs_per_sec, 2),
+            "chunks_per_sec": round(self.chunks_per_sec, 2),
+        }
+
+
+@dataclass
+class Manifest:
+    file_hash: str
+    chunk_hashes: List[str]
+
+
+@dataclass
+class CandidateUpdate:
+    candidate_id: str
+    file_hash: str
+    filename: str
+    chunk_hashes: List[str]
+    new_chunks: List[Document]
+    stale_keys: List[str]
+    reused_chunks: List[Document] = field(default_factory=list)
+    candidate_fields: Dict[str, str] = field(default_factory=dict)
+
+
+def chunk_key(candidate_id: str, chunk_hash: str) -> str:
+    return f"{REDIS_KEY_PREFIX}{candidate_id}:{chunk_hash}"
+
+
+def manifest_key(candidate_id: str) -> str:
+    return f"{REDIS_MANIFEST_PREFIX}{candidate_id}"
+
+
+def load_manifests(client: redis.Redis, batch_size: int = 1000) -> Dict[str, Manifest]:
+    candidate_ids = sorted(member.decode() for member in client.smembers(MANIFEST_SET))
+    manifests = {}
+    for start in range(0, len(candidate_ids), batch_size):
+        batch = candidate_ids[start:start + batch_size]
+        pipe = client.pipeline(transaction=False)
+        for candidate_id in batch:
+            pipe.hmget(manifest_key(candidate_id), "file_hash", "chunks")
+        for candidate_id, (file_hash, chunks) in zip(batch, pipe.execute()):
+            if file_hash is None:
+                continue
+            manifests[candidate_id] = Manifest(file_hash.decode(), (chunks or b"").decode().split())
+    return manifests
+
+
+def load_candidate_records(client: redis.Redis, batch_size: int = 1000) -> List[Dict[str, str]]:
+    """Candidate fields of every manifest, for qna.scoring."""
+    candidate_ids = sorted(member.decode() for member in client.smembers(MANIFEST_SET))
+    records = []
+    for start in range(0, len(candidate_ids), batch_size):
+        batch = candidate_ids[start:start + batch_size]
+        pipe = client.pipeline(transaction=False)
+        for candidate_id in batch:
+            pipe.hgetall(manifest_key(candidate_id))
+        for candidate_id, fields in zip(batch, pipe.execute()):
+            if not fields:
+                continue
+            record = {key.decode(): value.decode() for key, value in fields.items() if key != b"chunks"}
+            record["candidate_id"] = candidate_id
+            records.append(record)
+    return records
+
+
+def iter_split_docs(
+    tasks: Iterable[Tuple[Path, Optional[str]]], root, workers: int, max_in_flight: Optional[int] = None
+) -> Iterator[Tuple[Path, Optional[Tuple[str, Optional[List[Document]]]], Optional[BaseException]]]:
+    """Parse and chunk CVs in a process pool, keeping a bounded number in flight
+    so a directory of any size is streamed rather than queued up front.
+
+    Each task is a path plus the file hash from its manifest, if any."""
+    max_in_flight = max_in_flight or workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for path, known_file_hash in tasks:
+            pending[pool.submit(split_cv, path, root, known_file_hash)] = path
+            if len(pending) < max_in_flight:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _collect(pending.pop(future), future)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _collect(pending.pop(future), future)
+
+
+def _collect(path, future):
+    error = future.exception()
+    if error is not None:
+        return path, None, error
+    return path, future.result(), None
+
+
+def diff_candidate(
+    candidate_id: str,
+    file_hash: str,
+    filename: str,
+    chunks: List[Document],
+    manifest: Optional[Manifest],
+    reembed: bool = False,
+) -> CandidateUpdate:
+    """Compare freshly split chunks with the stored manifest. With reembed every
+    chunk is written again, but stale keys are still worked out from the manifest."""
+    unique: Dict[str, Document] = {}
+    for chunk in chunks:
+        unique.setdefault(chunk.metadata["content_hash"][:HASH_LEN], chunk)
+    known = set(manifest.chunk_hashes) if manifest else set()
+    reused = [chunk_hash for chunk_hash in unique if chunk_hash in known and not reembed]
+    return CandidateUpdate(
+        candidate_id=candidate_id,
+        file_hash=file_hash,
+        filename=filename,
+        chunk_hashes=list(unique),
+        new_chunks=[chunk for chunk_hash, chunk in unique.items() if reembed or chunk_hash not in known],
+        stale_keys=[chunk_key(candidate_id, chunk_hash) for chunk_hash in known - unique.keys()],
+        reused_chunks=[unique[chunk_hash] for chunk_hash in reused],
+        candidate_fields=candidate_fields(chunks[0]) if chunks else {},
+    )
+
+
+def candidate_fields(chunk: Document) -> Dict[str, str]:
+    """Per-candidate fields copied onto every chunk of that candidate."""
+    metadata = chunk.metadata
+    return {
+        "candidate_id": metadata["candidate_id"],
+        "filename": metadata["filename"],
+        "file_url": metadata["file_url"],
+        "name": metadata["name"],
+        "skills": metadata["skills"],
+        **{
+            name: metadata[name]
+            for name in ("roles", "location", "years_experience", "email", "phone")
+            if metadata.get(name)
+        },
+    }
+
+
+def chunk_fields(chunk: Document) -> dict:
+    """Every stored field of a chunk except its vectors."""
+    metadata = chunk.metadata
+    return {
+        "content": chunk.page_content,
+        "content_hash": metadata["content_hash"],
+        "chunk_index": metadata.get("chunk_index", 0),
+        "metadata": json.dumps(metadata),
+        **candidate_fields(chunk),
+    }
+
+
+def chunk_mapping(chunk: Document, vector: List[float]) -> dict:
+    mapping = {**chunk_fields(chunk), "content_vector": vector_bytes(vector)}
+    if stores_full_vectors():
+        mapping[FULL_VECTOR_FIELD] = vector_bytes(vector, "FLOAT32")
+    return mapping
+
+
+def sample_chunk_texts(root, size: int) -> List[str]:
+    """Chunk texts from the first CVs under root, for fitting the PCA projection."""
+    texts: List[str] = []
+    for path in iter_cv_paths(root):
+        try:
+            _, chunks = split_cv(path, root)
+        except Exception as e:
+            logger.warning("Failed to parse %s: %s", path, e)
+            continue
+        texts.extend(chunk.page_content for chunk in chunks or [])
+        if len(texts) >= size:
+            break
+    return texts[:size]
+
+
+def apply_updates(
+    updates: List[CandidateUpdate], embeddings: Embeddings, client: redis.Redis, write_batch_size: int
+) -> Tuple[int, int]:
+    """Embed and write new chunks, then drop stale keys and commit the manifests.
+
+    Manifests are written last so an interrupted run is simply redone next time.
+    Returns (chunks written, keys deleted)."""
+    chunks = [chunk for update in updates for chunk in update.new_chunks]
+    vectors = []
+    if chunks:
+        for attempt in retrying(INGEST_RETRY_BUDGET, attempts=INGEST_MAX_ATTEMPTS):
+            with attempt:
+                vectors = embeddings.embed_documents([chunk.page_content for chunk in chunks])
+
+    pipe = client.pipeline(transaction=False)
+    for i, (chunk, vector) in enumerate(zip(chunks, vectors), start=1):
+        key = chunk_key(chunk.metadata["candidate_id"], chunk.metadata["content_hash"][:HASH_LEN])
+        pipe.hset(key, mapping=chunk_mapping(chunk, vector))
+        if i % write_batch_size == 0:
+            pipe.execute()
+
+    deleted = 0
+    previous = read_profiles(client, [update.candidate_id for update in updates])
+    profiles = []
+    for update in updates:
+        if update.candidate_fields:
+            chunk_keys = [chunk_key(update.candidate_id, chunk_hash) for chunk_hash in update.chunk_hashes]
+            profiles.append(Profile.from_fields(update.candidate_fields, chunk_keys))
+        elif update.candidate_id in previous:
+            delete_profiles(pipe, [previous[update.candidate_id]])
+    write_profiles(pipe, profiles, previous)
+    for update in updates:
+        # Unchanged chunks of a changed CV keep their vectors but pick up the
+        # candidate's current fields (e.g. skills found in a new section), and
+        # their position, file URL and attributes in the metadata JSON.
+        for chunk in update.reused_chunks:
+            key = chunk_key(update.candidate_id, chunk.metadata["content_hash"][:HASH_LEN])
+            pipe.hset(key, mapping=chunk_fields(chunk))
+        if update.stale_keys:
+            pipe.delete(*update.stale_keys)
+            deleted += len(update.stale_keys)
+        # The manifest also keeps the candidate fields, which the scoring
+        # matrix is built from without reading every chunk.
+        pipe.delete(manifest_key(update.candidate_id))
+        pipe.hset(
+            manifest_key(update.candidate_id),
+            mapping={
+                **update.candidate_fields,
+                "file_hash": update.file_hash,
+                "filename": update.filename,
+                "chunks": " ".join(update.chunk_hashes),
+            },
+        )
+        pipe.sadd(MANIFEST_SET, update.candidate_id)
+    pipe.execute()
+    return len(chunks), deleted
+
+
+def prune_candidates(client: redis.Redis, manifests: Dict[str, Manifest], candidate_ids, batch_size: int) -> int:
+    """Delete chunks, manifests and profiles of candidates whose CV no longer exists."""
+    deleted = 0
+    candidate_ids = list(candidate_ids)
+    pipe = client.pipeline(transaction=False)
+    for start in range(0, len(candidate_ids), batch_size):
+        delete_profiles(pipe, read_profiles(client, candidate_ids[start:start + batch_size]).values())
+    for i, candidate_id in enumerate(candidate_ids, start=1):
+        keys = [chunk_key(candidate_id, chunk_hash) for chunk_hash in manifests[candidate_id].chunk_hashes]
+        if keys:
+            pipe.delete(*keys)
+            deleted += len(keys)
+        pipe.delete(manifest_key(candidate_id))
+        pipe.srem(MANIFEST_SET, candidate_id)
+        if i % batch_size == 0:
+            pipe.execute()
+    pipe.execute()
+    return deleted
+
+
+def ingest_directory(
+    root,
+    workers: int = INGEST_WORKERS,
+    embed_batch_size: int = INGEST_EMBED_BATCH_SIZE,
+    embed_concurrency: int = INGEST_EMBED_CONCURRENCY,
+    write_batch_size: int = INGEST_WRITE_BATCH_SIZE,
+    embeddings: Optional[Embeddings] = None,
+    client: Optional[redis.Redis] = None,
+    full: bool = False,
+    prune: bool = True,
+    progress_every: int = 1000,
+) -> IngestStats:
+    """Ingest every CV under root and return throughput stats.
+
+    full ignores the manifests and re-embeds everything; prune removes
+    candidates that have a manifest but no longer have a file under root."""
+    root = Path(root)
+    embeddings = embeddings or get_ingest_embeddings()
+    client = client or get_redis_client()
+    if isinstance(embeddings, ProjectedEmbeddings) and not embeddings.has_projection():
+        # First ingest with EMBEDDINGS_REDUCTION=pca: fit the projection every
+        # process will use on a sample of this corpus.
+        embeddings.fit(sample_chunk_texts(root, PCA_SAMPLE_SIZE))
+    manifests = load_manifests(client)
+    stats = IngestStats()
+    seen = set()
+    # Until the walk is done, the candidates indexed so far are the best guess at the total.
+    expected = len(manifests)
+    publish_ingest_progress(client, "running", {**stats.to_dict(), "expected": expected})
+
+    def tasks():
+        for path in iter_cv_paths(root):
+            candidate_id = candidate_id_for(path, root)
+            seen.add(candidate_id)
+            manifest = manifests.get(candidate_id)
+            yield path, (manifest.file_hash if manifest and not full else None)
+
+    # Embedding is network bound, so batches are embedded and written from a
+    # small thread pool while the process pool keeps parsing.
+    with ThreadPoolExecutor(max_workers=embed_concurrency) as embedders:
+        in_flight = set()
+        next_report = progress_every
+
+        def record(future):
+            nonlocal next_report
+            written, deleted = future.result()
+            stats.add(chunks=written, deleted=deleted)
+            # Progress follows chunks written, which lag the parsed docs by the batches in flight.
+            if progress_every and stats.chunks >= next_report:
+                next_report = (stats.chunks // progress_every + 1) * progress_every
+                logger.info(stats.report())
+                publish_ingest_progress(client, "running", {**stats.to_dict(), "expected": expected})
+
+        def submit(updates):
+            while len(in_flight) >= embed_concurrency:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.discard(future)
+                    record(future)
+            in_flight.add(embedders.submit(apply_updates, updates, embeddings, client, write_batch_size))
+
+        batch: List[CandidateUpdate] = []
+        batch_chunks = 0
+        for path, result, error in iter_split_docs(tasks(), root, workers):
+            if error is not None:
+                logger.warning("Failed to parse %s: %s", path, error)
+                stats.add(failed=1)
+                continue
+            file_hash, chunks = result
+            if chunks is None:
+                stats.add(unchanged=1)
+                continue
+
+            candidate_id = candidate_id_for(path, root)
+            update = diff_candidate(
+                candidate_id, file_hash, path.name, chunks, manifests.get(candidate_id), reembed=full
+            )
+            stats.add(docs=1, reused=len(update.chunk_hashes) - len(update.new_chunks))
+            batch.append(update)
+            batch_chunks += len(update.new_chunks)
+            if batch_chunks >= embed_batch_size:
+                submit(batch)
+                batch, batch_chunks = [], 0
+        if batch:
+            submit(batch)
+        for future in in_flight:
+            record(future)
+
+    if prune:
+        removed = sorted(manifests.keys() - seen)
+        stats.add(removed=len(removed), deleted=prune_candidates(client, manifests, removed, write_batch_size))
+
+    if stats.docs or stats.removed or not client.exists(SCORING_KEY):
+        save_matrix(client, CandidateMatrix.from_records(load_candidate_records(client)))
+    if stats.docs or stats.removed:
+        bump_index_generation(client)
+    publish_ingest_progress(client, "done", {**stats.to_dict(), "expected": len(seen)})
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest CVs into the talent-pool index.")
+    parser.add_argument("root", help="Directory containing PDF/DOCX CVs")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Parser processes")
+    parser.add_argument("--embed-batch-size", type=int, default=INGEST_EMBED_BATCH_SIZE)
+    parser.add_argument("--embed-concurrency", type=int, default=INGEST_EMBED_CONCURRENCY)
+    parser.add_argument("--write-batch-size", type=int, default=INGEST_WRITE_BATCH_SIZE)
+    parser.add_argument("--full", action="store_true", help="Ignore manifests and re-embed every CV")
+    parser.add_argument("--no-prune", action="store_true", help="Keep candidates whose CV file is gone")
+    parser.add_argument(
+        "--create-index",
+        action="store_true",
+        help="Create the index for the configured embedding model if it does not exist",
+    )
+    parser.add_argument("--progress-every", type=int, default=1000, help="Log stats every N chunks written")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.create_index:
+        dims = EMBEDDINGS_DIMENSIONS or len(get_ingest_embeddings().embed_query("dimension probe"))
+        if create_talent_index(get_redis_client(), dims):
+            print(f"Created index {REDIS_INDEX_NAME} ({dims} dims) over {REDIS_KEY_PREFIX}")
+
+    stats = ingest_directory(
+        args.root,
+        workers=args.workers,
+        embed_batch_size=args.embed_batch_size,
+        embed_concurrency=args.embed_concurrency,
+        write_batch_size=args.write_batch_size,
+        full=args.full,
+        prune=not args.no_prune,
+        progress_every=args.progress_every,
+    )
+    print(f"Done: {stats.report()}")
+
+
+if __name__ == "__main__":
+    main()
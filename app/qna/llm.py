@@ -1,31 +1,134 @@
-from typing import TYPE_CHECKING
-from langchain.chains import RetrievalQA
-from langchain_openai import ChatOpenAI
+from functools import lru_cache
+from typing import TYPE_CHECKING, AsyncIterator, Iterator
+from langchain.globals import get_llm_cache
 from langchain.llms.base import LLM
-from langchain_redis import RedisVectorStore
-from qna.constants import OPENAI_COMPLETIONS_ENGINE
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration
+from qna.clients import get_async_http_client, get_http_client
+from qna.constants import FAKE_LLM_DELAY, LLM_BACKEND, LLM_TIMEOUT, OPENAI_COMPLETIONS_ENGINE, RERANK_FETCH_K
+from qna.rerank import RerankingRetriever, get_reranker
 
-def get_llm(max_tokens=1000) -> LLM:
-    llm = ChatOpenAI(
-        model_name=OPENAI_COMPLETIONS_ENGINE, 
-        max_tokens=max_tokens,
-        temperature=0.1  # Tambahkan untuk consistency
+if TYPE_CHECKING:
+    from langchain_redis import RedisVectorStore
+
+
+FAKE_ANSWER = (
+    "Berikut kandidat yang paling cocok berdasarkan konteks.\n"
+    "- **Kandidat 1** — [Lihat CV](https://example.com/cv.pdf)"
+)
+
+
+@lru_cache(maxsize=None)
+def get_shared_llm() -> LLM:
+    """Process-wide chat model holding the OpenAI client and its connection pool."""
+    if LLM_BACKEND == "fake":
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+        # Streams FAKE_ANSWER one character per chunk, FAKE_LLM_DELAY apart.
+        return FakeListChatModel(responses=[FAKE_ANSWER], sleep=FAKE_LLM_DELAY)
+    # Imported here so that importing qna.llm doesn't pull in the OpenAI SDK
+    # (see qna.warmup).
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model_name=OPENAI_COMPLETIONS_ENGINE,
+        max_tokens=1000,
+        temperature=0.1,  # Tambahkan untuk consistency
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+        timeout=LLM_TIMEOUT,
+        max_retries=0,  # retries are handled by qna.retry
     )
-    return llm
 
-def make_qna_chain(llm: LLM, vector_db: RedisVectorStore, prompt=None, **kwargs):
+
+def get_llm(max_tokens=1000) -> LLM:
+    """Per-session view of the shared chat model.
+
+    model_copy is shallow, so the copy reuses the shared OpenAI client and only
+    overrides per-session settings such as max_tokens.
+    """
+    return get_shared_llm().model_copy(update={"max_tokens": max_tokens})
+
+def make_qna_chain(llm: LLM, vector_db: "RedisVectorStore", prompt=None, **kwargs):
     """Create QA chain with better configuration"""
     
     search_type = "similarity"
     if "search_type" in kwargs:
         search_type = kwargs.pop("search_type")
-    
+
+    # With a reranker, over-fetch and keep the k best chunks (qna.rerank).
+    reranker = get_reranker()
+    k = kwargs.get("k", 4)
+    if reranker is not None:
+        kwargs["k"] = max(k, RERANK_FETCH_K)
+    retriever = vector_db.as_retriever(search_kwargs=kwargs, search_type=search_type)
+    if reranker is not None:
+        retriever = RerankingRetriever(base=retriever, reranker=reranker, k=k)
+
+    from langchain.chains import RetrievalQA
+
     chain = RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=vector_db.as_retriever(search_kwargs=kwargs, search_type=search_type),
+        retriever=retriever,
         return_source_documents=True,
         chain_type_kwargs={"prompt": prompt},
         verbose=True,
     )
-    return chain
\ No newline at end of file
+    return chain
+
+
+def _messages(prompt, context: str, question: str):
+    return [HumanMessage(content=prompt.format(context=context, question=question))]
+
+
+def stream_answer(llm: LLM, prompt, context: str, question: str) -> Iterator[str]:
+    """Stream the answer for an already assembled context token by token.
+
+    Goes through the global LLM cache with the same key invoke() would use, so
+    a cache hit is yielded as a single chunk and a fresh answer is cached once
+    it is complete.
+    """
+    messages = _messages(prompt, context, question)
+    cache = get_llm_cache()
+    cache_prompt = dumps(messages)
+    llm_string = llm._get_llm_string()
+
+    if cache is not None:
+        cached = cache.lookup(cache_prompt, llm_string)
+        if cached:
+            yield cached[0].text
+            return
+
+    parts = []
+    for chunk in llm.stream(messages):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+
+    if cache is not None and parts:
+        cache.update(cache_prompt, llm_string, [ChatGeneration(message=AIMessage(content="".join(parts)))])
+
+
+async def astream_answer(llm: LLM, prompt, context: str, question: str) -> AsyncIterator[str]:
+    """Async stream_answer, sharing its cache keys."""
+    messages = _messages(prompt, context, question)
+    cache = get_llm_cache()
+    cache_prompt = dumps(messages)
+    llm_string = llm._get_llm_string()
+
+    if cache is not None:
+        cached = await cache.alookup(cache_prompt, llm_string)
+        if cached:
+            yield cached[0].text
+            return
+
+    parts = []
+    async for chunk in llm.astream(messages):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+
+    if cache is not None and parts:
+        await cache.aupdate(cache_prompt, llm_string, [ChatGeneration(message=AIMessage(content="".join(parts)))])
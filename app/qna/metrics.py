@@ -0,0 +1,278 @@
+"""
+Per-stage latency metrics and structured query logs.
+
+Code on the query path wraps each stage in timed("stage"). That observes the
+qna_stage_seconds histogram and, when a QueryTrace is active (use_trace), adds
+the time to the trace. When the query ends, trace.finish() logs one JSON line
+per query to the "qna.query" logger and observes qna_query_seconds.
+
+Cache tiers report through record_cache(), which counts hits and misses per
+tier and marks the first tier that hit on the active trace. Redis round trips
+on the query path are wrapped in timed_redis("op").
+
+render() produces the Prometheus text format. qna.api serves it on /metrics;
+other processes can call start_metrics_server(port), which also serves the
+startup report (qna.warmup) on /ready.
+"""
+
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("qna.query")
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 1500, 2000, 2500, 3000, 4000, 6000, 8000)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [bucket counts..., +Inf count], sum.
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        """Per label set: (non-cumulative count per bucket plus +Inf, sum)."""
+        with self._lock:
+            return {key: (list(counts), total[0]) for key, (counts, total) in self._values.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (le,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total[0]:g}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+STAGE_SECONDS = Histogram("qna_stage_seconds", "Time spent per query stage", ["stage"])
+QUERY_SECONDS = Histogram("qna_query_seconds", "End-to-end query time", ["cache"])
+CACHE_LOOKUPS = Counter("qna_cache_lookups_total", "Cache lookups per tier", ["tier", "result"])
+PROMPT_TOKENS = Histogram("qna_prompt_context_tokens", "Tokens in the packed context", buckets=TOKEN_BUCKETS)
+QUERY_ERRORS = Counter("qna_query_errors_total", "Failed queries per stage", ["stage"])
+REDIS_SECONDS = Histogram("qna_redis_seconds", "Redis round trips on the query path", ["op"])
+STARTUP_SECONDS = Gauge("qna_startup_step_seconds", "Time taken by each startup warm-up step", ["step"])
+READY = Gauge("qna_ready", "1 once the startup warm-up has finished its required steps")
+REGISTRY = [
+    STAGE_SECONDS, QUERY_SECONDS, CACHE_LOOKUPS, PROMPT_TOKENS, QUERY_ERRORS, REDIS_SECONDS, STARTUP_SECONDS, READY
+]
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+@dataclass
+class QueryTrace:
+    """Timings and facts about one query, logged as a single JSON line."""
+
+    question: str = ""
+    stages: Dict[str, float] = field(default_factory=dict)
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+
+    def record(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    @property
+    def cache_hit(self) -> Optional[str]:
+        """First cache tier that answered, if any."""
+        return self.attributes.get("cache_hit")
+
+    def finish(self, error: Optional[Exception] = None) -> Dict[str, Any]:
+        total = time.perf_counter() - self.started
+        QUERY_SECONDS.observe(total, cache=self.cache_hit or "miss")
+        record = {
+            "event": "query",
+            "question_chars": len(self.question),
+            "total_ms": round(1000 * total, 1),
+            "stages_ms": {stage: round(1000 * seconds, 1) for stage, seconds in self.stages.items()},
+            **self.attributes,
+        }
+        if error is not None:
+            stage = getattr(error, "stage", "unknown")
+            QUERY_ERRORS.inc(stage=stage)
+            record["error"] = {"stage": stage, "message": str(error)}
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+        return record
+
+
+_current_trace: ContextVar[Optional[QueryTrace]] = ContextVar("qna_trace", default=None)
+
+
+def current_trace() -> Optional[QueryTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace: QueryTrace) -> Iterator[QueryTrace]:
+    """Make trace the target of timed() and record_cache() in this context.
+
+    Don't yield from a generator inside this block: the reset must happen in
+    the same context as the set."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def observe_stage(stage: str, seconds: float, trace: Optional[QueryTrace] = None):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.record(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def timed_redis(op: str) -> Iterator[None]:
+    """Observe one Redis round trip (a command or a pipeline) as qna_redis_seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REDIS_SECONDS.observe(time.perf_counter() - start, op=op)
+
+
+def record_cache(tier: str, hit: bool, seconds: float, serves_answer: bool = True):
+    """Count a lookup in a cache tier. Hits in tiers that serve answers (not
+    e.g. the embedding cache) become the trace's cache_hit."""
+    CACHE_LOOKUPS.inc(tier=tier, result="hit" if hit else "miss")
+    observe_stage(f"cache_{tier}", seconds)
+    trace = _current_trace.get()
+    if hit and serves_answer and trace is not None and trace.cache_hit is None:
+        trace.set(cache_hit=tier)
+
+
+def record_context(tokens: int, candidates: int):
+    PROMPT_TOKENS.observe(tokens)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.set(context_tokens=tokens, context_candidates=candidates)
+
+
+_readiness: Optional[Callable[[], Tuple[bool, Dict[str, Any]]]] = None
+
+
+def set_readiness(check: Callable[[], Tuple[bool, Dict[str, Any]]]):
+    """Serve check() on /ready next to /metrics: (ready, JSON report)."""
+    global _readiness
+    _readiness = check
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/ready" and _readiness is not None:
+            ready, report = _readiness()
+            body = json.dumps(report).encode("utf-8")
+            self.send_response(200 if ready else 503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread (for processes without qna.api)."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,254 @@
+"""
+Per-candidate profiles and a name index, for lookups without search.
+
+Ingestion writes one compact JSON profile per candidate (name, contact,
+roles, skills, years, location, CV link and chunk keys) under
+profile:{index}:{candidate_id}. It also writes a name index: one set of
+candidate_ids per normalized name token (profile-names:{index}:{token}).
+Tokens come from the name and the file name.
+
+A name question ("cari Beni", "cv Beni Saputra") is answered with a SINTER
+of its tokens' sets, done in Redis, and one MGET of the matching profiles:
+two round trips, no embedding and no LLM. A common token such as "muhammad"
+costs only its ids inside Redis, not thousands of profiles on the wire. The
+profiles of the candidates a search returned come back in one MGET too, and
+the app renders them instead of regrouping chunk metadata.
+
+An index written before the name sets (hashes under profile-name:) is
+rebuilt from the stored profiles with:
+    poetry run python -m qna.profiles reindex
+"""
+
+import argparse
+import json
+import re
+import unicodedata
+from dataclasses import asdict, dataclass, field
+from pathlib import PurePath
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import redis
+
+from qna.constants import REDIS_INDEX_NAME
+from qna.metrics import timed_redis
+from qna.retrieval import STOPWORDS, ParsedQuery
+
+PROFILE_PREFIX = f"profile:{REDIS_INDEX_NAME}:"
+NAME_INDEX_PREFIX = f"profile-names:{REDIS_INDEX_NAME}:"
+# The earlier name index, one hash of full profiles per token.
+_OLD_NAME_INDEX_PREFIX = f"profile-name:{REDIS_INDEX_NAME}:"
+
+# Words that may sit next to a name in a lookup ("link cv beni") without
+# turning it into a question for the LLM.
+LOOKUP_WORDS = {
+    "cv", "link", "kontak", "contact", "email", "telepon", "phone", "nomor", "hp", "wa", "whatsapp",
+    "profil", "profile", "data", "info",
+}
+# Tokens of CV file names that are not part of a name.
+_FILENAME_WORDS = {"cv", "resume", "curriculum", "vitae", "pdf", "docx", "doc", "final", "updated", "new"}
+_NAME_TOKEN = re.compile(r"[a-z]+")
+
+
+def name_tokens(text: str) -> List[str]:
+    """Lowercase, accent-free tokens of a name, in order, without duplicates."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    tokens = [t for t in _NAME_TOKEN.findall(text) if len(t) > 1 and t not in STOPWORDS]
+    return list(dict.fromkeys(tokens))
+
+
+@dataclass
+class Profile:
+    candidate_id: str
+    name: str = ""
+    filename: str = ""
+    file_url: str = ""
+    email: str = ""
+    phone: str = ""
+    roles: List[str] = field(default_factory=list)
+    skills: List[str] = field(default_factory=list)
+    location: List[str] = field(default_factory=list)
+    years_experience: Optional[float] = None
+    chunk_keys: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_fields(cls, fields: Dict[str, str], chunk_keys: Sequence[str]) -> "Profile":
+        """Profile from the candidate fields written by qna.ingest."""
+
+        def split(name: str) -> List[str]:
+            return [part for part in (fields.get(name) or "").split(",") if part]
+
+        years = fields.get("years_experience")
+        return cls(
+            candidate_id=fields["candidate_id"],
+            name=fields.get("name") or "",
+            filename=fields.get("filename") or "",
+            file_url=fields.get("file_url") or "",
+            email=fields.get("email") or "",
+            phone=fields.get("phone") or "",
+            roles=split("roles"),
+            skills=split("skills"),
+            location=split("location"),
+            years_experience=float(years) if years else None,
+            chunk_keys=list(chunk_keys),
+        )
+
+    @property
+    def tokens(self) -> List[str]:
+        filename = [t for t in name_tokens(PurePath(self.filename).stem) if t not in _FILENAME_WORDS]
+        return list(dict.fromkeys(name_tokens(self.name) + filename))
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, value) -> "Profile":
+        return cls(**json.loads(value))
+
+
+def profile_key(candidate_id: str) -> str:
+    return f"{PROFILE_PREFIX}{candidate_id}"
+
+
+def name_index_key(token: str) -> str:
+    return f"{NAME_INDEX_PREFIX}{token}"
+
+
+def read_profiles(client: redis.Redis, candidate_ids: Sequence[str]) -> Dict[str, Profile]:
+    """Stored profiles by candidate_id, in one round trip."""
+    if not candidate_ids:
+        return {}
+    values = client.mget([profile_key(candidate_id) for candidate_id in candidate_ids])
+    return {c: Profile.from_json(v) for c, v in zip(candidate_ids, values) if v}
+
+
+async def aread_profiles(client: "redis.asyncio.Redis", candidate_ids: Sequence[str]) -> Dict[str, Profile]:
+    if not candidate_ids:
+        return {}
+    with timed_redis("profiles"):
+        values = await client.mget([profile_key(candidate_id) for candidate_id in candidate_ids])
+    return {c: Profile.from_json(v) for c, v in zip(candidate_ids, values) if v}
+
+
+def write_profiles(pipe: redis.client.Pipeline, profiles: Iterable[Profile], previous: Dict[str, Profile]):
+    """Queue profile and name index writes on pipe. previous holds the stored
+    profiles being replaced, so tokens of an old name are unindexed."""
+    for profile in profiles:
+        tokens = profile.tokens
+        old = previous.get(profile.candidate_id)
+        for token in set(old.tokens if old else []) - set(tokens):
+            pipe.srem(name_index_key(token), profile.candidate_id)
+        pipe.set(profile_key(profile.candidate_id), profile.to_json())
+        for token in tokens:
+            pipe.sadd(name_index_key(token), profile.candidate_id)
+
+
+def delete_profiles(pipe: redis.client.Pipeline, profiles: Iterable[Profile]):
+    for profile in profiles:
+        pipe.delete(profile_key(profile.candidate_id))
+        for token in profile.tokens:
+            pipe.srem(name_index_key(token), profile.candidate_id)
+
+
+def _ids(members) -> List[str]:
+    return sorted(m.decode() if isinstance(m, bytes) else m for m in members)
+
+
+def _sorted(profiles: Iterable[Profile]) -> List[Profile]:
+    return sorted(profiles, key=lambda p: (p.name.lower(), p.candidate_id))
+
+
+def _lookup_tokens(names: Sequence[str]) -> List[str]:
+    return list(dict.fromkeys(token for name in names for token in name_tokens(name)))
+
+
+def lookup_names(client: redis.Redis, names: Sequence[str]) -> List[Profile]:
+    """Candidates whose name (or file name) has every token of names, as in
+    the STRICT NAME FILTER of the prompt."""
+    tokens = _lookup_tokens(names)
+    if not tokens:
+        return []
+    ids = _ids(client.sinter([name_index_key(token) for token in tokens]))
+    return _sorted(read_profiles(client, ids).values())
+
+
+async def alookup_names(client: "redis.asyncio.Redis", names: Sequence[str]) -> List[Profile]:
+    tokens = _lookup_tokens(names)
+    if not tokens:
+        return []
+    with timed_redis("name_lookup"):
+        ids = _ids(await client.sinter([name_index_key(token) for token in tokens]))
+    return _sorted((await aread_profiles(client, ids)).values())
+
+
+def is_name_lookup(parsed: ParsedQuery) -> bool:
+    """A question that only names someone ("cari Beni", "link cv Beni"),
+    with nothing else for retrieval or the LLM to work on."""
+    return (
+        bool(parsed.names)
+        and not parsed.must_have
+        and not parsed.min_years
+        and not parsed.locations
+        and all(term in LOOKUP_WORDS for term in parsed.terms)
+    )
+
+
+def format_profiles(profiles: List[Profile], names: Sequence[str]) -> str:
+    """Markdown answer for a name lookup."""
+    if not profiles:
+        return f"Kandidat dengan nama {' '.join(names).title()} tidak ditemukan."
+    lines = []
+    for profile in profiles:
+        link = f"[Lihat CV]({profile.file_url})" if profile.file_url else "CV link tidak tersedia"
+        role = f"/{', '.join(profile.roles)}" if profile.roles else ""
+        lines.append(f"- **{profile.name or profile.filename}{role}** — {link}")
+        details = []
+        if profile.years_experience is not None:
+            details.append(f"{profile.years_experience:g} tahun pengalaman")
+        if profile.location:
+            details.append(", ".join(profile.location).title())
+        if profile.email:
+            details.append(profile.email)
+        if profile.phone:
+            details.append(profile.phone)
+        if details:
+            lines.append(f"  {' · '.join(details)}")
+        if profile.skills:
+            lines.append(f"  Skills: {', '.join(profile.skills)}")
+    return "\n".join(lines)
+
+
+def reindex(client: redis.Redis, batch_size: int = 1000) -> int:
+    """Rebuild the name sets from the stored profiles and drop the old
+    per-token hashes. Returns the number of profiles indexed."""
+    count = 0
+    pipe = client.pipeline(transaction=False)
+    for key in client.scan_iter(match=f"{_OLD_NAME_INDEX_PREFIX}*", count=batch_size):
+        pipe.unlink(key)
+    keys = list(client.scan_iter(match=f"{PROFILE_PREFIX}*", count=batch_size))
+    for start in range(0, len(keys), batch_size):
+        for value in client.mget(keys[start:start + batch_size]):
+            if value:
+                profile = Profile.from_json(value)
+                for token in profile.tokens:
+                    pipe.sadd(name_index_key(token), profile.candidate_id)
+                count += 1
+        pipe.execute()
+    pipe.execute()
+    return count
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Candidate profiles and the name index.")
+    parser.add_argument("command", choices=["reindex"])
+    parser.parse_args(argv)
+
+    from qna.clients import get_redis_client
+
+    print(f"Indexed the names of {reindex(get_redis_client())} profiles")
+
+
+if __name__ == "__main__":
+    main()
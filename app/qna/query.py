@@ -0,0 +1,156 @@
+"""
+Query API for the talent sourcing assistant.
+
+A query runs in two stages, retrieval and generation. Each stage has its own
+time budget and is retried with backoff only for transient errors (see
+qna.retry); any other failure surfaces on the first attempt as a QueryError
+naming the stage that failed.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain.schema import Document
+
+from qna.constants import (
+    HYBRID_FETCH_K,
+    LLM_TIMEOUT,
+    RERANK_FETCH_K,
+    RETRIEVAL_BACKEND,
+    RETRIEVAL_MODE,
+    RETRIEVAL_TIMEOUT,
+)
+from qna.context import pack_context
+from qna.db import get_talent_vectorstore
+from qna.llm import get_llm, stream_answer
+from qna.metrics import QueryTrace, observe_stage, timed, use_trace
+from qna.prompt import basic_prompt
+from qna.rerank import RerankingRetriever, get_reranker
+from qna.retrieval import HybridRetriever
+from qna.retry import TIMEOUT_ERRORS, retrying
+from qna.snapshot import SnapshotRetriever
+
+
+class QueryError(Exception):
+    def __init__(self, stage: str, message: str):
+        super().__init__(f"{stage} failed: {message}")
+        self.stage = stage
+
+
+class QueryTimeout(QueryError):
+    pass
+
+
+@dataclass(frozen=True)
+class QueryRequest:
+    question: str
+    k: int = 5
+    max_tokens: int = 400
+    # False answers from retrieval and qna.scoring alone, without the LLM
+    use_llm: bool = True
+
+    def __post_init__(self):
+        if not self.question or not self.question.strip():
+            raise ValueError("question must not be empty")
+        if self.k < 1:
+            raise ValueError("k must be at least 1")
+        if self.max_tokens < 1:
+            raise ValueError("max_tokens must be at least 1")
+
+
+@dataclass
+class QueryResult:
+    answer: str
+    source_documents: List[Document]
+    timings: Dict[str, float] = field(default_factory=dict)
+    cached: bool = False
+    # qna.scoring.ScoredCandidate list for job-description questions
+    shortlist: Optional[List[Any]] = None
+    # qna.profiles.Profile of each candidate in the answer
+    profiles: Optional[List[Any]] = None
+
+
+def _stage_error(stage: str, error: Exception) -> QueryError:
+    if isinstance(error, TIMEOUT_ERRORS):
+        return QueryTimeout(stage, str(error) or "timed out")
+    return QueryError(stage, str(error))
+
+
+def get_retriever(k: int):
+    """Retriever for the k chunks that go into the prompt. With a reranker it
+    over-fetches RERANK_FETCH_K chunks and keeps the k best."""
+    reranker = get_reranker()
+    fetch = max(k, RERANK_FETCH_K) if reranker else k
+    if RETRIEVAL_BACKEND == "snapshot":
+        retriever = SnapshotRetriever(k=fetch, filters=RETRIEVAL_MODE == "hybrid")
+    elif RETRIEVAL_MODE == "hybrid":
+        retriever = HybridRetriever(k=fetch, fetch_k=max(HYBRID_FETCH_K, fetch))
+    else:
+        retriever = get_talent_vectorstore().as_retriever(search_type="similarity", search_kwargs={"k": fetch})
+    if reranker is None:
+        return retriever
+    return RerankingRetriever(base=retriever, reranker=reranker, k=k)
+
+
+def retrieve(request: QueryRequest) -> List[Document]:
+    retriever = get_retriever(request.k)
+    try:
+        for attempt in retrying(RETRIEVAL_TIMEOUT):
+            with attempt:
+                return retriever.invoke(request.question)
+    except Exception as e:
+        raise _stage_error("retrieval", e) from e
+
+
+def stream_query(request: QueryRequest, docs: List[Document]) -> Iterator[str]:
+    """Stream the answer for docs returned by retrieve(). The docs are packed
+    per candidate (qna.context) before they go into the prompt.
+
+    Retries are only possible until the first token arrives; a failure after
+    that is raised as-is rather than replaying a half-shown answer.
+    """
+    llm = get_llm(max_tokens=request.max_tokens)
+    prompt = basic_prompt()
+    with timed("prompt_assembly"):
+        context = pack_context(docs)
+
+    start = time.perf_counter()
+    try:
+        for attempt in retrying(LLM_TIMEOUT):
+            with attempt:
+                tokens = stream_answer(llm, prompt, context, request.question)
+                first = next(tokens, None)
+    except Exception as e:
+        raise _stage_error("generation", e) from e
+    observe_stage("llm_first_token", time.perf_counter() - start)
+
+    if first is None:
+        return
+    yield first
+    try:
+        yield from tokens
+    except Exception as e:
+        raise _stage_error("generation", e) from e
+    observe_stage("llm_total", time.perf_counter() - start)
+
+
+def run_query(request: QueryRequest) -> QueryResult:
+    """Blocking query: retrieval plus the full answer, with per-stage timings."""
+    trace = QueryTrace(request.question)
+    with use_trace(trace):
+        try:
+            with timed("retrieval"):
+                docs = retrieve(request)
+            with timed("generation"):
+                answer = "".join(stream_query(request, docs))
+        except QueryError as e:
+            trace.finish(e)
+            raise
+    trace.finish()
+    return QueryResult(
+        answer=answer,
+        source_documents=docs,
+        timings={**trace.stages, "total": time.perf_counter() - trace.started},
+        cached=trace.cache_hit is not None,
+    )
@@ -0,0 +1,314 @@
+"""
+Smaller stored vectors: fewer dimensions and quantized components.
+
+Dimensions: with EMBEDDINGS_DIMENSIONS set, "native" reduction asks the
+model for that many dimensions (text-embedding-3 vectors are trained so that
+a normalized prefix is itself an embedding). "pca" projects the model's
+full-width vectors onto the top principal components of a sample of CV
+chunks. The projection is fitted at the start of the first ingest and stored
+in Redis under projection:{index}, and get_embeddings() applies it to
+document and query vectors alike. qna.snapshot exports copy it into the
+snapshot (projection.npz), where replicas without Redis load it from.
+
+Quantization is VECTOR_DTYPE in qna.schema (FLOAT16, or INT8 on Redis 8).
+With VECTOR_RERANK_K the top KNN hits are re-scored with full-precision
+copies stored next to the quantized vectors.
+
+To pick a setting, measure recall@k against exact full-width search on a
+sample of the stored chunks, with the bytes each setting keeps per chunk:
+    poetry run python -m qna.reduction report --sample 5000 --queries 200
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import redis
+
+from langchain.embeddings.base import Embeddings
+
+from qna.constants import EMBEDDINGS_DIMENSIONS, REDIS_INDEX_NAME, REDIS_KEY_PREFIX
+from qna.schema import DTYPES, decode_vector, vector_bytes
+
+PROJECTION_KEY = f"projection:{REDIS_INDEX_NAME}"
+# The projection's file name inside a qna.snapshot directory.
+PROJECTION_FILE = "projection.npz"
+
+
+class ReductionError(Exception):
+    pass
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+@dataclass
+class Projection:
+    mean: np.ndarray
+    components: np.ndarray  # (dims, model width)
+
+    @property
+    def dims(self) -> int:
+        return self.components.shape[0]
+
+    def apply(self, vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        return _normalize((vectors - self.mean) @ self.components.T)
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(buffer, mean=self.mean, components=self.components)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Projection":
+        arrays = np.load(io.BytesIO(data))
+        return cls(mean=arrays["mean"], components=arrays["components"])
+
+
+def fit_pca(vectors, dims: int) -> Projection:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) < dims:
+        raise ReductionError(f"need at least {dims} sample vectors for a {dims}-d PCA, got {len(vectors)}")
+    mean = vectors.mean(axis=0)
+    _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+    return Projection(mean=mean, components=vt[:dims].astype(np.float32))
+
+
+def load_projection(client: redis.Redis, key: str = PROJECTION_KEY) -> Optional[Projection]:
+    data = client.get(key)
+    return Projection.from_bytes(data) if data else None
+
+
+def save_projection(client: redis.Redis, projection: Projection, key: str = PROJECTION_KEY):
+    client.set(key, projection.to_bytes())
+
+
+def load_projection_file(path) -> Optional[Projection]:
+    path = Path(path)
+    return Projection.from_bytes(path.read_bytes()) if path.exists() else None
+
+
+class ProjectedEmbeddings(Embeddings):
+    """Embeddings through the stored PCA projection. The wrapped embeddings
+    (and their cache) keep full-width vectors. The projection is read from
+    Redis, or without a client from the file at path (a snapshot's copy)."""
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        dims: int,
+        client: Optional[redis.Redis] = None,
+        key: str = PROJECTION_KEY,
+        path=None,
+    ):
+        self.underlying = underlying
+        self.dims = dims
+        self.client = client
+        self.key = key
+        self.path = path
+        self._projection: Optional[Projection] = None
+
+    def projection(self) -> Projection:
+        if self._projection is None:
+            if self.client is not None:
+                projection, source = load_projection(self.client, self.key), self.key
+            else:
+                projection, source = load_projection_file(self.path), self.path
+            if projection is None:
+                raise ReductionError(f"no PCA projection at {source}; run qna.ingest to fit one")
+            if projection.dims != self.dims:
+                raise ReductionError(
+                    f"stored projection has {projection.dims} dims, EMBEDDINGS_DIMENSIONS is {self.dims}"
+                )
+            self._projection = projection
+        return self._projection
+
+    def has_projection(self) -> bool:
+        try:
+            self.projection()
+            return True
+        except ReductionError:
+            return False
+
+    def fit(self, texts: Sequence[str]) -> Projection:
+        """Fit the projection on texts and store it for every process."""
+        if self.client is None:
+            raise ReductionError("fitting a projection needs Redis to store it")
+        projection = fit_pca(self.underlying.embed_documents(list(texts)), self.dims)
+        save_projection(self.client, projection, self.key)
+        self._projection = projection
+        return projection
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.projection().apply(self.underlying.embed_documents(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.projection().apply(self.underlying.embed_query(text))[0].tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        projection = await asyncio.to_thread(self.projection)
+        return projection.apply(await self.underlying.aembed_query(text))[0].tolist()
+
+
+# Recall vs memory report
+
+
+def _quantized(vectors: np.ndarray, dtype: str) -> np.ndarray:
+    """What the index compares after storing vectors as dtype."""
+    return _normalize(np.stack([decode_vector(vector_bytes(v, dtype), dtype) for v in vectors]))
+
+
+def _top_k(queries: np.ndarray, docs: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ docs.T
+    top = np.argpartition(-scores, min(k, docs.shape[0] - 1), axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[:k]) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def _rerank(candidates: np.ndarray, queries: np.ndarray, docs: np.ndarray, k: int) -> np.ndarray:
+    reranked = []
+    for query, row in zip(queries, candidates):
+        scores = docs[row] @ query
+        reranked.append(row[np.argsort(-scores)[:k]])
+    return np.asarray(reranked)
+
+
+def recall_report(
+    docs,
+    queries,
+    k: int = 10,
+    dims_options: Iterable[int] = (0, 512, 256, 128),
+    dtypes: Iterable[str] = ("FLOAT32", "FLOAT16", "INT8"),
+    rerank_k: int = 50,
+    methods: Iterable[str] = ("native", "pca"),
+) -> List[Dict]:
+    """Recall@k of each setting against exact search over the full-width
+    vectors, with the bytes stored per chunk.
+
+    Search is exact here, so this isolates the cost of fewer dimensions and
+    quantization; HNSW adds its own EF_RUNTIME-dependent loss on top. "native"
+    is simulated by truncating and re-normalizing, which is what shortening
+    text-embedding-3 vectors does."""
+    docs = _normalize(np.asarray(docs, dtype=np.float32))
+    queries = _normalize(np.asarray(queries, dtype=np.float32))
+    width = docs.shape[1]
+    truth = _top_k(queries, docs, k)
+
+    rows = []
+    for dims in dims_options:
+        if dims >= width:
+            continue
+        for method in methods if dims else ("full",):
+            if method == "full":
+                reduced_docs, reduced_queries = docs, queries
+            elif method == "native":
+                reduced_docs, reduced_queries = _normalize(docs[:, :dims]), _normalize(queries[:, :dims])
+            else:
+                projection = fit_pca(docs, dims)
+                reduced_docs, reduced_queries = projection.apply(docs), projection.apply(queries)
+            n = dims or width
+            for dtype in dtypes:
+                stored_docs, stored_queries = _quantized(reduced_docs, dtype), _quantized(reduced_queries, dtype)
+                found = _top_k(stored_queries, stored_docs, max(k, rerank_k))
+                # Vectors are held twice: in the hash and in the vector index.
+                stored_bytes = 2 * n * np.dtype(DTYPES[dtype]).itemsize
+                row = {
+                    "method": method,
+                    "dims": n,
+                    "dtype": dtype,
+                    f"recall@{k}": round(_recall(found[:, :k], truth), 4),
+                    "bytes_per_chunk": stored_bytes,
+                }
+                if dtype != "FLOAT32" and rerank_k:
+                    reranked = _rerank(found, reduced_queries, reduced_docs, k)
+                    row[f"recall@{k}_rerank{rerank_k}"] = round(_recall(reranked, truth), 4)
+                    row["bytes_per_chunk_rerank"] = stored_bytes + 4 * n
+                rows.append(row)
+    return rows
+
+
+def sample_texts(client: redis.Redis, n: int, prefix: str = REDIS_KEY_PREFIX) -> List[str]:
+    """Up to n distinct chunk texts from the index."""
+    texts: Dict[str, None] = {}
+    pipe = client.pipeline(transaction=False)
+    for key in client.scan_iter(match=f"{prefix}*", count=1000):
+        pipe.hget(key, "content")
+        if len(pipe) == 1000:
+            texts.update(dict.fromkeys(filter(None, pipe.execute())))
+            if len(texts) >= n:
+                break
+    if len(pipe):
+        texts.update(dict.fromkeys(filter(None, pipe.execute())))
+    decoded = [t.decode("utf-8", errors="ignore") if isinstance(t, bytes) else t for t in texts]
+    return decoded[:n]
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    from qna.clients import get_redis_client
+    from qna.embeddings import get_base_embeddings
+
+    parser = argparse.ArgumentParser(description="Recall vs memory for reduced and quantized vectors.")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--sample", type=int, default=5000, help="Stored chunks to search over")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out chunks used as queries")
+    parser.add_argument("--questions", help="File with one question per line, instead of held-out chunks")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--rerank-k", type=int, default=50)
+    parser.add_argument("--dims", default="0,512,256,128", help="Comma-separated; 0 is the model's width")
+    parser.add_argument("--json", action="store_true", help="Print JSON rows instead of a table")
+    args = parser.parse_args(argv)
+
+    client = get_redis_client()
+    embeddings = get_base_embeddings()
+    texts = sample_texts(client, args.sample + (0 if args.questions else args.queries))
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        docs = embeddings.embed_documents(texts)
+        queries = [embeddings.embed_query(q) for q in questions]
+    else:
+        vectors = embeddings.embed_documents(texts)
+        queries, docs = vectors[: args.queries], vectors[args.queries :]
+    if not docs or not queries:
+        raise ReductionError("no stored chunks to sample; ingest some CVs first")
+
+    rows = recall_report(
+        docs,
+        queries,
+        k=args.k,
+        dims_options=[int(d) for d in args.dims.split(",")],
+        rerank_k=args.rerank_k,
+    )
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return
+    print(f"{len(docs)} chunks, {len(queries)} queries, exact search "
+          f"(configured: EMBEDDINGS_DIMENSIONS={EMBEDDINGS_DIMENSIONS or 'model width'})")
+    columns = list(dict.fromkeys(column for row in rows for column in row))
+    print("  ".join(f"{c:>22}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{str(row.get(c, '')):>22}" for c in columns))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Second retrieval stage: a local cross-encoder re-ranks an over-fetched list.
+
+Retrieval fetches RERANK_FETCH_K chunks cheaply from Redis. The cross-encoder
+then reads each (question, chunk) pair together, which ranks far better than
+comparing two independent embeddings, and only the best k chunks reach the
+prompt. Scoring runs on CPU in batches of RERANK_BATCH_SIZE pairs. Scores are
+cached in-process per (question, chunk), so a repeated question or a chunk
+that comes back for the same question is not scored twice.
+
+The default model is multilingual, since CVs and questions mix Bahasa
+Indonesia and English.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+from pydantic import ConfigDict
+
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from qna.constants import (
+    EMBEDDINGS_NUM_THREADS,
+    RERANK,
+    RERANK_BATCH_SIZE,
+    RERANK_CACHE_SIZE,
+    RERANK_MAX_LENGTH,
+    RERANK_MODEL,
+)
+from qna.metrics import record_cache, timed
+
+
+def _pair_key(question: str, doc: Document) -> str:
+    question = " ".join(question.lower().split())
+    chunk = doc.metadata.get("content_hash") or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{question}\0{chunk}".encode("utf-8")).hexdigest()
+
+
+class CrossEncoderReranker:
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        batch_size: int = RERANK_BATCH_SIZE,
+        max_length: int = RERANK_MAX_LENGTH,
+        cache_size: int = RERANK_CACHE_SIZE,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.cache_size = cache_size
+        self._model = None
+        self._scores: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One scoring call at a time: torch already spreads a batch over the
+        # CPU threads, and concurrent calls would only oversubscribe them.
+        self._model_lock = threading.Lock()
+
+    def model(self):
+        if self._model is None:
+            # Imported lazily, like the huggingface embeddings backend.
+            import torch
+            from sentence_transformers import CrossEncoder
+
+            torch.set_num_threads(EMBEDDINGS_NUM_THREADS)
+            self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+        return self._model
+
+    def _cached(self, key: str) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+
+    def _remember(self, key: str, score: float):
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+
+    def score(self, question: str, docs: Sequence[Document]) -> List[float]:
+        """Relevance of each doc to question; higher is better."""
+        start = time.perf_counter()
+        keys = [_pair_key(question, doc) for doc in docs]
+        scores = [self._cached(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        record_cache("rerank", not missing, time.perf_counter() - start, serves_answer=False)
+        if missing:
+            pairs = [(question, docs[i].page_content) for i in missing]
+            with self._model_lock:
+                predicted = self.model().predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            for i, value in zip(missing, predicted):
+                scores[i] = float(value)
+                self._remember(keys[i], scores[i])
+        return scores
+
+    def rerank(self, question: str, docs: Sequence[Document], k: int) -> List[Document]:
+        """The k best docs by cross-encoder score, with rerank_score in metadata."""
+        if not docs:
+            return []
+        with timed("rerank"):
+            scores = self.score(question, docs)
+        ranked = sorted(zip(scores, range(len(docs))), key=lambda pair: pair[0], reverse=True)[:k]
+        reranked = []
+        for score, i in ranked:
+            doc = docs[i]
+            reranked.append(Document(page_content=doc.page_content, metadata={**doc.metadata, "rerank_score": score}))
+        return reranked
+
+
+@lru_cache(maxsize=None)
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """Process-wide reranker, or None when RERANK is off."""
+    return CrossEncoderReranker() if RERANK else None
+
+
+class RerankingRetriever(BaseRetriever):
+    """Wraps a retriever that over-fetches and keeps its k best documents."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    base: BaseRetriever
+    reranker: CrossEncoderReranker
+    k: int = 5
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        docs = self.base.invoke(query)
+        return self.reranker.rerank(query, docs, self.k)
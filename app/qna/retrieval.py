@@ -0,0 +1,469 @@
+"""
+Hybrid BM25 + vector retrieval over the talent index.
+
+Capitalized name tokens ("cari Beni") and MUST-HAVE terms ("+golang", '"react native"')
+are parsed out of the question and pushed into RediSearch as pre-filters, so
+only matching candidates can be returned at all. A name filter that matches
+nobody is dropped again, and its words are searched as plain terms. A BM25 full-text search and
+a KNN search then run under that filter in one pipelined round trip, and
+their rankings are merged with reciprocal rank fusion (RRF).
+
+When the index stores quantized vectors and VECTOR_RERANK_K is set, the top
+KNN hits are re-ordered by their exact distance to the query, computed from
+the full-precision copies stored next to them, before fusion.
+"""
+
+import json
+import re
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import redis
+import redis.asyncio
+from pydantic import ConfigDict
+
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from qna.clients import get_redis_client
+from qna.constants import HYBRID_FETCH_K, INDEX_FIELDS_TTL, REDIS_INDEX_NAME, RRF_K, VECTOR_RERANK_K
+from qna.embeddings import get_embeddings
+from qna.attributes import ROLE_ALIASES, extract_locations, normalize_location, parse_min_years
+from qna.metrics import timed, timed_redis
+from qna.schema import FULL_VECTOR_FIELD, decode_vector, stores_full_vectors, vector_bytes
+from qna.skills import normalize_skill
+
+RETURN_FIELDS = ["content", "name", "filename", "file_url", "candidate_id", "skills", "content_hash", "metadata"]
+
+# Words that never are names or search terms (Bahasa Indonesia + English).
+STOPWORDS = {
+    "ada", "adalah", "atau", "bisa", "cari", "carikan", "dan", "dari", "dengan", "di", "dia", "ini", "itu",
+    "juga", "kandidat", "ke", "mana", "nama", "namanya", "bernama", "orang", "pada", "profil", "punya",
+    "saja", "saya", "siapa", "tampilkan", "tolong", "untuk", "yang", "tahun", "pengalaman", "minimal",
+    "a", "an", "and", "any", "are", "candidate", "candidates", "find", "for", "from", "has", "have", "in",
+    "is", "me", "of", "on", "or", "please", "profile", "show", "the", "to", "who", "with", "years", "cv",
+    "resume", "experience", "senior", "junior", "mid", "lead", "berpengalaman", "jago", "ahli", "mahir",
+}
+
+# Words that say the next tokens are a person's name.
+_NAME_TRIGGER = re.compile(
+    r"\b(?:cari|carikan|siapa|bernama|namanya|nama|profil|profile|find|who is|named|cv)\s+"
+    r"((?:[^\W\d_]+\s*){1,3})",
+    re.IGNORECASE,
+)
+_MUST_HAVE = re.compile(r"\+([\w.#+/-]+)|\"([^\"]+)\"")
+_TOKEN = re.compile(r"[\w.#+/-]+")
+_QUERY_SPECIAL = re.compile(r"([,.<>{}\[\]\"':;!@#$%^&*()\-+=~|/\\ ])")
+
+# Role words are part of the job description, not of a name.
+_ROLE_WORDS = {
+    "engineer", "developer", "programmer", "backend", "frontend", "fullstack", "devops", "designer",
+    "analyst", "manager", "scientist", "admin", "staff", "intern", "qa", "tester", "architect", "consultant",
+    "data", "marketing", "sales", "akuntan", "accountant", "finance", "hr", "hrd", "recruiter", "teknisi",
+} | {word for aliases in ROLE_ALIASES.values() for alias in aliases for word in alias.split()}
+
+
+@dataclass
+class ParsedQuery:
+    names: List[str] = field(default_factory=list)
+    must_have: List[str] = field(default_factory=list)
+    terms: List[str] = field(default_factory=list)
+    min_years: Optional[int] = None
+    locations: List[str] = field(default_factory=list)
+
+
+def _is_name_token(token: str) -> bool:
+    """A capitalized word ("Beni", not "marketing" or "HR") that isn't a
+    stop, role, skill or location word."""
+    lowered = token.lower()
+    return (
+        len(lowered) > 1
+        and token.istitle()
+        and lowered not in STOPWORDS
+        and lowered not in _ROLE_WORDS
+        and normalize_skill(lowered) is None
+        and normalize_location(lowered) is None
+    )
+
+
+def parse_query(question: str) -> ParsedQuery:
+    parsed = ParsedQuery()
+
+    for plus_term, quoted in _MUST_HAVE.findall(question):
+        term = (plus_term or quoted).strip().lower()
+        skill = normalize_skill(term) or term
+        if skill and skill not in parsed.must_have:
+            parsed.must_have.append(skill)
+    remainder = _MUST_HAVE.sub(" ", question)
+    parsed.min_years = parse_min_years(remainder)
+    parsed.locations = extract_locations(remainder)
+
+    for match in _NAME_TRIGGER.finditer(remainder):
+        started = False
+        for token in match.group(1).split():
+            if _is_name_token(token):
+                started = True
+                if token.lower() not in parsed.names:
+                    parsed.names.append(token.lower())
+            elif started or token.lower() not in STOPWORDS:
+                break
+
+    for token in _TOKEN.findall(remainder.lower()):
+        token = token.strip(".-/")
+        if (
+            len(token) > 1
+            and token not in STOPWORDS
+            and token not in parsed.names
+            and not token.isdigit()
+        ):
+            parsed.terms.append(token)
+    parsed.terms.extend(term for term in parsed.must_have if term not in parsed.terms)
+    return parsed
+
+
+def without_names(parsed: ParsedQuery) -> ParsedQuery:
+    """parsed with its names searched as plain terms instead of filtered on,
+    for when the name filter matches nobody."""
+    return replace(parsed, names=[], terms=parsed.terms + [n for n in parsed.names if n not in parsed.terms])
+
+
+def escape_query_value(value: str) -> str:
+    return _QUERY_SPECIAL.sub(r"\\\1", value)
+
+
+def build_filter(parsed: ParsedQuery, fields: Set[str]) -> str:
+    """RediSearch pre-filter for names, MUST-HAVE skills, minimum years of
+    experience and locations, degrading to full-text on content when the index
+    has no name/skills fields. Years and locations are only filtered on when
+    the index has those fields (see qna.schema)."""
+    clauses = []
+    if parsed.names:
+        names = " ".join(escape_query_value(name) for name in parsed.names)
+        name_fields = [f for f in ("name", "filename") if f in fields] or ["content"]
+        clauses.append("(" + " | ".join(f"@{f}:({names})" for f in name_fields) + ")")
+    for skill in parsed.must_have:
+        if "skills" in fields and normalize_skill(skill):
+            clauses.append(f"@skills:{{{escape_query_value(skill)}}}")
+        elif " " in skill:
+            clauses.append(f'@content:"{skill.replace(chr(34), "")}"')
+        else:
+            clauses.append(f"@content:({escape_query_value(skill)})")
+    if parsed.min_years and "years_experience" in fields:
+        clauses.append(f"@years_experience:[{parsed.min_years} +inf]")
+    if parsed.locations and "location" in fields:
+        clauses.append("@location:{" + " | ".join(escape_query_value(l) for l in parsed.locations) + "}")
+    return " ".join(clauses)
+
+
+def candidate_filter(candidate_ids: Sequence[str]) -> str:
+    """Pre-filter restricting a search to the given candidates."""
+    return "@candidate_id:{" + " | ".join(escape_query_value(c) for c in candidate_ids) + "}"
+
+
+# index name -> (field names, monotonic time they were read)
+_INDEX_FIELDS: Dict[str, Tuple[Set[str], float]] = {}
+
+
+def _cached_fields(index_name: str) -> Optional[Set[str]]:
+    """Field names read less than INDEX_FIELDS_TTL seconds ago, so a
+    `qna.schema migrate` that adds filters is picked up without a restart."""
+    cached = _INDEX_FIELDS.get(index_name)
+    if cached is None or time.monotonic() - cached[1] >= INDEX_FIELDS_TTL:
+        return None
+    return cached[0]
+
+
+def _store_fields(index_name: str, info) -> Set[str]:
+    fields = _field_names(info)
+    _INDEX_FIELDS[index_name] = (fields, time.monotonic())
+    return fields
+
+
+def index_fields(client: redis.Redis, index_name: str = REDIS_INDEX_NAME) -> Set[str]:
+    """Names of the fields the index actually has."""
+    fields = _cached_fields(index_name)
+    if fields is None:
+        fields = _store_fields(index_name, client.ft(index_name).info())
+    return fields
+
+
+def _field_names(info) -> Set[str]:
+    # Each attribute reads [identifier, <path>, attribute, <name>, type, ...].
+    return {_decode(attr[3]) for attr in info.get("attributes", [])}
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8", errors="ignore") if isinstance(value, bytes) else str(value)
+
+
+def search_args(
+    index_name: str,
+    query: str,
+    limit: int,
+    return_fields: Sequence[str] = RETURN_FIELDS,
+    params: Optional[Dict[str, Any]] = None,
+    sort_by: Optional[str] = None,
+    with_scores: bool = False,
+) -> List[Any]:
+    """Raw FT.SEARCH arguments, so searches can be queued on a pipeline."""
+    args: List[Any] = ["FT.SEARCH", index_name, query]
+    if with_scores:
+        args += ["WITHSCORES", "SCORER", "BM25"]
+    args += ["RETURN", len(return_fields), *return_fields]
+    if sort_by:
+        args += ["SORTBY", sort_by]
+    if params:
+        args += ["PARAMS", len(params) * 2]
+        for name, value in params.items():
+            args += [name, value]
+    args += ["LIMIT", 0, limit, "DIALECT", 2]
+    return args
+
+
+def parse_search_reply(reply, with_scores: bool = False) -> List[Tuple[str, float, Dict[str, Any]]]:
+    """Turn a raw FT.SEARCH reply into (key, score, fields) tuples with decoded values."""
+    results = []
+    step = 3 if with_scores else 2
+    for i in range(1, len(reply), step):
+        key = _decode(reply[i])
+        score = float(reply[i + 1]) if with_scores else 0.0
+        raw_fields = reply[i + step - 1] or []
+        fields = {}
+        for name, value in zip(raw_fields[::2], raw_fields[1::2]):
+            fields[_decode(name)] = _decode(value)
+        results.append((key, score, fields))
+    return results
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> Dict[str, float]:
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def to_document(key: str, fields: Dict[str, Any], **scores) -> Document:
+    metadata = {}
+    if fields.get("metadata"):
+        try:
+            metadata.update(json.loads(fields["metadata"]))
+        except ValueError:
+            pass
+    metadata.update({name: value for name, value in fields.items() if name not in ("content", "metadata")})
+    metadata["id"] = key
+    metadata.update(scores)
+    return Document(page_content=fields.get("content", ""), metadata=metadata)
+
+
+def hybrid_commands(
+    parsed: ParsedQuery,
+    prefilter: str,
+    vector: bytes,
+    fetch_k: int,
+    index_name: str = REDIS_INDEX_NAME,
+) -> List[List[Any]]:
+    """FT.SEARCH commands for one hybrid search: BM25 over the question terms
+    (when there are any) and KNN, both under the pre-filter."""
+    commands = []
+    if parsed.terms:
+        text = "(" + " | ".join(escape_query_value(term) for term in parsed.terms) + ")"
+        commands.append(search_args(index_name, f"{prefilter} {text}".strip(), fetch_k, with_scores=True))
+    knn = f"({prefilter or '*'})=>[KNN {fetch_k} @content_vector $vec AS vector_distance]"
+    commands.append(
+        search_args(
+            index_name,
+            knn,
+            fetch_k,
+            return_fields=RETURN_FIELDS + ["vector_distance"],
+            params={"vec": vector},
+            sort_by="vector_distance",
+        )
+    )
+    return commands
+
+
+def rerank_keys(replies: Sequence[Any], n: int = VECTOR_RERANK_K) -> List[str]:
+    """Keys of the top n KNN hits, whose full-precision vectors to fetch."""
+    return [key for key, _, _ in parse_search_reply(replies[-1])[:n]]
+
+
+def exact_distances(
+    query: Sequence[float], keys: Sequence[str], blobs: Sequence[Optional[bytes]]
+) -> Dict[str, float]:
+    """Cosine distances from query to the FLOAT32 vectors stored for keys."""
+    query = np.asarray(query, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    distances = {}
+    for key, blob in zip(keys, blobs):
+        if blob:
+            vector = decode_vector(blob, "FLOAT32")
+            distances[key] = 1.0 - float(vector @ query) / max(float(np.linalg.norm(vector)), 1e-12)
+    return distances
+
+
+def fuse_replies(replies: Sequence[Any], k: int, exact: Optional[Dict[str, float]] = None) -> List[Document]:
+    """Merge the replies to hybrid_commands() with RRF into at most k documents,
+    one per distinct chunk content. exact re-orders the KNN hits it covers by
+    full-precision distance."""
+    text_hits = parse_search_reply(replies[0], with_scores=True) if len(replies) > 1 else []
+    vector_hits = parse_search_reply(replies[-1])
+    if exact:
+        for key, _, fields in vector_hits:
+            if key in exact:
+                fields["vector_distance"] = str(exact[key])
+        reranked = sorted((hit for hit in vector_hits if hit[0] in exact), key=lambda hit: exact[hit[0]])
+        vector_hits = reranked + [hit for hit in vector_hits if hit[0] not in exact]
+
+    fields_by_key: Dict[str, Dict[str, Any]] = {}
+    for key, _, fields in text_hits + vector_hits:
+        fields_by_key.setdefault(key, {}).update(fields)
+    bm25 = {key: score for key, score, _ in text_hits}
+    fused = reciprocal_rank_fusion([[key for key, _, _ in text_hits], [key for key, _, _ in vector_hits]])
+
+    docs, seen_content = [], set()
+    for key in sorted(fused, key=fused.get, reverse=True):
+        fields = fields_by_key[key]
+        content_id = fields.get("content_hash") or fields.get("content")
+        if content_id in seen_content:
+            continue
+        seen_content.add(content_id)
+        scores = {"rrf_score": fused[key]}
+        if key in bm25:
+            scores["bm25_score"] = bm25[key]
+        if "vector_distance" in fields:
+            scores["vector_distance"] = float(fields.pop("vector_distance"))
+        docs.append(to_document(key, fields, **scores))
+        if len(docs) == k:
+            break
+    return docs
+
+
+def hybrid_search(
+    question: str,
+    k: int,
+    fetch_k: int = HYBRID_FETCH_K,
+    client: Optional[redis.Redis] = None,
+    embeddings=None,
+    index_name: str = REDIS_INDEX_NAME,
+    hybrid: bool = True,
+) -> List[Document]:
+    """Hybrid search for question; with hybrid=False a plain KNN search."""
+    client = client or get_redis_client()
+    embeddings = embeddings or get_embeddings()
+
+    parsed = parse_query(question) if hybrid else ParsedQuery()
+    fields = index_fields(client, index_name) if hybrid else set()
+    with timed("embedding"):
+        query = embeddings.embed_query(question)
+
+    docs = _hybrid_search(client, parsed, build_filter(parsed, fields), query, k, fetch_k, index_name)
+    if not docs and parsed.names:
+        parsed = without_names(parsed)
+        docs = _hybrid_search(client, parsed, build_filter(parsed, fields), query, k, fetch_k, index_name)
+    return docs
+
+
+def _hybrid_search(
+    client: redis.Redis,
+    parsed: ParsedQuery,
+    prefilter: str,
+    query: Sequence[float],
+    k: int,
+    fetch_k: int,
+    index_name: str,
+) -> List[Document]:
+    with timed("search"):
+        pipe = client.pipeline(transaction=False)
+        for command in hybrid_commands(parsed, prefilter, vector_bytes(query), max(fetch_k, k), index_name):
+            pipe.execute_command(*command)
+        with timed_redis("search"):
+            replies = pipe.execute()
+    exact = None
+    if stores_full_vectors():
+        with timed("vector_rerank"):
+            keys = rerank_keys(replies)
+            pipe = client.pipeline(transaction=False)
+            for key in keys:
+                pipe.hget(key, FULL_VECTOR_FIELD)
+            exact = exact_distances(query, keys, pipe.execute())
+    return fuse_replies(replies, k, exact)
+
+
+async def ahybrid_search(
+    question: str,
+    vector: Sequence[float],
+    k: int,
+    client: "redis.asyncio.Redis",
+    fetch_k: int = HYBRID_FETCH_K,
+    index_name: str = REDIS_INDEX_NAME,
+    hybrid: bool = True,
+    candidate_ids: Optional[Sequence[str]] = None,
+) -> List[Document]:
+    """hybrid_search over an async client, for an already embedded question.
+
+    With hybrid=False this is a plain KNN search without BM25 or pre-filters,
+    matching RETRIEVAL_MODE=vector. candidate_ids (e.g. a qna.scoring pool)
+    restricts the search further. The question's own filters still apply,
+    since scoring only knows the skills in its vocabulary."""
+    parsed, fields = ParsedQuery(), set()
+    if hybrid:
+        parsed = parse_query(question)
+        fields = _cached_fields(index_name)
+        if fields is None:
+            fields = _store_fields(index_name, await client.ft(index_name).info())
+
+    def prefilter(parsed: ParsedQuery) -> str:
+        clauses = [candidate_filter(candidate_ids)] if candidate_ids else []
+        return " ".join(clauses + [build_filter(parsed, fields)]).strip()
+
+    docs = await _ahybrid_search(client, parsed, prefilter(parsed), vector, k, fetch_k, index_name)
+    if not docs and parsed.names:
+        parsed = without_names(parsed)
+        docs = await _ahybrid_search(client, parsed, prefilter(parsed), vector, k, fetch_k, index_name)
+    return docs
+
+
+async def _ahybrid_search(
+    client: "redis.asyncio.Redis",
+    parsed: ParsedQuery,
+    prefilter: str,
+    vector: Sequence[float],
+    k: int,
+    fetch_k: int,
+    index_name: str,
+) -> List[Document]:
+    with timed("search"):
+        pipe = client.pipeline(transaction=False)
+        for command in hybrid_commands(parsed, prefilter, vector_bytes(vector), max(fetch_k, k), index_name):
+            pipe.execute_command(*command)
+        with timed_redis("search"):
+            replies = await pipe.execute()
+    exact = None
+    if stores_full_vectors():
+        with timed("vector_rerank"):
+            keys = rerank_keys(replies)
+            pipe = client.pipeline(transaction=False)
+            for key in keys:
+                pipe.hget(key, FULL_VECTOR_FIELD)
+            exact = exact_distances(vector, keys, await pipe.execute())
+    return fuse_replies(replies, k, exact)
+
+
+class HybridRetriever(BaseRetriever):
+    """LangChain retriever over hybrid_search, usable anywhere a vectorstore
+    retriever is (e.g. make_qna_chain)."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    k: int = 5
+    fetch_k: int = HYBRID_FETCH_K
+    index_name: str = REDIS_INDEX_NAME
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return hybrid_search(query, self.k, fetch_k=self.fetch_k, index_name=self.index_name)
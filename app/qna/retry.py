@@ -0,0 +1,53 @@
+"""
+Retry policy shared by the query path and ingestion.
+
+Only transient failures are retried (rate limits, timeouts, dropped
+connections, 5xx from OpenAI); bad requests, auth errors and bugs fail on the
+first attempt. Clients are built with their own retries disabled so this is
+the only place that retries.
+"""
+
+import openai
+import redis
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    stop_after_delay,
+    wait_exponential_jitter,
+)
+
+from qna.constants import QUERY_MAX_ATTEMPTS
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    redis.ConnectionError,
+    redis.TimeoutError,
+)
+
+TIMEOUT_ERRORS = (openai.APITimeoutError, redis.TimeoutError, TimeoutError)
+
+
+def retrying(budget: float, attempts: int = QUERY_MAX_ATTEMPTS) -> Retrying:
+    """Bounded retries with jittered exponential backoff, giving up after
+    attempts tries or once budget seconds have passed, whichever comes first."""
+    return Retrying(
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        stop=stop_after_attempt(attempts) | stop_after_delay(budget),
+        wait=wait_exponential_jitter(initial=0.5, max=8),
+        reraise=True,
+    )
+
+
+def aretrying(budget: float, attempts: int = QUERY_MAX_ATTEMPTS) -> AsyncRetrying:
+    """Async counterpart of retrying(), with the same policy."""
+    return AsyncRetrying(
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        stop=stop_after_attempt(attempts) | stop_after_delay(budget),
+        wait=wait_exponential_jitter(initial=0.5, max=8),
+        reraise=True,
+    )
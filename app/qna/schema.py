@@ -0,0 +1,311 @@
+"""
+The talent index schema, owned by the project instead of a hand-made index.
+
+Fields:
+    content, name, filename                 TEXT (BM25 and name pre-filters)
+    candidate_id, file_url, content_hash    TAG
+    skills, roles, location                 TAG, comma separated
+    years_experience, chunk_index           NUMERIC
+    content_vector                          VECTOR, VECTOR_ALGORITHM / VECTOR_DTYPE
+    content_vector_full                     not indexed, FLOAT32 copy for VECTOR_RERANK_K
+
+REDIS_INDEX_NAME is an alias that points at a versioned index
+(talent-pool-v1, talent-pool-v2, ...) over the same key prefix. Migrating
+to new HNSW parameters or fields builds the next version next to the live
+one and moves the alias once it has finished indexing, so queries never see
+a half-built index. A legacy index created under the alias name itself is
+dropped (keeping its documents) right before the alias is added.
+
+Changing VECTOR_DTYPE changes the stored bytes, so it needs a rebuild, which
+re-encodes every vector in place. The index is down until that finishes.
+INT8 vectors are scaled per vector to the int8 range, which only preserves
+COSINE distances.
+
+Run from the app directory:
+    poetry run python -m qna.schema show
+    poetry run python -m qna.schema migrate
+    VECTOR_DTYPE=FLOAT16 poetry run python -m qna.schema rebuild
+"""
+
+import argparse
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import redis
+from dotenv import load_dotenv
+from redis.commands.search.field import NumericField, TagField, TextField, VectorField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from redis.exceptions import ResponseError
+
+from qna.constants import (
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_RUNTIME,
+    HNSW_M,
+    REDIS_INDEX_NAME,
+    REDIS_KEY_PREFIX,
+    VECTOR_ALGORITHM,
+    VECTOR_DISTANCE,
+    VECTOR_DTYPE,
+    VECTOR_RERANK_K,
+)
+
+VECTOR_FIELD = "content_vector"
+FULL_VECTOR_FIELD = "content_vector_full"
+DTYPES = {"FLOAT32": np.float32, "FLOAT16": np.float16, "INT8": np.int8}
+_VERSION = re.compile(r"-v(\d+)$")
+
+
+class SchemaError(Exception):
+    pass
+
+
+def vector_bytes(vector: Sequence[float], dtype: str = VECTOR_DTYPE) -> bytes:
+    """Encode a vector the way the index stores it."""
+    if dtype == "INT8":
+        vector = np.asarray(vector, dtype=np.float32)
+        scale = 127.0 / max(float(np.abs(vector).max()), 1e-12)
+        return np.round(vector * scale).astype(np.int8).tobytes()
+    return np.asarray(vector, dtype=DTYPES[dtype]).tobytes()
+
+
+def decode_vector(blob: bytes, dtype: str = VECTOR_DTYPE) -> np.ndarray:
+    """Stored vector bytes as float32 (INT8 vectors come back scaled)."""
+    return np.frombuffer(blob, dtype=DTYPES[dtype]).astype(np.float32)
+
+
+def stores_full_vectors(dtype: str = VECTOR_DTYPE) -> bool:
+    """Whether chunks also carry a FLOAT32 copy for re-ranking quantized hits."""
+    return VECTOR_RERANK_K > 0 and dtype != "FLOAT32"
+
+
+def vector_params(
+    dims: int, algorithm: str = VECTOR_ALGORITHM, dtype: str = VECTOR_DTYPE, distance: str = VECTOR_DISTANCE
+) -> Dict[str, Any]:
+    if algorithm not in ("HNSW", "FLAT"):
+        raise SchemaError(f"unknown VECTOR_ALGORITHM {algorithm!r}, expected HNSW or FLAT")
+    if dtype not in DTYPES:
+        raise SchemaError(f"unknown VECTOR_DTYPE {dtype!r}, expected one of {', '.join(DTYPES)}")
+    if dtype == "INT8" and distance != "COSINE":
+        raise SchemaError("INT8 vectors are scaled per vector and need VECTOR_DISTANCE=COSINE")
+    params = {"TYPE": dtype, "DIM": dims, "DISTANCE_METRIC": distance}
+    if algorithm == "HNSW":
+        params.update(M=HNSW_M, EF_CONSTRUCTION=HNSW_EF_CONSTRUCTION, EF_RUNTIME=HNSW_EF_RUNTIME)
+    return params
+
+
+def schema_fields(dims: int, algorithm: str = VECTOR_ALGORITHM, dtype: str = VECTOR_DTYPE) -> List:
+    return [
+        TextField("content"),
+        TextField("name"),
+        TextField("filename"),
+        TagField("candidate_id"),
+        TagField("file_url"),
+        TagField("content_hash"),
+        TagField("skills", separator=","),
+        TagField("roles", separator=","),
+        TagField("location", separator=","),
+        NumericField("years_experience"),
+        NumericField("chunk_index"),
+        VectorField(VECTOR_FIELD, algorithm, vector_params(dims, algorithm, dtype)),
+    ]
+
+
+def _decode(value) -> Any:
+    return value.decode("utf-8", errors="ignore") if isinstance(value, bytes) else value
+
+
+def _pairs(items) -> Dict[str, Any]:
+    items = [_decode(item) for item in items]
+    return {str(k).lower(): v for k, v in zip(items[::2], items[1::2])}
+
+
+def index_info(client: redis.Redis, name: str) -> Optional[Dict[str, Any]]:
+    """FT.INFO for an index or alias, or None when there is no such index."""
+    try:
+        return client.ft(name).info()
+    except ResponseError:
+        return None
+
+
+def describe(info: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of FT.INFO that migrate/rebuild need: the physical index
+    name, key prefix and the vector field's settings."""
+    definition = _pairs(info.get("index_definition", []))
+    prefixes = definition.get("prefixes") or [REDIS_KEY_PREFIX]
+    described = {
+        "index_name": _decode(info.get("index_name")),
+        "prefix": _decode(prefixes[0]),
+        "num_docs": int(info.get("num_docs", 0)),
+        "fields": [],
+    }
+    for attr in info.get("attributes", []):
+        attr = _pairs(attr)
+        described["fields"].append(attr.get("attribute"))
+        if attr.get("attribute") == VECTOR_FIELD:
+            described.update(
+                algorithm=str(attr.get("algorithm", "")).upper(),
+                dtype=str(attr.get("data_type", "")).upper(),
+                dims=int(attr.get("dim", 0)),
+            )
+    return described
+
+
+def version_of(index_name: str) -> int:
+    match = _VERSION.search(index_name)
+    return int(match.group(1)) if match else 0
+
+
+def wait_for_indexing(client: redis.Redis, index_name: str, timeout: float = 3600):
+    deadline = time.monotonic() + timeout
+    while True:
+        info = client.ft(index_name).info()
+        if float(info.get("percent_indexed", 1)) >= 1 and int(info.get("indexing", 0)) == 0:
+            return
+        if time.monotonic() > deadline:
+            raise SchemaError(f"{index_name} still indexing after {timeout:.0f}s")
+        time.sleep(0.5)
+
+
+def _create(client: redis.Redis, physical: str, dims: int, prefix: str, dtype: str = VECTOR_DTYPE):
+    client.ft(physical).create_index(
+        schema_fields(dims, dtype=dtype), definition=IndexDefinition(prefix=[prefix], index_type=IndexType.HASH)
+    )
+
+
+def create_index(
+    client: redis.Redis, dims: int, index_name: str = REDIS_INDEX_NAME, key_prefix: str = REDIS_KEY_PREFIX
+) -> bool:
+    """Create {index_name}-v1 behind the alias index_name. Returns False when
+    an index (or alias) of that name already exists."""
+    if index_info(client, index_name) is not None:
+        return False
+    physical = f"{index_name}-v1"
+    _create(client, physical, dims, key_prefix)
+    client.ft(physical).aliasadd(index_name)
+    return True
+
+
+def drop_index(client: redis.Redis, index_name: str = REDIS_INDEX_NAME, delete_documents: bool = False) -> bool:
+    """Drop the index behind index_name, and the alias if it is one."""
+    info = index_info(client, index_name)
+    if info is None:
+        return False
+    physical = describe(info)["index_name"]
+    if physical != index_name:
+        client.ft(physical).aliasdel(index_name)
+    client.ft(physical).dropindex(delete_documents=delete_documents)
+    return True
+
+
+def _point_alias(client: redis.Redis, alias: str, current: str, new: str):
+    if current == alias:
+        # Legacy index under the alias name: the name has to be freed first.
+        client.ft(current).dropindex(delete_documents=False)
+        client.ft(new).aliasadd(alias)
+    else:
+        client.ft(new).aliasupdate(alias)
+        client.ft(current).dropindex(delete_documents=False)
+
+
+def migrate(client: redis.Redis, index_name: str = REDIS_INDEX_NAME, timeout: float = 3600) -> str:
+    """Build the next index version with the configured schema over the same
+    documents and move the alias to it. Returns the new index name."""
+    info = index_info(client, index_name)
+    if info is None:
+        raise SchemaError(f"no index {index_name!r}; ingest creates it")
+    current = describe(info)
+    if current.get("dtype") and current["dtype"] != VECTOR_DTYPE:
+        raise SchemaError(
+            f"stored vectors are {current['dtype']}, VECTOR_DTYPE is {VECTOR_DTYPE}: use `rebuild` instead"
+        )
+    new = f"{index_name}-v{version_of(current['index_name']) + 1}"
+    _create(client, new, current["dims"], current["prefix"])
+    wait_for_indexing(client, new, timeout)
+    _point_alias(client, index_name, current["index_name"], new)
+    return new
+
+
+def rebuild(
+    client: redis.Redis, index_name: str = REDIS_INDEX_NAME, dtype: str = VECTOR_DTYPE, batch_size: int = 1000
+) -> str:
+    """Re-encode every stored vector as dtype and index it again.
+
+    Searches fail from the moment the old index is dropped until the new one
+    is built; stop ingestion and restart query processes with the new
+    VECTOR_DTYPE afterwards."""
+    info = index_info(client, index_name)
+    if info is None:
+        raise SchemaError(f"no index {index_name!r}; ingest creates it")
+    current = describe(info)
+    source = current.get("dtype") or "FLOAT32"
+    drop_index(client, index_name)
+
+    if source != dtype:
+        keys = client.scan_iter(match=f"{current['prefix']}*", count=batch_size)
+        batch: List = []
+        for key in keys:
+            batch.append(key)
+            if len(batch) == batch_size:
+                _reencode(client, batch, source, dtype)
+                batch = []
+        if batch:
+            _reencode(client, batch, source, dtype)
+
+    new = f"{index_name}-v{version_of(current['index_name']) + 1}"
+    _create(client, new, current["dims"], current["prefix"], dtype=dtype)
+    client.ft(new).aliasadd(index_name)
+    wait_for_indexing(client, new)
+    return new
+
+
+def _reencode(client: redis.Redis, keys: List, source: str, target: str):
+    # The FLOAT32 copy is only as precise as the source vectors.
+    full = stores_full_vectors(target)
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hget(key, VECTOR_FIELD)
+    blobs = pipe.execute()
+    for key, blob in zip(keys, blobs):
+        if blob:
+            vector = decode_vector(blob, source)
+            mapping = {VECTOR_FIELD: vector_bytes(vector, target)}
+            if full:
+                mapping[FULL_VECTOR_FIELD] = vector_bytes(vector, "FLOAT32")
+            pipe.hset(key, mapping=mapping)
+    pipe.execute()
+
+
+def main(argv=None):
+    load_dotenv()
+    from qna.clients import get_redis_client
+
+    parser = argparse.ArgumentParser(description="Manage the talent index schema.")
+    parser.add_argument("command", choices=["show", "migrate", "rebuild"])
+    parser.add_argument("--index", default=REDIS_INDEX_NAME)
+    args = parser.parse_args(argv)
+
+    client = get_redis_client()
+    if args.command == "migrate":
+        print(f"{args.index} -> {migrate(client, args.index)}")
+    elif args.command == "rebuild":
+        start = time.perf_counter()
+        new = rebuild(client, args.index)
+        print(f"{args.index} -> {new} ({VECTOR_DTYPE}), rebuilt in {time.perf_counter() - start:.1f}s")
+
+    info = index_info(client, args.index)
+    if info is None:
+        print(f"No index {args.index!r}")
+        return
+    current = describe(info)
+    print(f"{args.index} -> {current['index_name']} ({current['num_docs']} docs, prefix {current['prefix']})")
+    print(f"  vector: {current.get('algorithm')} {current.get('dtype')} dim={current.get('dims')}")
+    print(f"  fields: {', '.join(str(f) for f in current['fields'])}")
+    print(f"  configured: {VECTOR_ALGORITHM} {VECTOR_DTYPE} M={HNSW_M} EF_CONSTRUCTION={HNSW_EF_CONSTRUCTION} "
+          f"EF_RUNTIME={HNSW_EF_RUNTIME} rerank_k={VECTOR_RERANK_K if stores_full_vectors() else 0}")
+    print(f"  vector_index_sz_mb: {info.get('vector_index_sz_mb')}")
+
+
+if __name__ == "__main__":
+    main()
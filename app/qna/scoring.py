@@ -0,0 +1,354 @@
+"""
+Deterministic candidate scoring for job-description (MODE JOBDESC) questions.
+
+This is the rubric basic_prompt used to leave to the LLM, computed with NumPy
+over a matrix that holds every candidate in the pool:
+
+    role match     30  a role from the question is among the candidate's roles
+    MUST-HAVE      40  share of the +term / "quoted" skills the candidate has
+    NICE-TO-HAVE   20  share of the other skills the question mentions
+    experience     10  years_experience over the asked minimum, capped at 1
+
+Components the question doesn't mention are left out, and the remaining
+weights are rescaled, so every score stays in 0-100. A candidate missing a
+MUST-HAVE skill, or outside the asked locations, is filtered out, as the
+retrieval pre-filters do. So is any score below SCORING_MIN_SCORE.
+
+Ingestion builds the matrix from the candidate manifests, stores it in Redis
+under scoring:{index}, and bumps the index generation. Query processes reload
+it when the generation moves. The engine then sends the LLM only the
+survivors, already ranked, and with use_llm=False it returns the shortlist
+itself. Many candidates can share a score (every backend engineer scores 100
+on "backend engineer"), so the engine scores a wider pool of
+SCORING_POOL_SIZE, searches within it, and breaks ties by retrieval
+relevance before cutting the shortlist to SCORING_SHORTLIST_SIZE.
+
+Run from the app directory:
+    poetry run python -m qna.scoring "backend +golang minimal 3 tahun"
+"""
+
+import argparse
+import io
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import redis
+
+from qna.attributes import LOCATIONS, ROLE_ALIASES, extract_roles
+from qna.cache import IndexGeneration
+from qna.constants import REDIS_INDEX_NAME, SCORING_MIN_SCORE, SCORING_SHORTLIST_SIZE
+from qna.retrieval import parse_query
+from qna.skills import SKILL_ALIASES, extract_skills, normalize_skill
+
+SCORING_KEY = f"scoring:{REDIS_INDEX_NAME}"
+WEIGHTS = {"role": 30.0, "must_have": 40.0, "nice_to_have": 20.0, "experience": 10.0}
+
+SKILLS = list(SKILL_ALIASES)
+ROLES = list(ROLE_ALIASES)
+
+
+def _split(value: Any) -> List[str]:
+    return [part.strip() for part in str(value or "").split(",") if part.strip()]
+
+
+def _columns(values: Iterable[List[str]], vocabulary: List[str]) -> np.ndarray:
+    index = {term: i for i, term in enumerate(vocabulary)}
+    rows = list(values)
+    matrix = np.zeros((len(rows), len(vocabulary)), dtype=bool)
+    for row, terms in enumerate(rows):
+        for term in terms:
+            if term in index:
+                matrix[row, index[term]] = True
+    return matrix
+
+
+@dataclass
+class ScoringQuery:
+    roles: List[str] = field(default_factory=list)
+    must_have: List[str] = field(default_factory=list)
+    nice_to_have: List[str] = field(default_factory=list)
+    min_years: Optional[int] = None
+    locations: List[str] = field(default_factory=list)
+    names: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_text(cls, text: str) -> "ScoringQuery":
+        parsed = parse_query(text)
+        # MUST-HAVEs outside the skill vocabulary can't be scored; retrieval
+        # still matches them as full text.
+        must_have = [skill for skill in (normalize_skill(term) for term in parsed.must_have) if skill]
+        return cls(
+            roles=extract_roles(text),
+            must_have=must_have,
+            nice_to_have=[skill for skill in extract_skills(text) if skill not in must_have],
+            min_years=parsed.min_years,
+            locations=parsed.locations,
+            names=parsed.names,
+        )
+
+    @property
+    def is_jobdesc(self) -> bool:
+        """A role/skill question without a name (name questions are MODE NAMA)."""
+        return not self.names and bool(self.roles or self.must_have or self.nice_to_have)
+
+
+@dataclass
+class ScoredCandidate:
+    candidate_id: str
+    name: str
+    file_url: str
+    score: float
+    roles: List[str]
+    matched_skills: List[str]
+    missing_skills: List[str]
+    years_experience: Optional[float]
+
+    @property
+    def reason(self) -> str:
+        parts = []
+        if self.roles:
+            parts.append(", ".join(self.roles))
+        if self.matched_skills:
+            parts.append("cocok: " + ", ".join(self.matched_skills))
+        if self.missing_skills:
+            parts.append("kurang: " + ", ".join(self.missing_skills))
+        if self.years_experience is not None:
+            parts.append(f"{self.years_experience:g} tahun pengalaman")
+        return "; ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "candidate_id": self.candidate_id,
+            "name": self.name,
+            "file_url": self.file_url,
+            "score": self.score,
+            "roles": self.roles,
+            "matched_skills": self.matched_skills,
+            "missing_skills": self.missing_skills,
+            "years_experience": self.years_experience,
+            "reason": self.reason,
+        }
+
+
+@dataclass
+class CandidateMatrix:
+    ids: List[str]
+    names: List[str]
+    file_urls: List[str]
+    skills: np.ndarray  # (candidates, SKILLS) bool
+    roles: np.ndarray  # (candidates, ROLES) bool
+    locations: np.ndarray  # (candidates, LOCATIONS) bool
+    years: np.ndarray  # (candidates,) float32, NaN when unknown
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "CandidateMatrix":
+        """Matrix from candidate records with the ingest fields (candidate_id,
+        name, file_url, skills, roles, location, years_experience)."""
+        records = sorted(records, key=lambda record: record["candidate_id"])
+        years = [float(record["years_experience"]) if record.get("years_experience") else np.nan for record in records]
+        return cls(
+            ids=[record["candidate_id"] for record in records],
+            names=[str(record.get("name") or record.get("filename") or "") for record in records],
+            file_urls=[str(record.get("file_url") or "") for record in records],
+            skills=_columns((_split(record.get("skills")) for record in records), SKILLS),
+            roles=_columns((_split(record.get("roles")) for record in records), ROLES),
+            locations=_columns((_split(record.get("location")) for record in records), LOCATIONS),
+            years=np.asarray(years, dtype=np.float32),
+        )
+
+    def to_bytes(self) -> bytes:
+        meta = {"ids": self.ids, "names": self.names, "file_urls": self.file_urls,
+                "skills": SKILLS, "roles": ROLES, "locations": LOCATIONS}
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            meta=np.array(json.dumps(meta)),
+            skills=self.skills,
+            roles=self.roles,
+            locations=self.locations,
+            years=self.years,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CandidateMatrix":
+        arrays = np.load(io.BytesIO(data))
+        meta = json.loads(str(arrays["meta"]))
+
+        # Columns follow the vocabulary at build time; realign them in case
+        # the vocabulary has changed since the last ingest.
+        def realign(name: str, vocabulary: List[str]) -> np.ndarray:
+            stored = arrays[name]
+            index = {term: i for i, term in enumerate(meta[name])}
+            matrix = np.zeros((stored.shape[0], len(vocabulary)), dtype=bool)
+            for i, term in enumerate(vocabulary):
+                if term in index:
+                    matrix[:, i] = stored[:, index[term]]
+            return matrix
+
+        return cls(
+            ids=meta["ids"],
+            names=meta["names"],
+            file_urls=meta["file_urls"],
+            skills=realign("skills", SKILLS),
+            roles=realign("roles", ROLES),
+            locations=realign("locations", LOCATIONS),
+            years=arrays["years"],
+        )
+
+    def score(self, query: ScoringQuery) -> np.ndarray:
+        """0-100 score per candidate, NaN for candidates filtered out."""
+        parts, weights = [], []
+        keep = np.ones(len(self), dtype=bool)
+        if query.roles:
+            parts.append(self.roles[:, [ROLES.index(r) for r in query.roles if r in ROLES]].any(axis=1))
+            weights.append(WEIGHTS["role"])
+        if query.must_have:
+            has = self.skills[:, [SKILLS.index(s) for s in query.must_have]]
+            parts.append(has.mean(axis=1))
+            weights.append(WEIGHTS["must_have"])
+            keep &= has.all(axis=1)
+        if query.nice_to_have:
+            parts.append(self.skills[:, [SKILLS.index(s) for s in query.nice_to_have]].mean(axis=1))
+            weights.append(WEIGHTS["nice_to_have"])
+        if query.min_years:
+            parts.append(np.nan_to_num(np.minimum(self.years / query.min_years, 1.0)))
+            weights.append(WEIGHTS["experience"])
+        if query.locations:
+            keep &= self.locations[:, [LOCATIONS.index(l) for l in query.locations if l in LOCATIONS]].any(axis=1)
+
+        if not parts:
+            scores = np.zeros(len(self), dtype=np.float32)
+        else:
+            weights = np.asarray(weights, dtype=np.float32)
+            scores = 100.0 * (weights @ np.stack(parts).astype(np.float32)) / weights.sum()
+        return np.where(keep, scores, np.nan)
+
+    def shortlist(
+        self, query: ScoringQuery, limit: int = SCORING_SHORTLIST_SIZE, min_score: float = SCORING_MIN_SCORE
+    ) -> List[ScoredCandidate]:
+        """Best candidates at or above min_score, highest first. Ties keep
+        candidate_id order, so the same pool always gives the same list."""
+        if not len(self):
+            return []
+        scores = self.score(query)
+        eligible = np.flatnonzero(np.nan_to_num(scores, nan=-1.0) >= min_score)
+        order = eligible[np.argsort(-scores[eligible], kind="stable")][:limit]
+        wanted = [SKILLS.index(s) for s in query.must_have + query.nice_to_have]
+        shortlist = []
+        for i in order:
+            has = self.skills[i]
+            years = float(self.years[i])
+            shortlist.append(
+                ScoredCandidate(
+                    candidate_id=self.ids[i],
+                    name=self.names[i],
+                    file_url=self.file_urls[i],
+                    score=round(float(scores[i]), 1),
+                    roles=[role for j, role in enumerate(ROLES) if self.roles[i, j] and role in query.roles],
+                    matched_skills=[SKILLS[j] for j in wanted if has[j]],
+                    missing_skills=[SKILLS[j] for j in wanted if not has[j]],
+                    years_experience=None if np.isnan(years) else years,
+                )
+            )
+        return shortlist
+
+
+def rank_by_relevance(
+    pool: List[ScoredCandidate], ranked_ids: Iterable[str], limit: int = SCORING_SHORTLIST_SIZE
+) -> List[ScoredCandidate]:
+    """The best limit candidates of pool, equal scores ordered by ranked_ids
+    (retrieval order, most relevant first). Candidates retrieval didn't
+    return come last among their equals."""
+    position = {candidate_id: i for i, candidate_id in enumerate(dict.fromkeys(ranked_ids))}
+    return sorted(pool, key=lambda c: (-c.score, position.get(c.candidate_id, len(position))))[:limit]
+
+
+def format_shortlist(shortlist: List[ScoredCandidate]) -> str:
+    """Markdown answer for the no-LLM mode."""
+    if not shortlist:
+        return (
+            f"Tidak ada kandidat dengan skor ≥ {SCORING_MIN_SCORE:g}. "
+            "Coba longgarkan kriteria (kurangi MUST-HAVE atau minimal tahun pengalaman)."
+        )
+    lines = [f"Shortlist ({len(shortlist)} kandidat, skor deterministik):", ""]
+    for candidate in shortlist:
+        link = f"[Lihat CV]({candidate.file_url})" if candidate.file_url else "CV link tidak tersedia"
+        lines.append(f"- **{candidate.name or candidate.candidate_id}** — skor {candidate.score:g} — {link}")
+        if candidate.reason:
+            lines.append(f"  {candidate.reason}")
+    return "\n".join(lines)
+
+
+def save_matrix(client: redis.Redis, matrix: CandidateMatrix, key: str = SCORING_KEY):
+    client.set(key, matrix.to_bytes())
+
+
+def load_matrix(client: redis.Redis, key: str = SCORING_KEY) -> Optional[CandidateMatrix]:
+    data = client.get(key)
+    return CandidateMatrix.from_bytes(data) if data else None
+
+
+class MatrixStore:
+    """The stored matrix, reloaded when the index generation moves."""
+
+    def __init__(self, client: redis.Redis, key: str = SCORING_KEY):
+        self.client = client
+        self.key = key
+        self.generation = IndexGeneration(client)
+        self._matrix: Optional[CandidateMatrix] = None
+        self._loaded_generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[CandidateMatrix]:
+        generation = self.generation.current()
+        with self._lock:
+            if self._loaded_generation != generation:
+                self._matrix = load_matrix(self.client, self.key)
+                self._loaded_generation = generation
+            return self._matrix
+
+
+@lru_cache(maxsize=None)
+def get_matrix_store() -> MatrixStore:
+    from qna.clients import get_redis_client
+
+    return MatrixStore(get_redis_client())
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Deterministic shortlist for a job description.")
+    parser.add_argument("question", help='e.g. "backend +golang minimal 3 tahun"')
+    parser.add_argument("--limit", type=int, default=SCORING_SHORTLIST_SIZE)
+    parser.add_argument("--min-score", type=float, default=SCORING_MIN_SCORE)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    matrix = get_matrix_store().current()
+    if matrix is None:
+        print("No scoring matrix yet; run qna.ingest first")
+        return
+    query = ScoringQuery.from_text(args.question)
+    start = time.perf_counter()
+    shortlist = matrix.shortlist(query, limit=args.limit, min_score=args.min_score)
+    elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps([candidate.to_dict() for candidate in shortlist], ensure_ascii=False, indent=2))
+    else:
+        print(format_shortlist(shortlist))
+    print(f"\nScored {len(matrix)} candidates in {1000 * elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
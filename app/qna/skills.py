@@ -0,0 +1,136 @@
+"""
+Skill vocabulary shared by ingestion (tagging CVs) and retrieval (parsing
+MUST-HAVE terms out of questions).
+
+Each canonical skill maps to the aliases that are recognised for it. Matching
+is case-insensitive and on word boundaries, so "Go" inside "Google" does not
+count as golang.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+SKILL_ALIASES: Dict[str, List[str]] = {
+    "python": ["python"],
+    "golang": ["golang"],
+    "java": ["java"],
+    "kotlin": ["kotlin"],
+    "scala": ["scala"],
+    "javascript": ["javascript", "js", "ecmascript"],
+    "typescript": ["typescript"],
+    "php": ["php"],
+    "laravel": ["laravel"],
+    "ruby": ["ruby"],
+    "rails": ["rails", "ruby on rails"],
+    "c++": ["c++", "cpp"],
+    "c#": ["c#", "csharp"],
+    ".net": [".net", "dotnet", "asp.net"],
+    "rust": ["rust"],
+    "swift": ["swift"],
+    "dart": ["dart"],
+    "flutter": ["flutter"],
+    "react": ["react", "reactjs", "react.js"],
+    "react native": ["react native"],
+    "vue": ["vue", "vuejs", "vue.js"],
+    "angular": ["angular", "angularjs"],
+    "next.js": ["next.js", "nextjs"],
+    "node.js": ["node.js", "nodejs"],
+    "express": ["expressjs", "express.js"],
+    "django": ["django"],
+    "flask": ["flask"],
+    "fastapi": ["fastapi"],
+    "spring": ["spring boot", "springboot", "spring framework"],
+    "html": ["html", "html5"],
+    "css": ["css", "css3", "tailwind", "sass"],
+    "sql": ["sql"],
+    "postgresql": ["postgresql", "postgres"],
+    "mysql": ["mysql"],
+    "mongodb": ["mongodb", "mongo"],
+    "redis": ["redis"],
+    "elasticsearch": ["elasticsearch"],
+    "kafka": ["kafka"],
+    "rabbitmq": ["rabbitmq"],
+    "graphql": ["graphql"],
+    "grpc": ["grpc"],
+    "rest": ["restful", "rest api"],
+    "microservices": ["microservices", "microservice"],
+    "docker": ["docker"],
+    "kubernetes": ["kubernetes", "k8s"],
+    "terraform": ["terraform"],
+    "ansible": ["ansible"],
+    "aws": ["aws", "amazon web services"],
+    "gcp": ["gcp", "google cloud"],
+    "azure": ["azure"],
+    "linux": ["linux"],
+    "git": ["git"],
+    "ci/cd": ["ci/cd", "cicd", "jenkins", "github actions", "gitlab ci"],
+    "android": ["android"],
+    "ios": ["ios"],
+    "machine learning": ["machine learning", "ml"],
+    "deep learning": ["deep learning"],
+    "data science": ["data science"],
+    "data engineering": ["data engineering", "etl"],
+    "nlp": ["nlp", "natural language processing"],
+    "tensorflow": ["tensorflow"],
+    "pytorch": ["pytorch"],
+    "pandas": ["pandas"],
+    "spark": ["spark", "pyspark"],
+    "tableau": ["tableau"],
+    "power bi": ["power bi", "powerbi"],
+    "excel": ["microsoft excel", "ms excel"],
+    "figma": ["figma"],
+    "ui/ux": ["ui/ux", "ux", "ui design"],
+    "qa": ["qa", "quality assurance", "software testing"],
+    "selenium": ["selenium"],
+    "scrum": ["scrum", "agile"],
+    "project management": ["project management", "pmp"],
+    "sap": ["sap"],
+    "accounting": ["accounting", "akuntansi"],
+    "recruitment": ["recruitment", "rekrutmen", "talent acquisition"],
+    "digital marketing": ["digital marketing", "seo"],
+}
+
+# Short or ambiguous words that only count as skills when someone types them as
+# a query term ("+go"), never when they appear in CV prose ("go live").
+QUERY_ONLY_ALIASES = {
+    "go": "golang",
+    "node": "node.js",
+    "ts": "typescript",
+    "spring": "spring",
+    "express": "express",
+    "excel": "excel",
+    "elastic": "elasticsearch",
+    "rest": "rest",
+}
+
+# Word boundary that also works around skills with punctuation (c++, .net, node.js).
+_BOUNDARY_LEFT = r"(?<![\w.+#/])"
+_BOUNDARY_RIGHT = r"(?![\w+#/]|\.\w)"
+
+
+@lru_cache(maxsize=None)
+def _alias_patterns():
+    patterns = []
+    for skill, aliases in SKILL_ALIASES.items():
+        alternatives = "|".join(re.escape(alias) for alias in sorted(aliases, key=len, reverse=True))
+        patterns.append((skill, re.compile(f"{_BOUNDARY_LEFT}(?:{alternatives}){_BOUNDARY_RIGHT}", re.IGNORECASE)))
+    return patterns
+
+
+@lru_cache(maxsize=None)
+def _alias_lookup() -> Dict[str, str]:
+    lookup = {alias: skill for skill, aliases in SKILL_ALIASES.items() for alias in aliases}
+    lookup.update(QUERY_ONLY_ALIASES)
+    lookup.update({skill: skill for skill in SKILL_ALIASES})
+    return lookup
+
+
+def extract_skills(text: str) -> List[str]:
+    """Canonical skills mentioned anywhere in text, in vocabulary order."""
+    return [skill for skill, pattern in _alias_patterns() if pattern.search(text)]
+
+
+def normalize_skill(term: str) -> Optional[str]:
+    """Canonical skill for a single term such as 'k8s' or 'Golang', if known."""
+    return _alias_lookup().get(term.strip().lower())
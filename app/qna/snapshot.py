@@ -0,0 +1,416 @@
+"""
+Memory-mapped snapshot of the talent index, for search without Redis.
+
+`export` copies every chunk of the index into a directory:
+
+    manifest.json           counts, dims, model and export time
+    vectors.npy             (chunks, dims) float32, L2-normalized
+    offsets.npy             (chunks + 1,) int64 byte offsets into chunks.bin
+    chunks.bin              one JSON record per chunk: key and stored fields
+    chunk_candidates.npy    (chunks,) int32 row of each chunk's candidate
+    scoring.npz             qna.scoring.CandidateMatrix of the same candidates
+    ann.bin                 optional hnswlib index (--ann)
+    projection.npz          the PCA projection, with EMBEDDINGS_REDUCTION=pca
+
+Each export is written to a versioned directory next to path
+(talent-pool.v20240101120000-123) and path is a symlink that an atomic
+rename points at the new one, so readers never see a half-written or a
+missing snapshot. Readers map the arrays with
+np.load(mmap_mode="r"), so worker processes on one host share the pages
+through the OS page cache instead of each holding a copy.
+
+With RETRIEVAL_BACKEND=snapshot the engine and get_retriever() search
+SNAPSHOT_PATH instead of Redis. The search is a blocked dot product over the
+mapped matrix, or the hnswlib index when the snapshot has one and the
+question has no filters. Names, MUST-HAVE skills from the skill vocabulary,
+years and locations filter on the candidate matrix, as the RediSearch
+pre-filters do. There is no BM25 leg, so results are those of
+RETRIEVAL_MODE=vector plus the filters. Replicas reload a snapshot when
+the symlink moves to a new export, and turn off the features kept in Redis
+(see qna.constants.USES_REDIS).
+
+Run from the app directory:
+    poetry run python -m qna.snapshot export --path snapshots/talent-pool
+    poetry run python -m qna.snapshot search "backend +golang" -k 5
+"""
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import sys
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import redis
+from pydantic import ConfigDict
+
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from qna.constants import (
+    EMBEDDINGS_MODEL_SLUG,
+    REDIS_INDEX_NAME,
+    REDIS_KEY_PREFIX,
+    SNAPSHOT_ANN_EF,
+    SNAPSHOT_PATH,
+    VECTOR_DTYPE,
+)
+from qna.metrics import timed
+from qna.profiles import name_tokens
+from qna.reduction import PROJECTION_FILE, PROJECTION_KEY
+from qna.retrieval import ParsedQuery, parse_query, to_document, without_names
+from qna.schema import FULL_VECTOR_FIELD, VECTOR_FIELD, decode_vector, stores_full_vectors
+from qna.scoring import SKILLS, CandidateMatrix, ScoringQuery
+
+FORMAT_VERSION = 1
+# Rows scored per block in an exact search, to bound the temporary memory.
+_BLOCK = 65536
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# ---- export ----
+
+
+def _decoded_fields(fields: Dict[bytes, bytes]) -> Dict[str, str]:
+    skip = {VECTOR_FIELD, FULL_VECTOR_FIELD}
+    decoded = {}
+    for name, value in fields.items():
+        name = name.decode()
+        if name not in skip:
+            decoded[name] = value.decode("utf-8", errors="ignore")
+    return decoded
+
+
+def export(
+    path,
+    client: Optional[redis.Redis] = None,
+    prefix: str = REDIS_KEY_PREFIX,
+    batch_size: int = 1000,
+    ann: bool = False,
+) -> Dict[str, Any]:
+    """Write a snapshot of every chunk under prefix to path and return its manifest."""
+    if client is None:
+        from qna.clients import get_redis_client
+
+        client = get_redis_client()
+    path = Path(path)
+    keys = sorted(client.scan_iter(match=f"{prefix}*", count=batch_size))
+    if not keys:
+        raise SnapshotError(f"no chunks under {prefix}; ingest some CVs first")
+    vector_field = FULL_VECTOR_FIELD if stores_full_vectors() else VECTOR_FIELD
+    vector_dtype = "FLOAT32" if stores_full_vectors() else VECTOR_DTYPE
+
+    version = path.with_name(f"{path.name}.v{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}")
+    shutil.rmtree(version, ignore_errors=True)
+    version.mkdir(parents=True)
+    vectors = None
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    candidates: Dict[str, Dict[str, str]] = {}
+    chunk_candidate_ids: List[str] = []
+    count = 0
+    with open(version / "chunks.bin", "wb") as chunks:
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            pipe = client.pipeline(transaction=False)
+            for key in batch:
+                pipe.hgetall(key)
+            for key, fields in zip(batch, pipe.execute()):
+                blob = fields.get(vector_field.encode()) if fields else None
+                if not blob:
+                    continue  # deleted since the scan, or not embedded yet
+                vector = decode_vector(blob, vector_dtype)
+                if vectors is None:
+                    vectors = np.lib.format.open_memmap(
+                        version / "vectors.npy", mode="w+", dtype=np.float32, shape=(len(keys), vector.shape[0])
+                    )
+                vectors[count] = _normalize(vector)
+                record = {"key": key.decode(), "fields": _decoded_fields(fields)}
+                candidate_id = record["fields"].get("candidate_id", "")
+                candidates.setdefault(candidate_id, {**record["fields"], "candidate_id": candidate_id})
+                chunk_candidate_ids.append(candidate_id)
+                chunks.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+                count += 1
+                offsets[count] = chunks.tell()
+    if vectors is None:
+        shutil.rmtree(version)
+        raise SnapshotError("no chunk has a stored vector")
+
+    dims = vectors.shape[1]
+    vectors.flush()
+    del vectors
+    if count < len(keys):
+        # Keys that vanished during the export: rewrite the matrix without the unused rows.
+        full = np.load(version / "vectors.npy", mmap_mode="r")
+        trimmed = np.lib.format.open_memmap(
+            version / "vectors.tmp.npy", mode="w+", dtype=np.float32, shape=(count, dims)
+        )
+        trimmed[:] = full[:count]
+        trimmed.flush()
+        del full, trimmed
+        os.replace(version / "vectors.tmp.npy", version / "vectors.npy")
+    np.save(version / "offsets.npy", offsets[: count + 1])
+
+    matrix = CandidateMatrix.from_records(candidates.values())
+    rows = {candidate_id: row for row, candidate_id in enumerate(matrix.ids)}
+    np.save(version / "chunk_candidates.npy", np.asarray([rows[c] for c in chunk_candidate_ids], dtype=np.int32))
+    (version / "scoring.npz").write_bytes(matrix.to_bytes())
+    if ann:
+        _build_ann(version, dims)
+    projection = client.get(PROJECTION_KEY)
+    if projection is not None:
+        # Replicas without Redis embed questions through this copy.
+        (version / PROJECTION_FILE).write_bytes(projection)
+
+    manifest = {
+        "version": FORMAT_VERSION,
+        "index": REDIS_INDEX_NAME,
+        "embeddings_model": EMBEDDINGS_MODEL_SLUG,
+        "chunks": count,
+        "candidates": len(matrix),
+        "dims": dims,
+        "ann": ann,
+        "projection": projection is not None,
+        "created": time.time(),
+    }
+    (version / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    _publish(version, path)
+    return manifest
+
+
+def _build_ann(directory: Path, dims: int):
+    # Imported lazily: hnswlib is only needed with --ann.
+    import hnswlib
+
+    vectors = np.load(directory / "vectors.npy", mmap_mode="r")
+    index = hnswlib.Index(space="ip", dim=dims)
+    index.init_index(max_elements=len(vectors), ef_construction=200, M=16)
+    for start in range(0, len(vectors), _BLOCK):
+        block = np.asarray(vectors[start:start + _BLOCK])
+        index.add_items(block, np.arange(start, start + len(block)))
+    index.save_index(str(directory / "ann.bin"))
+
+
+def _publish(version: Path, path: Path):
+    """Point the path symlink at version in one rename, so a reader opening
+    path sees either the old or the new snapshot, never neither. Readers
+    resolve the link once and keep the version they opened; the previous
+    version is kept for those still opening it, older ones are removed."""
+    previous = path.resolve() if path.is_symlink() else None
+    if path.exists() and not path.is_symlink():
+        # A snapshot from before versioned exports: move it aside once.
+        previous = path.with_name(f"{path.name}.v0-{os.getpid()}")
+        os.replace(path, previous)
+    link = path.with_name(f"{path.name}.link-{os.getpid()}")
+    if link.is_symlink():
+        link.unlink()
+    os.symlink(version.name, link)
+    os.replace(link, path)
+    for old in path.parent.glob(f"{path.name}.v*"):
+        if old.resolve() not in (version.resolve(), previous):
+            shutil.rmtree(old, ignore_errors=True)
+
+
+# ---- search ----
+
+
+class Snapshot:
+    def __init__(self, path):
+        # Resolved once, so every file is read from the same export version.
+        self.path = Path(path).resolve()
+        manifest_path = self.path / "manifest.json"
+        if not manifest_path.exists():
+            raise SnapshotError(f"no snapshot at {self.path}; run qna.snapshot export")
+        self.manifest = json.loads(manifest_path.read_text())
+        if self.manifest.get("version") != FORMAT_VERSION:
+            raise SnapshotError(f"snapshot format {self.manifest.get('version')}, expected {FORMAT_VERSION}")
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        self.offsets = np.load(self.path / "offsets.npy", mmap_mode="r")
+        self.chunk_candidates = np.load(self.path / "chunk_candidates.npy", mmap_mode="r")
+        self.matrix = CandidateMatrix.from_bytes((self.path / "scoring.npz").read_bytes())
+        self._names = [set(name_tokens(name)) for name in self.matrix.names]
+        with open(self.path / "chunks.bin", "rb") as f:
+            self._chunks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.ann = self._load_ann() if self.manifest.get("ann") else None
+
+    def _load_ann(self):
+        try:
+            import hnswlib
+        except ImportError:
+            return None  # exact search still works
+        index = hnswlib.Index(space="ip", dim=self.manifest["dims"])
+        index.load_index(str(self.path / "ann.bin"), max_elements=len(self.vectors))
+        index.set_ef(SNAPSHOT_ANN_EF)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def candidate_mask(self, parsed: ParsedQuery, candidate_ids: Optional[Sequence[str]] = None) -> Optional[np.ndarray]:
+        """Candidates passing the question's filters, or None when nothing filters."""
+        keep = np.ones(len(self.matrix), dtype=bool)
+        filtered = False
+        must_have = [skill for skill in parsed.must_have if skill in SKILLS]
+        if must_have or parsed.locations:
+            scores = self.matrix.score(ScoringQuery(must_have=must_have, locations=parsed.locations))
+            keep &= ~np.isnan(scores)
+            filtered = True
+        if parsed.min_years:
+            keep &= np.nan_to_num(self.matrix.years, nan=-1.0) >= parsed.min_years
+            filtered = True
+        if parsed.names:
+            wanted = set(name_tokens(" ".join(parsed.names)))
+            keep &= np.fromiter((wanted <= names for names in self._names), dtype=bool, count=len(self._names))
+            filtered = True
+        if candidate_ids:
+            allowed = set(candidate_ids)
+            keep &= np.fromiter((c in allowed for c in self.matrix.ids), dtype=bool, count=len(self.matrix))
+            filtered = True
+        return keep if filtered else None
+
+    def search(self, vector, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """(chunk row, cosine distance) of the k nearest chunks, nearest first.
+        mask is a per-candidate filter from candidate_mask()."""
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        if self.ann is not None and mask is None:
+            labels, distances = self.ann.knn_query(query, k=min(k, len(self)))
+            return [(int(row), float(d)) for row, d in zip(labels[0], distances[0])]
+
+        allowed = None if mask is None else mask[self.chunk_candidates]
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), _BLOCK):
+            scores[start:start + _BLOCK] = self.vectors[start:start + _BLOCK] @ query
+        if allowed is not None:
+            scores[~allowed] = -np.inf
+            k = min(k, int(allowed.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(row), float(1.0 - scores[row])) for row in top]
+
+    def document(self, row: int, **scores) -> Document:
+        record = json.loads(self._chunks[int(self.offsets[row]):int(self.offsets[row + 1])])
+        return to_document(record["key"], record["fields"], **scores)
+
+    def search_documents(
+        self, question: str, vector, k: int, candidate_ids: Optional[Sequence[str]] = None, filters: bool = True
+    ) -> List[Document]:
+        """Documents shaped like qna.retrieval's, with vector_distance."""
+        # candidate_ids narrows the question's filters, it doesn't replace them.
+        parsed = parse_query(question) if filters else ParsedQuery()
+        with timed("search"):
+            hits = self.search(vector, k, self.candidate_mask(parsed, candidate_ids))
+            if not hits and parsed.names:
+                # Nobody has that name: search without it, as qna.retrieval does.
+                hits = self.search(vector, k, self.candidate_mask(without_names(parsed), candidate_ids))
+            return [self.document(row, vector_distance=distance) for row, distance in hits]
+
+
+class SnapshotStore:
+    """The snapshot at path, reopened when an export replaces it."""
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = Path(path)
+        self._snapshot: Optional[Snapshot] = None
+        self._version: Optional[Tuple[str, float]] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Snapshot:
+        # The version the symlink points at, and the manifest's mtime for a
+        # snapshot directory written in place.
+        try:
+            version = (os.path.realpath(self.path), (self.path / "manifest.json").stat().st_mtime)
+        except FileNotFoundError:
+            version = None
+        with self._lock:
+            if self._snapshot is None or (version is not None and version != self._version):
+                self._snapshot = Snapshot(self.path)
+                self._version = version
+            return self._snapshot
+
+
+class SnapshotMatrixStore:
+    """qna.scoring.MatrixStore interface over the snapshot's candidate matrix."""
+
+    def __init__(self, store: SnapshotStore):
+        self.store = store
+
+    def current(self) -> CandidateMatrix:
+        return self.store.current().matrix
+
+
+@lru_cache(maxsize=None)
+def get_snapshot_store() -> SnapshotStore:
+    return SnapshotStore(SNAPSHOT_PATH)
+
+
+class SnapshotRetriever(BaseRetriever):
+    """LangChain retriever over the snapshot (RETRIEVAL_BACKEND=snapshot)."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    k: int = 5
+    filters: bool = True
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        from qna.embeddings import get_embeddings
+
+        with timed("embedding"):
+            vector = get_embeddings().embed_query(query)
+        return get_snapshot_store().current().search_documents(query, vector, self.k, filters=self.filters)
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Memory-mapped snapshot of the talent index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="Snapshot the Redis index to disk")
+    export_parser.add_argument("--path", default=SNAPSHOT_PATH)
+    export_parser.add_argument("--ann", action="store_true", help="Also build an hnswlib index")
+    export_parser.add_argument("--batch-size", type=int, default=1000)
+    search_parser = sub.add_parser("search", help="Search a snapshot")
+    search_parser.add_argument("question")
+    search_parser.add_argument("--path", default=SNAPSHOT_PATH)
+    search_parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        start = time.perf_counter()
+        manifest = export(args.path, batch_size=args.batch_size, ann=args.ann)
+        print(json.dumps(manifest, indent=2))
+        print(f"Exported in {time.perf_counter() - start:.1f}s")
+        return
+
+    from qna.embeddings import get_embeddings
+
+    snapshot = Snapshot(args.path)
+    vector = get_embeddings().embed_query(args.question)
+    start = time.perf_counter()
+    docs = snapshot.search_documents(args.question, vector, args.k)
+    elapsed = time.perf_counter() - start
+    for doc in docs:
+        print(f"{doc.metadata['vector_distance']:.4f}  {doc.metadata.get('name', '')}  {doc.page_content[:100]!r}")
+    print(f"\nSearched {len(snapshot)} chunks in {1000 * elapsed:.1f} ms ({'ann' if snapshot.ann else 'exact'})")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
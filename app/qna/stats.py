@@ -0,0 +1,240 @@
+"""
+Time series behind the Stats page.
+
+A StatsRecorder samples on a daemon thread:
+
+    every STATS_INTERVAL seconds        query latency, cache lookups and Redis round trips
+                                        from qna.metrics (what changed since the previous
+                                        sample), and the latency of a Redis PING
+    every STATS_INDEX_INTERVAL seconds  FT.INFO on the talent index and the progress that
+                                        a running qna.ingest publishes
+
+It keeps the last STATS_HISTORY samples of each. The page only reads these
+buffers, so a Streamlit rerun never calls FT.INFO. The query metrics are
+those of the process the recorder runs in: the Stats page sees the Streamlit
+app's queries, and qna.api exports its own on /metrics.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import redis
+
+from qna.constants import REDIS_INDEX_NAME, STATS_HISTORY, STATS_INDEX_INTERVAL, STATS_INTERVAL, USES_REDIS
+from qna.metrics import CACHE_LOOKUPS, LATENCY_BUCKETS, QUERY_SECONDS, REDIS_SECONDS
+
+INGEST_PROGRESS_KEY = f"ingest-progress:{REDIS_INDEX_NAME}"
+# A progress entry that stops updating is from an ingest that died.
+INGEST_PROGRESS_TTL = 24 * 3600
+
+# FT.INFO fields kept per index sample.
+INDEX_FIELDS = (
+    "num_docs",
+    "num_records",
+    "vector_index_sz_mb",
+    "doc_table_size_mb",
+    "inverted_sz_mb",
+    "percent_indexed",
+    "hash_indexing_failures",
+    "total_indexing_time",
+)
+
+
+def publish_ingest_progress(client: redis.Redis, state: str, progress: Dict[str, Any]):
+    """Called by qna.ingest while it runs ("running") and when it ends ("done")."""
+    value = json.dumps({"state": state, "updated": time.time(), **progress})
+    client.set(INGEST_PROGRESS_KEY, value, ex=INGEST_PROGRESS_TTL)
+
+
+def read_ingest_progress(client: redis.Redis) -> Optional[Dict[str, Any]]:
+    value = client.get(INGEST_PROGRESS_KEY)
+    return json.loads(value) if value else None
+
+
+def quantile(counts: Sequence[int], q: float, buckets: Sequence[float] = LATENCY_BUCKETS) -> Optional[float]:
+    """The q-quantile of a histogram (per-bucket counts, +Inf last),
+    interpolated inside its bucket like Prometheus' histogram_quantile."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if cumulative + count >= rank and count:
+            if i == len(buckets):
+                return buckets[-1]  # in +Inf: the highest finite bound is all we know
+            lower = buckets[i - 1] if i else 0.0
+            return lower + (buckets[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return buckets[-1]
+
+
+def _delta(current: Dict, previous: Dict) -> Dict:
+    return {key: value - previous.get(key, 0) for key, value in current.items()}
+
+
+@dataclass
+class MetricsSample:
+    ts: float
+    queries: int = 0
+    # Query count per LATENCY_BUCKETS bucket (+Inf last) over the interval.
+    latency_counts: List[int] = field(default_factory=list)
+    latency_sum: float = 0.0
+    # tier -> (hits, misses) over the interval
+    cache: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    # op -> (round trips, seconds) over the interval
+    redis: Dict[str, Tuple[int, float]] = field(default_factory=dict)
+    ping_ms: Optional[float] = None
+
+    def latency(self, q: float) -> Optional[float]:
+        return quantile(self.latency_counts, q)
+
+
+@dataclass
+class IndexSample:
+    ts: float
+    info: Dict[str, float] = field(default_factory=dict)
+    indexing: bool = False
+    ingest: Optional[Dict[str, Any]] = None
+    error: str = ""
+
+
+def index_sample(client: redis.Redis, index_name: str = REDIS_INDEX_NAME) -> IndexSample:
+    from qna.schema import index_info
+
+    sample = IndexSample(ts=time.time())
+    try:
+        info = index_info(client, index_name)
+        sample.ingest = read_ingest_progress(client)
+    except redis.RedisError as e:
+        sample.error = f"{type(e).__name__}: {e}"
+        return sample
+    if info is None:
+        sample.error = f"no index {index_name}"
+        return sample
+    for name in INDEX_FIELDS:
+        try:
+            sample.info[name] = float(info.get(name) or 0)
+        except (TypeError, ValueError):
+            pass
+    indexing = info.get("indexing") or 0
+    sample.indexing = float(indexing.decode() if isinstance(indexing, bytes) else indexing) > 0
+    return sample
+
+
+class StatsRecorder:
+    def __init__(
+        self,
+        client: redis.Redis,
+        interval: float = STATS_INTERVAL,
+        index_interval: float = STATS_INDEX_INTERVAL,
+        history: int = STATS_HISTORY,
+        uses_redis: bool = USES_REDIS,
+    ):
+        self.client = client
+        # On the snapshot backend only the in-process metrics are sampled.
+        self.uses_redis = uses_redis
+        self.interval = interval
+        self.index_interval = index_interval
+        self.metrics: deque = deque(maxlen=history)
+        self.index: deque = deque(maxlen=history)
+        self._last: Dict[str, Dict] = {}
+        self._last_index = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StatsRecorder":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stats", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        self.sample()
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        now = time.time()
+        self.metrics.append(self._metrics_sample(now))
+        if self.uses_redis and now - self._last_index >= self.index_interval:
+            self._last_index = now
+            self.index.append(index_sample(self.client))
+
+    def refresh_index(self):
+        """Sample FT.INFO now (the page's refresh button)."""
+        if not self.uses_redis:
+            return
+        self._last_index = time.time()
+        self.index.append(index_sample(self.client))
+
+    def _metrics_sample(self, now: float) -> MetricsSample:
+        queries = QUERY_SECONDS.snapshot()
+        lookups = CACHE_LOOKUPS.snapshot()
+        redis_ops = REDIS_SECONDS.snapshot()
+        first = not self._last
+
+        # Query latency over all cache outcomes.
+        counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        total = 0.0
+        for bucket_counts, seconds in queries.values():
+            counts = [a + b for a, b in zip(counts, bucket_counts)]
+            total += seconds
+        previous_counts, previous_total = self._last.get("queries", ([0] * len(counts), 0.0))
+        interval_counts = [a - b for a, b in zip(counts, previous_counts)]
+
+        sample = MetricsSample(
+            ts=now,
+            queries=sum(interval_counts),
+            latency_counts=interval_counts,
+            latency_sum=total - previous_total,
+        )
+        lookups_delta = _delta(lookups, self._last.get("lookups", {}))
+        for (tier, result), count in lookups_delta.items():
+            hits, misses = sample.cache.get(tier, (0, 0))
+            sample.cache[tier] = (hits + int(count), misses) if result == "hit" else (hits, misses + int(count))
+        previous_ops = self._last.get("redis", {})
+        for (op,), (op_counts, seconds) in redis_ops.items():
+            previous_op_counts, previous_seconds = previous_ops.get((op,), ([], 0.0))
+            sample.redis[op] = (sum(op_counts) - sum(previous_op_counts), seconds - previous_seconds)
+
+        self._last = {"queries": (counts, total), "lookups": lookups, "redis": redis_ops}
+        if first:
+            # Everything before the recorder started would land in one sample.
+            sample = MetricsSample(ts=now)
+        if not self.uses_redis:
+            return sample
+        try:
+            start = time.perf_counter()
+            self.client.ping()
+            sample.ping_ms = 1000 * (time.perf_counter() - start)
+        except redis.RedisError:
+            pass
+        return sample
+
+    # ---- views for the page ----
+
+    def latency_histogram(self, window: Optional[float] = None) -> List[int]:
+        """Query count per latency bucket over the last window seconds (all history by default)."""
+        since = time.time() - window if window else 0.0
+        counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        for sample in list(self.metrics):
+            if sample.ts >= since and sample.latency_counts:
+                counts = [a + b for a, b in zip(counts, sample.latency_counts)]
+        return counts
+
+
+@lru_cache(maxsize=None)
+def get_stats_recorder() -> StatsRecorder:
+    """The process's recorder, started on first call."""
+    from qna.clients import get_redis_client
+
+    return StatsRecorder(get_redis_client()).start()
@@ -0,0 +1,261 @@
+"""
+Background warm-up at process start, with a startup report for readiness probes.
+
+The app and the API start this before anything heavy is imported, and it
+works through these steps on a daemon thread:
+
+    imports        langchain, the OpenAI clients and the query engine
+    redis          connect the shared pool (PING)
+    index          FT.INFO on the talent index (or open the local snapshot)
+    llm_cache      build the LLM cache and install it globally
+    engine         start the query engine and its event loop
+    embeddings     embed WARMUP_QUERY, which opens the HTTP pool or loads a local model
+    reranker       load the cross-encoder, when RERANK is on
+    answer_cache   load the answers to the WARMUP_QUESTIONS most asked questions
+                   into the in-process answer cache
+
+Meanwhile the first page renders. The process is ready once the required
+steps (imports, index, engine, and redis with the Redis backend) have passed.
+The others only make the first queries faster, so a failure there is
+reported but doesn't block readiness. The report is logged as one JSON line
+on the qna.query logger, observed as qna_startup_step_seconds and qna_ready,
+and served on /ready by qna.api and the metrics server.
+"""
+
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import redis
+
+from qna.constants import (
+    REDIS_INDEX_NAME,
+    RETRIEVAL_BACKEND,
+    USES_REDIS,
+    WARMUP,
+    WARMUP_QUERY,
+    WARMUP_QUESTIONS,
+    WARMUP_QUESTION_LOG_SIZE,
+)
+from qna.metrics import READY, STARTUP_SECONDS, set_readiness
+
+logger = logging.getLogger("qna.query")
+
+QUESTIONS_KEY = f"questions:{REDIS_INDEX_NAME}"
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+async def arecord_question(client: "redis.asyncio.Redis", question: str):
+    """Count question in the most-asked log, keeping its WARMUP_QUESTION_LOG_SIZE top entries."""
+    pipe = client.pipeline(transaction=False)
+    pipe.zincrby(QUESTIONS_KEY, 1, normalize_question(question))
+    pipe.zremrangebyrank(QUESTIONS_KEY, 0, -(WARMUP_QUESTION_LOG_SIZE + 1))
+    await pipe.execute()
+
+
+def top_questions(client: redis.Redis, n: int = WARMUP_QUESTIONS) -> List[str]:
+    return [q.decode() if isinstance(q, bytes) else q for q in client.zrevrange(QUESTIONS_KEY, 0, n - 1)]
+
+
+@dataclass
+class StartupStep:
+    name: str
+    required: bool
+    status: str = "pending"  # pending, running, ok, failed, skipped
+    seconds: float = 0.0
+    detail: str = ""
+
+
+class Warmup:
+    def __init__(self):
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.llm_cache = None
+        self._done = threading.Event()
+        self._required_done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.steps: List[Tuple[StartupStep, Callable[[], str]]] = [
+            (StartupStep("imports", True), self._imports),
+            (StartupStep("redis", USES_REDIS), self._redis),
+            (StartupStep("index", True), self._index),
+            (StartupStep("llm_cache", False), self._llm_cache),
+            (StartupStep("engine", True), self._engine),
+            (StartupStep("embeddings", False), self._embeddings),
+            (StartupStep("reranker", False), self._reranker),
+            (StartupStep("answer_cache", False), self._answer_cache),
+        ]
+
+    # ---- steps; each returns a short detail for the report ----
+
+    def _imports(self) -> str:
+        import qna.engine  # noqa: F401  (langchain, langchain_openai, redis, numpy)
+        import qna.llm  # noqa: F401
+
+        return ""
+
+    def _redis(self) -> str:
+        if not USES_REDIS:
+            raise _Skip("snapshot backend")
+        from qna.clients import get_redis_client
+
+        get_redis_client().ping()
+        return ""
+
+    def _index(self) -> str:
+        if RETRIEVAL_BACKEND == "snapshot":
+            from qna.snapshot import get_snapshot_store
+
+            snapshot = get_snapshot_store().current()
+            return f"snapshot: {len(snapshot)} chunks"
+        from qna.clients import get_redis_client
+        from qna.schema import describe, index_info
+
+        info = index_info(get_redis_client(), REDIS_INDEX_NAME)
+        if info is None:
+            raise RuntimeError(f"no index {REDIS_INDEX_NAME}")
+        described = describe(info)
+        return f"{described['index_name']}: {described['num_docs']} docs"
+
+    def _llm_cache(self) -> str:
+        from langchain.globals import set_llm_cache
+
+        from qna.db import get_cache
+
+        self.llm_cache = get_cache()
+        if self.llm_cache is None:
+            return "off"
+        set_llm_cache(self.llm_cache)
+        return type(self.llm_cache).__name__
+
+    def _engine(self) -> str:
+        from qna.engine import get_engine
+
+        return f"concurrency {get_engine().limiter.limit}"
+
+    def _embeddings(self) -> str:
+        from qna.embeddings import get_embeddings
+
+        get_embeddings().embed_query(WARMUP_QUERY)
+        return ""
+
+    def _reranker(self) -> str:
+        from qna.rerank import get_reranker
+
+        reranker = get_reranker()
+        if reranker is None:
+            raise _Skip("RERANK is off")
+        reranker.model()
+        return reranker.model_name
+
+    def _answer_cache(self) -> str:
+        from qna.clients import get_redis_client
+        from qna.engine import get_engine
+        from qna.query import QueryRequest
+
+        engine = get_engine()
+        if engine.answers is None:
+            raise _Skip("ANSWER_CACHE is off")
+        questions = top_questions(get_redis_client())
+        # get() keeps a Redis hit in the in-process tier. Only the default
+        # k/max_tokens are primed, which is what the app starts with.
+        loaded = sum(
+            engine.answers.get(engine._answer_key(QueryRequest(question=q))) is not None for q in questions
+        )
+        return f"{loaded}/{len(questions)} answers"
+
+    # ---- running ----
+
+    def start(self) -> "Warmup":
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+                self._thread.start()
+        return self
+
+    def run(self):
+        for step, action in self.steps:
+            step.status = "running"
+            start = time.perf_counter()
+            try:
+                step.detail = action()
+                step.status = "ok"
+            except _Skip as e:
+                step.status, step.detail = "skipped", str(e)
+            except Exception as e:
+                step.status, step.detail = "failed", f"{type(e).__name__}: {e}"
+            step.seconds = time.perf_counter() - start
+            STARTUP_SECONDS.set(step.seconds, step=step.name)
+            if step.name == "engine":
+                # The required steps are done; the rest only warm caches.
+                READY.set(1 if self.ready else 0)
+                self._required_done.set()
+        self.finished = time.time()
+        READY.set(1 if self.ready else 0)
+        logger.info(json.dumps({"event": "startup", **self.report()}, ensure_ascii=False))
+        self._required_done.set()
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None, required_only: bool = True) -> bool:
+        """Block until the required steps (or, with required_only=False, all
+        steps) have run; False on timeout."""
+        return (self._required_done if required_only else self._done).wait(timeout)
+
+    @property
+    def failed(self) -> List[StartupStep]:
+        return [step for step, _ in self.steps if step.required and step.status == "failed"]
+
+    @property
+    def ready(self) -> bool:
+        return all(step.status == "ok" for step, _ in self.steps if step.required)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "done": self.finished is not None,
+            "elapsed_s": round((self.finished or time.time()) - self.started, 3),
+            "steps": [{**asdict(step), "seconds": round(step.seconds, 3)} for step, _ in self.steps],
+        }
+
+    def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        """For qna.metrics.set_readiness and qna.api's /ready."""
+        return self.ready, self.report()
+
+
+class _Skip(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def get_warmup() -> Warmup:
+    """The process's warm-up, started in the background on first call (run in
+    the foreground with WARMUP=false), and registered for /ready."""
+    warmup = Warmup()
+    set_readiness(warmup.readiness)
+    if WARMUP:
+        return warmup.start()
+    warmup.run()
+    return warmup
+
+
+def main(argv=None):
+    """Run the warm-up in the foreground and print the report (e.g. as a
+    container start check)."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    warmup = Warmup()
+    warmup.run()
+    print(json.dumps(warmup.report(), indent=2))
+    return 0 if warmup.ready else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
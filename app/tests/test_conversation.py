@@ -0,0 +1,35 @@
+import pytest
+
+from qna.conversation import NEW_SEARCH, REFINE, classify
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "dari mereka siapa yang di Jakarta?",
+        "yang punya pengalaman k8s saja?",
+        "backend tersebut yang paling senior",
+        "minimal 5 tahun",
+        "docker?",
+    ],
+)
+def test_refinements(question):
+    assert classify(question, has_previous=True) == REFINE
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "cari Beni Saputra",
+        "cari frontend engineer react",
+        "frontend engineer dengan pengalaman react dan typescript",
+        "kandidat lain yang bisa golang",
+        "bagaimana cara menulis job description yang baik untuk posisi ini",
+    ],
+)
+def test_new_searches(question):
+    assert classify(question, has_previous=True) == NEW_SEARCH
+
+
+def test_first_question_is_always_a_new_search():
+    assert classify("yang docker saja", has_previous=False) == NEW_SEARCH
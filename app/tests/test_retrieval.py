@@ -0,0 +1,77 @@
+import pytest
+
+from qna.retrieval import ParsedQuery, build_filter, escape_query_value, parse_query, without_names
+
+ALL_FIELDS = {"content", "name", "filename", "skills", "years_experience", "location"}
+
+
+def test_must_have_terms_are_normalized():
+    parsed = parse_query('backend +k8s +Golang "spring boot"')
+    assert parsed.must_have == ["kubernetes", "golang", "spring"]
+    assert "kubernetes" in parsed.terms
+
+
+def test_unknown_must_have_is_kept_verbatim():
+    assert parse_query("+erlang").must_have == ["erlang"]
+
+
+def test_years_and_locations():
+    parsed = parse_query("data engineer minimal 5 tahun di Jogja atau Bandung")
+    assert parsed.min_years == 5
+    assert parsed.locations == ["yogyakarta", "bandung"]
+
+
+def test_names_after_a_trigger_word():
+    assert parse_query("cari Beni Saputra").names == ["beni", "saputra"]
+    assert parse_query("siapa yang bisa golang").names == []
+
+
+def test_role_and_skill_words_are_not_names():
+    assert parse_query("cari backend engineer python").names == []
+
+
+def test_build_filter_uses_indexed_fields():
+    parsed = ParsedQuery(names=["beni"], must_have=["golang"], min_years=3, locations=["jakarta", "remote"])
+    assert build_filter(parsed, ALL_FIELDS) == (
+        "(@name:(beni) | @filename:(beni)) @skills:{golang} @years_experience:[3 +inf] @location:{jakarta | remote}"
+    )
+
+
+def test_build_filter_degrades_to_full_text():
+    parsed = ParsedQuery(names=["beni"], must_have=["golang", "event sourcing"], min_years=3, locations=["jakarta"])
+    assert build_filter(parsed, {"content"}) == '(@content:(beni)) @content:(golang) @content:"event sourcing"'
+
+
+def test_build_filter_escapes_special_characters():
+    assert build_filter(ParsedQuery(must_have=["c++"]), ALL_FIELDS) == "@skills:{c\\+\\+}"
+    assert escape_query_value("node.js") == "node\\.js"
+
+
+def test_empty_query_has_no_filter():
+    assert build_filter(parse_query("siapa saja"), ALL_FIELDS) == ""
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "cari data engineer",
+        "cari marketing",
+        "cari akuntan berpengalaman 3 tahun",
+        "cari kandidat HR",
+        "cari yang jago golang",
+        "cari Data Engineer di Jakarta",
+    ],
+)
+def test_role_only_searches_have_no_names(question):
+    assert parse_query(question).names == []
+
+
+def test_lowercase_words_are_not_names():
+    assert parse_query("cari beni saputra").names == []
+
+
+def test_without_names_searches_them_as_terms():
+    parsed = without_names(parse_query("cari Beni +golang"))
+    assert parsed.names == []
+    assert parsed.must_have == ["golang"]
+    assert "beni" in parsed.terms
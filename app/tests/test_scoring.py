@@ -0,0 +1,114 @@
+import math
+
+import numpy as np
+import pytest
+
+from qna.scoring import WEIGHTS, CandidateMatrix, ScoringQuery, rank_by_relevance
+
+
+def candidate(candidate_id, skills="", roles="", location="", years=None):
+    record = {"candidate_id": candidate_id, "name": candidate_id.title(), "file_url": f"{candidate_id}.pdf",
+              "skills": skills, "roles": roles, "location": location}
+    if years is not None:
+        record["years_experience"] = str(years)
+    return record
+
+
+@pytest.fixture
+def matrix():
+    return CandidateMatrix.from_records([
+        candidate("ani", skills="golang,docker,kubernetes", roles="backend", location="jakarta", years=6),
+        candidate("budi", skills="golang,python", roles="backend", location="bandung", years=2),
+        candidate("citra", skills="react,typescript", roles="frontend", location="jakarta", years=4),
+        candidate("dewi", skills="python,docker", roles="devops,backend", location="remote"),
+    ])
+
+
+def scores(matrix, query):
+    return dict(zip(matrix.ids, matrix.score(query).tolist()))
+
+
+def test_no_criteria_scores_zero(matrix):
+    assert scores(matrix, ScoringQuery()) == {"ani": 0.0, "budi": 0.0, "citra": 0.0, "dewi": 0.0}
+
+
+def test_role_only_is_all_or_nothing(matrix):
+    result = scores(matrix, ScoringQuery(roles=["backend"]))
+    assert result == {"ani": 100.0, "budi": 100.0, "citra": 0.0, "dewi": 100.0}
+
+
+def test_weights_are_rescaled_to_the_components_asked(matrix):
+    query = ScoringQuery(roles=["backend"], nice_to_have=["docker", "kubernetes"])
+    total = WEIGHTS["role"] + WEIGHTS["nice_to_have"]
+    result = scores(matrix, query)
+    assert result["ani"] == pytest.approx(100.0)
+    assert result["dewi"] == pytest.approx(100.0 * (WEIGHTS["role"] + WEIGHTS["nice_to_have"] / 2) / total)
+    assert result["budi"] == pytest.approx(100.0 * WEIGHTS["role"] / total)
+    assert result["citra"] == pytest.approx(0.0)
+
+
+def test_experience_is_capped_and_unknown_years_count_as_zero(matrix):
+    result = scores(matrix, ScoringQuery(min_years=4))
+    assert result["ani"] == pytest.approx(100.0)
+    assert result["budi"] == pytest.approx(50.0)
+    assert result["citra"] == pytest.approx(100.0)
+    assert result["dewi"] == pytest.approx(0.0)
+
+
+def test_missing_must_have_filters_the_candidate_out(matrix):
+    result = scores(matrix, ScoringQuery(must_have=["golang", "docker"]))
+    assert result["ani"] == pytest.approx(100.0)
+    assert all(math.isnan(result[c]) for c in ("budi", "citra", "dewi"))
+
+
+def test_location_filters_without_scoring(matrix):
+    result = scores(matrix, ScoringQuery(roles=["backend"], locations=["jakarta", "remote"]))
+    assert result["ani"] == pytest.approx(100.0)
+    assert result["dewi"] == pytest.approx(100.0)
+    assert math.isnan(result["budi"])
+    assert result["citra"] == pytest.approx(0.0)
+
+
+def test_shortlist_ranks_filters_and_explains(matrix):
+    query = ScoringQuery(roles=["backend"], must_have=["golang"], nice_to_have=["docker"], min_years=3)
+    shortlist = matrix.shortlist(query, limit=10, min_score=0)
+    assert [c.candidate_id for c in shortlist] == ["ani", "budi"]
+    best = shortlist[0]
+    assert best.score == 100.0
+    assert best.roles == ["backend"]
+    assert best.matched_skills == ["golang", "docker"]
+    assert best.missing_skills == []
+    assert shortlist[1].missing_skills == ["docker"]
+
+
+def test_shortlist_min_score_and_stable_ties(matrix):
+    shortlist = matrix.shortlist(ScoringQuery(roles=["backend"]), limit=10, min_score=50)
+    assert [c.candidate_id for c in shortlist] == ["ani", "budi", "dewi"]
+
+
+def test_matrix_round_trips_through_bytes(matrix):
+    restored = CandidateMatrix.from_bytes(matrix.to_bytes())
+    assert restored.ids == matrix.ids
+    assert np.array_equal(restored.skills, matrix.skills)
+    np.testing.assert_array_equal(restored.years, matrix.years)
+
+
+def test_query_from_text():
+    query = ScoringQuery.from_text("backend engineer +golang docker minimal 3 tahun di Jakarta")
+    assert query.roles == ["backend"]
+    assert query.must_have == ["golang"]
+    assert query.nice_to_have == ["docker"]
+    assert query.min_years == 3
+    assert query.locations == ["jakarta"]
+    assert query.is_jobdesc
+
+
+def test_ties_are_broken_by_retrieval_relevance(matrix):
+    pool = matrix.shortlist(ScoringQuery(roles=["backend"]), limit=10, min_score=0)
+    shortlist = rank_by_relevance(pool, ["dewi", "citra", "budi"], limit=2)
+    assert [c.candidate_id for c in shortlist] == ["dewi", "budi"]
+
+
+def test_candidates_not_retrieved_come_last_among_equals(matrix):
+    pool = matrix.shortlist(ScoringQuery(roles=["backend"]), limit=10, min_score=0)
+    assert [c.candidate_id for c in rank_by_relevance(pool, ["budi"], limit=4)] == ["budi", "ani", "dewi", "citra"]
@@ -0,0 +1,26 @@
+import pytest
+
+from qna.stats import quantile
+
+BUCKETS = (0.1, 0.5, 1.0)
+
+
+def test_empty_histogram_has_no_quantile():
+    assert quantile([0, 0, 0, 0], 0.5, BUCKETS) is None
+
+
+def test_interpolates_inside_the_bucket():
+    # 10 in (0, 0.1], 10 in (0.1, 0.5]
+    counts = [10, 10, 0, 0]
+    assert quantile(counts, 0.25, BUCKETS) == pytest.approx(0.05)
+    assert quantile(counts, 0.5, BUCKETS) == pytest.approx(0.1)
+    assert quantile(counts, 0.75, BUCKETS) == pytest.approx(0.3)
+    assert quantile(counts, 1.0, BUCKETS) == pytest.approx(0.5)
+
+
+def test_skips_empty_buckets():
+    assert quantile([0, 0, 4, 0], 0.5, BUCKETS) == pytest.approx(0.75)
+
+
+def test_overflow_bucket_reports_the_highest_bound():
+    assert quantile([1, 0, 0, 9], 0.99, BUCKETS) == 1.0